@@ -0,0 +1,155 @@
+from datetime import datetime
+from math import ceil
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from database import db
+from models import Product, StockAlert
+from events import emit
+import logging
+
+logger = logging.getLogger(__name__)
+
+WATCHED_FIELDS = ('quantity_in_stock', 'reorder_level', 'safety_stock', 'is_active')
+
+class StockAlertEngine:
+    """Incremental low-stock detection
+
+    Every flush that changes a product's stock or thresholds is evaluated
+    against reorder_level and safety_stock, and the alert state is stored in
+    the stock_alert table in the same transaction. Alerts only clear once
+    stock climbs above reorder_level plus a hysteresis margin, and CRITICAL
+    only drops back to LOW above safety_stock plus a margin, so a product
+    hovering around either threshold doesn't flap between states.
+    """
+
+    def __init__(self, hysteresis_ratio=0.1, hysteresis_min_units=1):
+        self.hysteresis_ratio = hysteresis_ratio
+        self.hysteresis_min_units = hysteresis_min_units
+
+    def init_app(self, app):
+        self.hysteresis_ratio = app.config.get('STOCK_ALERT_HYSTERESIS_RATIO', self.hysteresis_ratio)
+        self.hysteresis_min_units = app.config.get('STOCK_ALERT_HYSTERESIS_MIN_UNITS', self.hysteresis_min_units)
+
+    def level_for(self, quantity, reorder_level, safety_stock, is_active=True, current_level='OK'):
+        """Alert level for a stock position, applying hysteresis to active alerts"""
+        if not is_active:
+            return 'OK'
+        safety_stock = safety_stock or 0
+        if safety_stock > 0 and quantity <= safety_stock:
+            return 'CRITICAL'
+        if current_level == 'CRITICAL' and safety_stock > 0 and quantity <= safety_stock + self._margin(safety_stock):
+            return 'CRITICAL'
+        if quantity <= reorder_level:
+            return 'LOW'
+        if current_level != 'OK' and quantity <= reorder_level + self._margin(reorder_level):
+            return 'LOW'
+        return 'OK'
+
+    def _margin(self, threshold):
+        return max(self.hysteresis_min_units, ceil(threshold * self.hysteresis_ratio))
+
+    def apply(self, session, snapshots):
+        """Update alert rows for (product_id, quantity, reorder, safety, active, sku, name) snapshots"""
+        if not snapshots:
+            return
+
+        by_product = {s[0]: s for s in snapshots}
+        with session.no_autoflush:
+            alerts = {a.product_id: a for a in session.scalars(
+                select(StockAlert).where(StockAlert.product_id.in_(list(by_product)))
+            )}
+
+        now = datetime.utcnow()
+        for product_id, quantity, reorder_level, safety_stock, is_active, sku, name in by_product.values():
+            alert = alerts.get(product_id)
+            current = alert.level if alert else 'OK'
+            level = self.level_for(quantity, reorder_level, safety_stock, is_active, current)
+
+            if alert is None:
+                if level == 'OK':
+                    continue
+                alert = StockAlert(product_id=product_id, level='OK', is_active=False)
+                session.add(alert)
+
+            if level == current:
+                if level != 'OK':
+                    alert.quantity = quantity
+                continue
+
+            alert.quantity = quantity
+            alert.level = level
+            alert.is_active = level != 'OK'
+            alert.threshold = (safety_stock if level == 'CRITICAL' else reorder_level)
+            payload = {
+                'product_id': product_id,
+                'sku': sku,
+                'name': name,
+                'quantity': quantity,
+                'reorder_level': reorder_level,
+                'safety_stock': safety_stock,
+                'level': level,
+                'previous_level': current
+            }
+
+            if level == 'OK':
+                alert.cleared_at = now
+                emit('stock.recovered', payload, session)
+            elif current == 'OK' or level == 'CRITICAL':
+                # New alert or escalation from LOW to CRITICAL
+                alert.triggered_at = now
+                emit('stock.low', payload, session)
+
+    def evaluate_products(self, session, product_ids):
+        """Evaluate products changed outside the ORM unit of work (bulk UPDATEs)"""
+        if not product_ids:
+            return
+        rows = session.execute(
+            select(Product.id, Product.quantity_in_stock, Product.reorder_level, Product.safety_stock,
+                   Product.is_active, Product.sku, Product.name)
+            .where(Product.id.in_(list(product_ids)))
+        ).all()
+        self.apply(session, [tuple(row) for row in rows])
+
+    def rebuild(self, batch_size=1000):
+        """Full reconciliation of alert state with the product table"""
+        last_id = 0
+        while True:
+            ids = db.session.scalars(
+                select(Product.id).where(Product.id > last_id).order_by(Product.id).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            self.evaluate_products(db.session, ids)
+            db.session.commit()
+            last_id = ids[-1]
+
+    def active_alerts(self, limit=None):
+        """Products with an active alert, most severe first"""
+        query = db.session.query(Product).join(StockAlert).filter(StockAlert.is_active == True) \
+            .order_by(StockAlert.level.asc(), StockAlert.triggered_at.desc())
+        return query.limit(limit).all() if limit else query.all()
+
+    def active_count(self):
+        return StockAlert.query.filter_by(is_active=True).count()
+
+# Global alert engine instance
+stock_alert_engine = StockAlertEngine()
+
+def _watched_change(product):
+    state = inspect(product)
+    return any(state.attrs[name].history.has_changes() for name in WATCHED_FIELDS)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stock_changes(session, flush_context):
+    """Snapshot products whose stock or thresholds changed in this flush"""
+    snapshots = session.info.setdefault('stock_alert_snapshots', [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Product) and (obj in session.new or _watched_change(obj)):
+            snapshots.append((obj.id, obj.quantity_in_stock, obj.reorder_level, obj.safety_stock,
+                              obj.is_active, obj.sku, obj.name))
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _update_stock_alerts(session, flush_context):
+    snapshots = session.info.pop('stock_alert_snapshots', None)
+    if snapshots:
+        stock_alert_engine.apply(session, snapshots)
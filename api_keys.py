@@ -0,0 +1,117 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from database import db
+from models import APIKey, User, Role
+from cache import reference_cache
+import hashlib
+import secrets
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+def hash_key(raw_key):
+    """Digest stored in api_key.api_key; the key itself is never stored"""
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+def generate_key():
+    return f"ims_{secrets.token_urlsafe(32)}"
+
+class APIKeyIndex:
+    """In-process index of active API keys by their SHA-256 digest
+
+    The whole api_key table is loaded into a dict on first use and reloaded
+    when a commit in this process touches it, or after ttl seconds so keys
+    revoked by another worker stop working shortly after. A request is then
+    authenticated with one hash and one dict lookup instead of a query.
+    """
+
+    def __init__(self, ttl=60, last_used_interval=300):
+        self.ttl = ttl
+        self.last_used_interval = last_used_interval
+        self._index = {}
+        self._version = None
+        self._loaded_at = 0.0
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('API_KEY_CACHE_TTL', self.ttl)
+        self.last_used_interval = app.config.get('API_KEY_LAST_USED_INTERVAL', self.last_used_interval)
+
+    def create(self, user_id, key_name, permissions=None, expires_at=None):
+        """Store a new key and return it; only its digest is kept"""
+        raw_key = generate_key()
+        db.session.add(APIKey(key_name=key_name, api_key=hash_key(raw_key), user_id=user_id,
+                              permissions=list(permissions) if permissions else None,
+                              is_active=True, expires_at=expires_at))
+        db.session.commit()
+        return raw_key
+
+    def authenticate(self, raw_key):
+        """The key's index entry, or None when it is unknown, inactive or expired"""
+        if not raw_key:
+            return None
+        digest = hash_key(raw_key)
+        entry = self._entries().get(digest)
+        if entry is None:
+            return None
+        if entry['expires_at'] is not None and entry['expires_at'] <= datetime.utcnow():
+            return None
+        self._touch(entry['id'])
+        return entry
+
+    def permissions(self, entry):
+        """Permission names a key grants, None meaning all of them
+
+        A key acts as its user: it gets the user's role permissions, narrowed
+        to the key's own permissions list when one is set.
+        """
+        user = reference_cache.get(User, entry['user_id'])
+        if user is None or not user.is_active:
+            return set()
+        role = reference_cache.get(Role, user.role_id)
+        if role is None:
+            return set()
+        granted = None if role.name == 'Admin' else {permission.name for permission in role.permissions}
+        if entry['permissions'] is None:
+            return granted
+        return set(entry['permissions']) if granted is None else granted & entry['permissions']
+
+    def _entries(self):
+        version = reference_cache.version(APIKey.__tablename__)
+        with self._lock:
+            if self._version == version and time.monotonic() - self._loaded_at < self.ttl:
+                return self._index
+
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(APIKey.id, APIKey.api_key, APIKey.user_id, APIKey.permissions, APIKey.expires_at)
+                .where(APIKey.is_active == True)
+            ).all()
+        index = {row.api_key: {'id': row.id, 'user_id': row.user_id,
+                               'permissions': frozenset(row.permissions) if row.permissions else None,
+                               'expires_at': row.expires_at}
+                 for row in rows}
+
+        with self._lock:
+            self._index, self._version, self._loaded_at = index, version, time.monotonic()
+        return index
+
+    def _touch(self, key_id):
+        """Record last_used, at most once per last_used_interval per key"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_used.get(key_id, -self.last_used_interval) < self.last_used_interval:
+                return
+            self._last_used[key_id] = now
+        try:
+            # Core update on its own connection: no version bump, the index stays valid
+            with db.engine.begin() as connection:
+                connection.execute(update(APIKey).where(APIKey.id == key_id).values(last_used=datetime.utcnow()))
+        except Exception as e:
+            logger.error(f"Failed to record API key use: {str(e)}")
+
+# Global API key index instance
+api_key_index = APIKeyIndex()
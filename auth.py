@@ -0,0 +1,44 @@
+from functools import wraps
+from flask import abort
+from flask_login import LoginManager, current_user
+from flask_bcrypt import Bcrypt
+from database import db
+from models import Role, User
+from cache import reference_cache
+
+# Extensions are bound to the app in create_app()
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+login_manager.login_message_category = 'info'
+
+@login_manager.user_loader
+def load_user(user_id):
+    return db.session.get(User, int(user_id))
+
+# Helper function to check user permissions
+def has_permission(permission_name):
+    if not current_user.is_authenticated:
+        return False
+
+    # Fetch the user's role and its permissions from the reference cache
+    role = reference_cache.get(Role, current_user.role_id)
+    if not role:
+        return False
+
+    # Admin role has all permissions
+    if role.name == 'Admin':
+        return True
+
+    return any(permission.name == permission_name for permission in role.permissions)
+
+def permission_required(permission_name):
+    """Abort with 403 unless the current user has the given permission"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if not has_permission(permission_name):
+                abort(403)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
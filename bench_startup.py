@@ -0,0 +1,59 @@
+"""Startup benchmark
+
+Measures cold start of a worker: a fresh interpreter importing the app module
+and calling create_app(). Each run happens in its own process so nothing is
+shared through the import cache.
+
+    DB_PROFILE=development python bench_startup.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+heavy = [name for name in ('weasyprint', 'xlsxwriter', 'numpy') if name in __import__('sys').modules]
+print(f"{imported - start:.6f} {created - imported:.6f} {','.join(heavy) or '-'}")
+"""
+
+def run_once(env):
+    """Start one interpreter and return (import_seconds, factory_seconds, heavy_modules)"""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout.strip().splitlines()[-1]
+    import_seconds, factory_seconds, heavy = output.split()
+    return float(import_seconds), float(factory_seconds), heavy
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure application cold start time')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DB_PROFILE', 'development')
+
+    results = [run_once(env) for _ in range(args.runs)]
+    imports = [r[0] for r in results]
+    factories = [r[1] for r in results]
+    totals = [r[0] + r[1] for r in results]
+
+    print(f"Profile: {env['DB_PROFILE']}  Runs: {args.runs}")
+    print(f"import app     median {statistics.median(imports) * 1000:8.1f} ms")
+    print(f"create_app()   median {statistics.median(factories) * 1000:8.1f} ms")
+    print(f"cold start     median {statistics.median(totals) * 1000:8.1f} ms  max {max(totals) * 1000:8.1f} ms")
+    print(f"heavy modules loaded at startup: {results[-1][2]}")
+
+if __name__ == '__main__':
+    main()
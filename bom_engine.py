@@ -0,0 +1,277 @@
+from collections import deque
+from sqlalchemy import select
+from database import db
+from models import BillOfMaterials, BOMItem, Product
+from cache import reference_cache
+from deferred import deferred_engines
+import numpy as np
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BOMGraph:
+    """Product-level BOM graph: assembly -> [(component, quantity per unit)]
+
+    Each product uses its newest active BOM. Assemblies that sit on a cycle
+    are found once with a topological sort and kept in cyclic. Fully
+    exploded per-unit requirements are memoized per assembly, so shared
+    sub-assemblies are expanded only once for the life of the graph.
+    """
+
+    def __init__(self, rows):
+        # Newest active BOM wins when a product has several
+        self.bom_of = {}
+        for bom_id, assembly, component, quantity in rows:
+            self.bom_of[assembly] = max(bom_id, self.bom_of.get(assembly, bom_id))
+        self.children = {}
+        for bom_id, assembly, component, quantity in rows:
+            if bom_id == self.bom_of[assembly] and quantity and quantity > 0:
+                self.children.setdefault(assembly, []).append((component, quantity))
+        self.cyclic = self._find_cycles()
+        self._leaves = {}
+
+    def _find_cycles(self):
+        """Assemblies left over by Kahn's algorithm lie on or lead into a cycle"""
+        indegree = {node: 0 for node in self.children}
+        for node, edges in self.children.items():
+            for child, _ in edges:
+                if child in indegree:
+                    indegree[child] += 1
+        queue = deque(node for node, degree in indegree.items() if degree == 0)
+        while queue:
+            node = queue.popleft()
+            del indegree[node]
+            for child, _ in self.children[node]:
+                if child in indegree:
+                    indegree[child] -= 1
+                    if indegree[child] == 0:
+                        queue.append(child)
+        if not indegree:
+            return frozenset()
+        # Keep the nodes that can reach themselves, not just their descendants
+        leftover = set(indegree)
+        changed = True
+        while changed:
+            changed = False
+            for node in list(leftover):
+                if not any(child in leftover for child, _ in self.children[node]):
+                    leftover.discard(node)
+                    changed = True
+        return frozenset(leftover)
+
+    def is_assembly(self, product_id):
+        return product_id in self.children
+
+    def subtree(self, product_id):
+        """Every product reachable from product_id, itself included"""
+        seen = {product_id}
+        stack = [product_id]
+        while stack:
+            for child, _ in self.children.get(stack.pop(), ()):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        return seen
+
+    def check(self, product_id):
+        """Raise ValueError if the product's structure contains a cycle"""
+        if self.cyclic and not self.cyclic.isdisjoint(self.subtree(product_id)):
+            raise ValueError(f"BOM of product {product_id} contains a cycle: {self.cycle_path(product_id)}")
+
+    def cycle_path(self, product_id):
+        """One cycle below product_id as a list of product ids, or None"""
+        path, on_path = [], set()
+        iterators = [iter(self.children.get(product_id, ()))]
+        path.append(product_id)
+        on_path.add(product_id)
+        visited = {product_id}
+        while iterators:
+            step = next(iterators[-1], None)
+            if step is None:
+                iterators.pop()
+                on_path.discard(path.pop())
+                continue
+            child = step[0]
+            if child in on_path:
+                return path[path.index(child):] + [child]
+            if child not in visited and child in self.children:
+                visited.add(child)
+                path.append(child)
+                on_path.add(child)
+                iterators.append(iter(self.children[child]))
+        return None
+
+    def leaves(self, product_id):
+        """Purchased parts needed for one unit, memoized: {product_id: quantity}"""
+        memo = self._leaves.get(product_id)
+        if memo is not None:
+            return memo
+        self.check(product_id)
+        # Iterative post-order so deep structures do not hit the recursion limit
+        stack = [(product_id, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in self._leaves:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child, _ in self.children[node]
+                             if child in self.children and child not in self._leaves)
+                continue
+            totals = {}
+            for child, quantity in self.children[node]:
+                if child in self.children:
+                    for leaf, per_unit in self._leaves[child].items():
+                        totals[leaf] = totals.get(leaf, 0) + quantity * per_unit
+                else:
+                    totals[child] = totals.get(child, 0) + quantity
+            self._leaves[node] = totals
+        return self._leaves[product_id]
+
+    def levels(self, product_id):
+        """Subtree nodes, their longest distance from product_id and the subtree edges
+
+        Every parent is on a shallower level than all of its children, so
+        requirements can be pushed down one level at a time.
+        """
+        self.check(product_id)
+        nodes = list(self.subtree(product_id))
+        position = {node: i for i, node in enumerate(nodes)}
+        indegree = np.zeros(len(nodes), dtype=np.int64)
+        edges = [(position[node], position[child], quantity)
+                 for node in nodes for child, quantity in self.children.get(node, ())]
+        for _, child, _ in edges:
+            indegree[child] += 1
+        depth = np.zeros(len(nodes), dtype=np.int64)
+        outgoing = {}
+        for parent, child, quantity in edges:
+            outgoing.setdefault(parent, []).append(child)
+        queue = deque([position[product_id]])
+        while queue:
+            node = queue.popleft()
+            for child in outgoing.get(node, ()):
+                depth[child] = max(depth[child], depth[node] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+        edge_array = np.array(edges, dtype=np.int64).reshape(-1, 3)
+        return nodes, depth, edge_array
+
+class BOMExplosionEngine:
+    """Multi-level BOM explosion with a graph cached until BOMs change
+
+    The graph is loaded in one query and rebuilt when the
+    bill_of_materials or bom_item table version moves (any committed edit
+    through the ORM) or after ttl seconds.
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._graph = None
+        self._versions = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('BOM_GRAPH_TTL', self.ttl)
+
+    def graph(self):
+        versions = (reference_cache.version(BillOfMaterials.__tablename__),
+                    reference_cache.version(BOMItem.__tablename__))
+        graph = self._graph
+        if graph is None or self._versions != versions or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                rows = db.session.execute(
+                    select(BillOfMaterials.id, BillOfMaterials.product_id, BOMItem.product_id,
+                           BOMItem.quantity_required)
+                    .join(BOMItem, BOMItem.bom_id == BillOfMaterials.id)
+                    .where(BillOfMaterials.is_active == True, BillOfMaterials.product_id.isnot(None))
+                ).all()
+                graph = BOMGraph(rows)
+                self._graph, self._versions, self._loaded_at = graph, versions, time.monotonic()
+                if graph.cyclic:
+                    logger.warning(f"BOM cycles involve products {sorted(graph.cyclic)}")
+        return graph
+
+    def explode(self, product_id, quantity=1):
+        """Purchased parts for quantity units of an assembly: {product_id: quantity}"""
+        graph = self.graph()
+        if not graph.is_assembly(product_id):
+            return {product_id: quantity}
+        return {leaf: per_unit * quantity for leaf, per_unit in graph.leaves(product_id).items()}
+
+    def tree(self, product_id, quantity=1, limit=500):
+        """Indented explosion as rows of (level, product_id, quantity per parent, total quantity)
+
+        Shared sub-assemblies are repeated under every parent, so the rows
+        stop at limit.
+        """
+        graph = self.graph()
+        graph.check(product_id)
+        rows = []
+        stack = [(child, per, 1, per * quantity) for child, per in reversed(graph.children.get(product_id, []))]
+        while stack and len(rows) < limit:
+            node, per, level, total = stack.pop()
+            rows.append((level, node, per, total))
+            stack.extend((child, child_per, level + 1, total * child_per)
+                         for child, child_per in reversed(graph.children.get(node, [])))
+        return rows
+
+    def would_cycle(self, assembly_id, component_id):
+        """Whether adding component_id under assembly_id would close a cycle"""
+        return assembly_id is not None and assembly_id in self.graph().subtree(component_id)
+
+    def buildable(self, product_id):
+        """Most units of product_id that current stock can produce
+
+        Stock of sub-assemblies on hand is used before building more of
+        them. Feasibility of n units is checked by pushing net requirements
+        down the structure level by level; n is found by exponential then
+        binary search, starting from what the purchased parts alone allow.
+        """
+        graph = self.graph()
+        if not graph.is_assembly(product_id):
+            return 0
+        nodes, depth, edges = graph.levels(product_id)
+        stock_by_id = dict(db.session.execute(
+            select(Product.id, Product.quantity_in_stock).where(Product.id.in_(nodes))
+        ).all())
+        stock = np.array([max(stock_by_id.get(node) or 0, 0) for node in nodes], dtype=np.float64)
+        root = nodes.index(product_id)
+        stock[root] = 0  # finished units on hand are not "buildable"
+        leaf = np.array([not graph.is_assembly(node) for node in nodes])
+        by_level = [np.nonzero(depth == level)[0] for level in range(int(depth.max()) + 1)]
+        edge_levels = [edges[depth[edges[:, 0]] == level] for level in range(len(by_level))]
+
+        def feasible(units):
+            gross = np.zeros(len(nodes))
+            gross[root] = units
+            for level, level_edges in enumerate(edge_levels):
+                members = by_level[level]
+                net = np.maximum(gross - stock, 0)
+                if np.any(leaf[members] & (net[members] > 0)):
+                    return False
+                if len(level_edges):
+                    np.add.at(gross, level_edges[:, 1], net[level_edges[:, 0]] * level_edges[:, 2])
+            return True
+
+        # Lower bound from purchased parts alone, ignoring sub-assembly stock
+        needs = graph.leaves(product_id)
+        if not needs:
+            return 0
+        low = max(int(min((stock_by_id.get(part) or 0) // per for part, per in needs.items())), 0)
+        high = max(low, 1)
+        while feasible(high):
+            low, high = high, high * 2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if feasible(middle):
+                low = middle
+            else:
+                high = middle
+        return low
+
+# Global BOM explosion engine instance
+bom_engine = deferred_engines.register(BOMExplosionEngine())
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ReferenceCache:
+    """Second-level cache for reference tables and entity lookups by id
+
+    Entries are tagged with the version of the table they were loaded from.
+    Versions are bumped after every commit that touched the table, so a
+    stale entry is simply treated as a miss on its next lookup.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def init_app(self, app):
+        """Configure cache bounds from app config"""
+        self.max_entries = app.config.get('REFERENCE_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('REFERENCE_CACHE_TTL', self.ttl)
+
+    def version(self, table_name):
+        """Current version counter for a table"""
+        return self._versions.get(table_name, 0)
+
+    def bump(self, *table_names):
+        """Invalidate every cached entry that depends on the given tables"""
+        with self._lock:
+            for name in table_names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def all(self, model, **filters):
+        """Cached equivalent of model.query.filter_by(**filters).all()"""
+        key = (model.__tablename__, 'all', tuple(sorted(filters.items())))
+
+        def loader(session):
+            return session.query(model).filter_by(**filters).all()
+
+        return [self._attach(obj) for obj in self._fetch(key, loader)]
+
+    def get(self, model, ident):
+        """Cached equivalent of model.query.get(ident)"""
+        if ident is None:
+            return None
+        key = (model.__tablename__, 'get', int(ident))
+
+        def loader(session):
+            return session.get(model, int(ident))
+
+        obj = self._fetch(key, loader)
+        return self._attach(obj) if obj is not None else None
+
+    def stats(self):
+        """Hit/miss statistics and table versions"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'versions': dict(self._versions)
+            }
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _fetch(self, key, loader):
+        """Return the cached value for key, loading it on a miss"""
+        table_name = key[0]
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, loaded_at, value = entry
+                if version == self.version(table_name) and now - loaded_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+            self._misses += 1
+            version = self.version(table_name)
+
+        # Load in a private session so cached instances are fully loaded and
+        # never expired by a commit in the request session
+        session = Session(bind=db.engine, expire_on_commit=False)
+        try:
+            value = loader(session)
+        finally:
+            session.close()
+
+        with self._lock:
+            # Only store if no commit touched the table while we were loading
+            if version == self.version(table_name):
+                self._entries[key] = (version, now, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    @staticmethod
+    def _attach(obj):
+        """Copy a detached cached instance into the current session without SQL"""
+        return db.session.merge(obj, load=False)
+
+# Global reference cache instance
+reference_cache = ReferenceCache()
+
+def _changed_tables(session):
+    return session.info.setdefault('reference_cache_tables', set())
+
+@event.listens_for(Session, 'before_flush')
+def _track_changed_tables(session, flush_context, instances):
+    """Remember which tables this transaction writes to"""
+    tables = _changed_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None:
+            tables.add(table.name)
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def _track_bulk_changes(update_context):
+    """Remember tables touched by query.update() and query.delete()"""
+    mapper = update_context.mapper
+    if mapper is not None:
+        _changed_tables(update_context.session).add(mapper.local_table.name)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_versions_after_commit(session):
+    """Bump version counters of every table the committed transaction wrote"""
+    tables = session.info.pop('reference_cache_tables', None)
+    if tables:
+        reference_cache.bump(*tables)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changes_after_rollback(session, previous_transaction):
+    """A rolled back transaction leaves the cache valid"""
+    if previous_transaction.parent is None:
+        session.info.pop('reference_cache_tables', None)
@@ -0,0 +1,78 @@
+from functools import wraps
+from flask import request, session, make_response
+from flask_login import current_user
+from sqlalchemy import select, func, union_all
+from database import db
+from models import OutboxEvent
+from notifications import notification_center
+import hashlib
+
+class Validator:
+    """ETag and Last-Modified of a response, derived from the change stream
+
+    Every write to a tracked table adds an outbox_event row with a larger id,
+    so the newest id per entity works as a version counter shared by all
+    workers. Reading it is one indexed MAX per entity, far cheaper than the
+    queries and rendering it lets us skip; Last-Modified is the created_at of
+    those newest rows, looked up by primary key.
+    """
+
+    def __init__(self, entities, *parts):
+        newest = union_all(*[select(func.max(OutboxEvent.id)).where(OutboxEvent.entity == entity)
+                             for entity in entities])
+        rows = db.session.execute(
+            select(OutboxEvent.entity, OutboxEvent.id, OutboxEvent.created_at)
+            .where(OutboxEvent.id.in_(newest))
+        ).all()
+        marks = {entity: (last_id, last_at) for entity, last_id, last_at in rows}
+        key = '|'.join([f"{entity}:{marks.get(entity, (0,))[0]}" for entity in sorted(entities)] +
+                       [str(part) for part in parts])
+        self.etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        times = [last_at for last_id, last_at in marks.values() if last_at]
+        self.last_modified = max(times).replace(microsecond=0) if times else None
+
+    def is_fresh(self):
+        """True when the client's copy is current (If-None-Match wins over If-Modified-Since)"""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+        if request.if_modified_since and self.last_modified:
+            return self.last_modified <= request.if_modified_since.replace(tzinfo=None)
+        return False
+
+    def apply(self, response):
+        """Attach the validators to a successful response"""
+        if response.status_code in (200, 304):
+            response.set_etag(self.etag, weak=True)
+            if self.last_modified:
+                response.last_modified = self.last_modified
+            # Browsers may keep the page but must revalidate before showing it
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        return response
+
+    def not_modified(self):
+        return self.apply(make_response('', 304))
+
+def conditional(*entities):
+    """Answer 304 for a page whose entities are unchanged, before the view runs
+
+    The ETag also covers the user, their role and its permissions (through
+    the role and permission entries of the change stream) and the unread
+    notification count, which the layout renders. Place it below the permission check so
+    a revoked user gets 403 rather than 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if session.get('_flashes'):
+                # A pending flash message must be rendered, not served from cache
+                return view(*args, **kwargs)
+            validator = Validator(entities + ('role', 'permission'), request.full_path, current_user.id,
+                                  current_user.role_id, notification_center.unread_count(current_user.id))
+            if validator.is_fresh():
+                return validator.not_modified()
+            return validator.apply(make_response(view(*args, **kwargs)))
+        return wrapped
+    return decorator
@@ -8,6 +8,82 @@ if os.path.exists('.env'):
 elif os.path.exists('/workspace/uploads/.env'):
     load_dotenv('/workspace/uploads/.env')
 
+def _env_flag(name, default):
+    """Read a boolean flag from the environment"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _env_int(name, default):
+    """Read an integer from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+# Named database engine profiles. DB_PROFILE selects one; individual settings
+# can still be overridden per deployment with the DB_* environment variables.
+ENGINE_PROFILES = {
+    # Remote SQL Server through pyodbc
+    'production': {
+        'dialect': 'mssql',
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'statement_timeout': 30,
+        'fast_executemany': True,
+        'isolation_level': 'READ COMMITTED',
+        'create_schema': False
+    },
+    # Local SQLite file in WAL mode, no external server required
+    'development': {
+        'dialect': 'sqlite',
+        'sqlite_path': 'inventory.db',
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+        'statement_timeout': 15,
+        'fast_executemany': False,
+        'isolation_level': 'SERIALIZABLE',
+        'sqlite_synchronous': 'NORMAL',
+        'create_schema': True
+    },
+    # SQLite tuned for throughput when running load tests and benchmarks
+    'benchmark': {
+        'dialect': 'sqlite',
+        'sqlite_path': 'benchmark.db',
+        'pool_size': 20,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+        'statement_timeout': 60,
+        'fast_executemany': False,
+        'isolation_level': 'SERIALIZABLE',
+        'sqlite_synchronous': 'OFF',
+        'create_schema': True
+    }
+}
+
+def load_engine_profile(name=None):
+    """Resolve a named engine profile with environment overrides applied"""
+    name = name or os.environ.get('DB_PROFILE', 'production')
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile '{name}'. Choose one of: {', '.join(ENGINE_PROFILES)}")
+    
+    profile = dict(ENGINE_PROFILES[name], name=name)
+    for key in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'statement_timeout'):
+        profile[key] = _env_int(f'DB_{key.upper()}', profile[key])
+    for key in ('pool_pre_ping', 'fast_executemany', 'create_schema'):
+        profile[key] = _env_flag(f'DB_{key.upper()}', profile[key])
+    profile['isolation_level'] = os.environ.get('DB_ISOLATION_LEVEL', profile['isolation_level'])
+    if profile['dialect'] == 'sqlite':
+        profile['sqlite_path'] = os.environ.get('SQLITE_PATH', profile['sqlite_path'])
+    return profile
+
 class Config:
     # SQL Server Configuration
     SQL_SERVER = os.environ.get('SQL_SERVER', '(localdb)\MSSQLLocalDB')
@@ -30,10 +106,138 @@ class Config:
     
     connection_string += "TrustServerCertificate=yes;"
     
+    # Database engine profile (see ENGINE_PROFILES)
+    DB_ENGINE_PROFILE = load_engine_profile()
+    
     # URL encode the connection string for SQLAlchemy
-    SQLALCHEMY_DATABASE_URI = f"mssql+pyodbc:///?odbc_connect={quote_plus(connection_string)}"
+    if DB_ENGINE_PROFILE['dialect'] == 'sqlite':
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.abspath(DB_ENGINE_PROFILE['sqlite_path'])}"
+    else:
+        SQLALCHEMY_DATABASE_URI = f"mssql+pyodbc:///?odbc_connect={quote_plus(connection_string)}"
     
     # # Alternative connection using pytds
     # SQLALCHEMY_DATABASE_URI_PYTDS = f"mssql+pytds://{SQL_USERNAME}:{SQL_PASSWORD}@{SQL_SERVER}/{SQL_DATABASE}"
     
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Second-level reference data cache
+    REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', '1024'))
+    REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', '300'))
+    
+    # Background task scheduler
+    SCHEDULER_ENABLED = _env_flag('SCHEDULER_ENABLED', False)
+    SCHEDULER_MAX_WORKERS = _env_int('SCHEDULER_MAX_WORKERS', 4)
+    SCHEDULER_LEASE_MARGIN = _env_int('SCHEDULER_LEASE_MARGIN', 60)
+    
+    # Low stock alerts clear only above reorder_level plus this margin
+    STOCK_ALERT_HYSTERESIS_RATIO = float(os.environ.get('STOCK_ALERT_HYSTERESIS_RATIO', '0.1'))
+    STOCK_ALERT_HYSTERESIS_MIN_UNITS = _env_int('STOCK_ALERT_HYSTERESIS_MIN_UNITS', 1)
+    
+    # Outbound email queue, sender threads start only where SMTP is configured
+    EMAIL_SENDER_ENABLED = _env_flag('EMAIL_SENDER_ENABLED', True)
+    EMAIL_WORKERS = _env_int('EMAIL_WORKERS', 2)
+    EMAIL_BATCH_SIZE = _env_int('EMAIL_BATCH_SIZE', 20)
+    EMAIL_MAX_ATTEMPTS = _env_int('EMAIL_MAX_ATTEMPTS', 6)
+    EMAIL_RETRY_BASE = _env_int('EMAIL_RETRY_BASE', 30)
+    EMAIL_RETRY_MAX = _env_int('EMAIL_RETRY_MAX', 3600)
+    EMAIL_POLL_INTERVAL = _env_int('EMAIL_POLL_INTERVAL', 10)
+    EMAIL_CONNECTION_IDLE = _env_int('EMAIL_CONNECTION_IDLE', 60)
+    EMAIL_MESSAGES_PER_CONNECTION = _env_int('EMAIL_MESSAGES_PER_CONNECTION', 100)
+    
+    # Webhook delivery
+    WEBHOOKS_ENABLED = _env_flag('WEBHOOKS_ENABLED', True)
+    WEBHOOK_MAX_WORKERS = _env_int('WEBHOOK_MAX_WORKERS', 8)
+    WEBHOOK_ENDPOINT_CONCURRENCY = _env_int('WEBHOOK_ENDPOINT_CONCURRENCY', 2)
+    WEBHOOK_BATCH_SIZE = _env_int('WEBHOOK_BATCH_SIZE', 50)
+    WEBHOOK_BATCH_WINDOW_MS = _env_int('WEBHOOK_BATCH_WINDOW_MS', 1000)
+    WEBHOOK_MAX_ATTEMPTS = _env_int('WEBHOOK_MAX_ATTEMPTS', 8)
+    WEBHOOK_RETRY_BASE = _env_int('WEBHOOK_RETRY_BASE', 5)
+    WEBHOOK_RETRY_MAX = _env_int('WEBHOOK_RETRY_MAX', 900)
+    WEBHOOK_TIMEOUT = _env_int('WEBHOOK_TIMEOUT', 10)
+    WEBHOOK_QUEUE_SIZE = _env_int('WEBHOOK_QUEUE_SIZE', 10000)
+    
+    # Change stream over the transactional outbox
+    CHANGE_STREAM_GAP_TIMEOUT = _env_int('CHANGE_STREAM_GAP_TIMEOUT', 30)
+    CHANGE_STREAM_RETENTION_DAYS = _env_int('CHANGE_STREAM_RETENTION_DAYS', 7)
+    
+    # Notification center
+    NOTIFICATIONS_PAGE_SIZE = _env_int('NOTIFICATIONS_PAGE_SIZE', 20)
+    NOTIFICATIONS_RECIPIENTS_TTL = _env_int('NOTIFICATIONS_RECIPIENTS_TTL', 60)
+    
+    # Server-Sent Events hub
+    SSE_BUFFER_SIZE = _env_int('SSE_BUFFER_SIZE', 1000)
+    SSE_MAX_QUEUE = _env_int('SSE_MAX_QUEUE', 256)
+    SSE_HEARTBEAT = _env_int('SSE_HEARTBEAT', 15)
+    SSE_MAX_AGE = _env_int('SSE_MAX_AGE', 600)
+    SSE_MAX_CONNECTIONS = _env_int('SSE_MAX_CONNECTIONS', 5000)
+    
+    # JSON API
+    API_PAGE_SIZE = _env_int('API_PAGE_SIZE', 100)
+    API_MAX_PAGE_SIZE = _env_int('API_MAX_PAGE_SIZE', 1000)
+    API_KEY_CACHE_TTL = _env_int('API_KEY_CACHE_TTL', 60)
+    API_KEY_LAST_USED_INTERVAL = _env_int('API_KEY_LAST_USED_INTERVAL', 300)
+    
+    # Smart shelf telemetry ingestion
+    TELEMETRY_ENABLED = _env_flag('TELEMETRY_ENABLED', True)
+    TELEMETRY_FLUSH_INTERVAL = _env_int('TELEMETRY_FLUSH_INTERVAL', 2)
+    TELEMETRY_MAX_BATCH = _env_int('TELEMETRY_MAX_BATCH', 5000)
+    
+    # Shelf sensor history (memory-mapped rollups)
+    TIMESERIES_ENABLED = _env_flag('TIMESERIES_ENABLED', True)
+    TIMESERIES_PATH = os.environ.get('TIMESERIES_PATH', 'timeseries')
+    TIMESERIES_MAX_OPEN = _env_int('TIMESERIES_MAX_OPEN', 2048)
+    TIMESERIES_RETENTION_1M_DAYS = _env_int('TIMESERIES_RETENTION_1M_DAYS', 7)
+    TIMESERIES_RETENTION_1H_DAYS = _env_int('TIMESERIES_RETENTION_1H_DAYS', 90)
+    TIMESERIES_RETENTION_1D_DAYS = _env_int('TIMESERIES_RETENTION_1D_DAYS', 1825)
+    
+    # Weight-based stock estimation
+    SHELF_ESTIMATE_TOLERANCE_UNITS = _env_int('SHELF_ESTIMATE_TOLERANCE_UNITS', 1)
+    SHELF_ESTIMATE_TOLERANCE_PERCENT = _env_int('SHELF_ESTIMATE_TOLERANCE_PERCENT', 5)
+    SHELF_ESTIMATE_MAX_AGE = _env_int('SHELF_ESTIMATE_MAX_AGE', 900)
+    SHELF_AUTO_RECONCILE = _env_flag('SHELF_AUTO_RECONCILE', False)
+    
+    # Environmental rules on shelf telemetry
+    SHELF_RULES_ENABLED = _env_flag('SHELF_RULES_ENABLED', True)
+    SHELF_RULES_LIMITS_TTL = _env_int('SHELF_RULES_LIMITS_TTL', 300)
+    
+    # Velocity-based slotting (capacity is counted in units)
+    SLOTTING_VELOCITY_DAYS = _env_int('SLOTTING_VELOCITY_DAYS', 90)
+    SLOTTING_BANDS = _env_int('SLOTTING_BANDS', 10)
+    
+    # Equipment usage rollups and efficiency anomalies
+    UTILIZATION_BATCH_SIZE = _env_int('UTILIZATION_BATCH_SIZE', 50000)
+    UTILIZATION_BASELINE_DAYS = _env_int('UTILIZATION_BASELINE_DAYS', 28)
+    UTILIZATION_MIN_BASELINE_DAYS = _env_int('UTILIZATION_MIN_BASELINE_DAYS', 7)
+    UTILIZATION_ANOMALY_THRESHOLD = float(os.environ.get('UTILIZATION_ANOMALY_THRESHOLD', 3.0))
+    UTILIZATION_HOURS_PER_DAY = _env_int('UTILIZATION_HOURS_PER_DAY', 8)
+    UTILIZATION_GAP_TIMEOUT = _env_int('UTILIZATION_GAP_TIMEOUT', 3600)
+    
+    # Predicted preventive maintenance
+    MAINTENANCE_SERVICE_FRACTION = float(os.environ.get('MAINTENANCE_SERVICE_FRACTION', 0.8))
+    MAINTENANCE_MIN_FAILURES = _env_int('MAINTENANCE_MIN_FAILURES', 2)
+    MAINTENANCE_RATE_DAYS = _env_int('MAINTENANCE_RATE_DAYS', 30)
+    MAINTENANCE_HORIZON_DAYS = _env_int('MAINTENANCE_HORIZON_DAYS', 14)
+    MAINTENANCE_DEFAULT_INTERVAL_DAYS = _env_int('MAINTENANCE_DEFAULT_INTERVAL_DAYS', 180)
+    
+    # Spare part requirements projected from maintenance
+    SPARE_PARTS_HORIZON_WEEKS = _env_int('SPARE_PARTS_HORIZON_WEEKS', 12)
+    SPARE_PARTS_HISTORY_DAYS = _env_int('SPARE_PARTS_HISTORY_DAYS', 730)
+    SPARE_PARTS_CACHE_TTL = _env_int('SPARE_PARTS_CACHE_TTL', 3600)
+    
+    # Cached BOM graph for multi-level explosion, reloaded on BOM edits
+    BOM_GRAPH_TTL = _env_int('BOM_GRAPH_TTL', 600)
+    
+    # Buildable kit counts, reloaded on kit edits and after this many seconds
+    KIT_AVAILABILITY_TTL = _env_int('KIT_AVAILABILITY_TTL', 300)
+    
+    # Material requirements planning in time buckets
+    MRP_BUCKET_DAYS = _env_int('MRP_BUCKET_DAYS', 7)
+    MRP_HORIZON_BUCKETS = _env_int('MRP_HORIZON_BUCKETS', 26)
+    
+    # Replenishment policies from demand history; auto-apply writes them to products weekly
+    REPLENISHMENT_HISTORY_DAYS = _env_int('REPLENISHMENT_HISTORY_DAYS', 180)
+    REPLENISHMENT_SERVICE_LEVEL = float(os.environ.get('REPLENISHMENT_SERVICE_LEVEL', 0.95))
+    REPLENISHMENT_ORDERING_COST = float(os.environ.get('REPLENISHMENT_ORDERING_COST', 50.0))
+    REPLENISHMENT_HOLDING_RATE = float(os.environ.get('REPLENISHMENT_HOLDING_RATE', 0.25))
+    REPLENISHMENT_MIN_DEMAND_DAYS = _env_int('REPLENISHMENT_MIN_DEMAND_DAYS', 5)
+    REPLENISHMENT_AUTO_APPLY = _env_flag('REPLENISHMENT_AUTO_APPLY', False)
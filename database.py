@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from flask_sqlalchemy import SQLAlchemy
-from config import Config
+from config import Config, load_engine_profile
 import logging
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -11,25 +14,113 @@ logger = logging.getLogger(__name__)
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
 
+def build_engine_options(profile):
+    """Translate an engine profile into create_engine() keyword arguments"""
+    options = {
+        'pool_size': profile['pool_size'],
+        'max_overflow': profile['max_overflow'],
+        'pool_timeout': profile['pool_timeout'],
+        'pool_recycle': profile['pool_recycle'],
+        'pool_pre_ping': profile['pool_pre_ping'],
+        'isolation_level': profile['isolation_level']
+    }
+
+    if profile['dialect'] == 'sqlite':
+        # File databases must use a real pool for pool_size to apply
+        options['poolclass'] = QueuePool
+        options['connect_args'] = {'check_same_thread': False, 'timeout': profile['statement_timeout']}
+    elif profile['dialect'] == 'mssql':
+        options['fast_executemany'] = profile['fast_executemany']
+
+    return options
+
+def _configure_sqlite(engine, profile):
+    """Enable WAL mode and per-statement timeouts on every new SQLite connection"""
+    timeout = profile['statement_timeout']
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f"PRAGMA synchronous={profile.get('sqlite_synchronous', 'NORMAL')}")
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.execute(f'PRAGMA busy_timeout={int(timeout * 1000)}')
+        cursor.close()
+
+        # Abort statements that run past their deadline
+        state = {'deadline': None}
+        connection_record.info['statement_state'] = state
+        if timeout:
+            dbapi_connection.set_progress_handler(
+                lambda: 1 if state['deadline'] and time.monotonic() > state['deadline'] else 0,
+                10000
+            )
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        state = conn.info.get('statement_state')
+        if state is not None and timeout:
+            state['deadline'] = time.monotonic() + timeout
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        state = conn.info.get('statement_state')
+        if state is not None:
+            state['deadline'] = None
+
+def _configure_mssql(engine, profile):
+    """Apply the query timeout to every new pyodbc connection"""
+    timeout = profile['statement_timeout']
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        if timeout:
+            dbapi_connection.timeout = timeout
+
 def init_app(app):
     """Initialize database with Flask app"""
     try:
+        profile = app.config.get('DB_ENGINE_PROFILE') or load_engine_profile()
+        app.config['DB_ENGINE_PROFILE'] = profile
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', build_engine_options(profile))
+
         # Configure SQLAlchemy with app
         db.init_app(app)
-        
-        logger.info(f"Using database: {app.config['SQLALCHEMY_DATABASE_URI']}")
-        
-        # Test database connection and create tables
+
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        logger.info(f"Using database profile '{profile['name']}': {url.render_as_string(hide_password=True)}")
+
         with app.app_context():
-            db.engine.connect()
-            logger.info("Successfully connected to SQL Server")
-            
-            # Create all tables if they don't exist
-            db.create_all()
-            logger.info("Database tables created successfully")
-            
+            if profile['dialect'] == 'sqlite':
+                _configure_sqlite(db.engine, profile)
+            elif profile['dialect'] == 'mssql':
+                _configure_mssql(db.engine, profile)
+
+            # Schema creation is opt-in per profile so production boots stay cheap
+            if profile['create_schema']:
+                db.create_all()
+                logger.info("Database tables created successfully")
+
         return True
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
         logger.error("Check database configuration and try again.")
-        return False
\ No newline at end of file
+        return False
+
+def pool_statistics():
+    """Connection pool statistics for the current app's engine"""
+    engine = db.engine
+    pool = engine.pool
+    stats = {
+        'dialect': engine.dialect.name,
+        'pool_class': type(pool).__name__,
+        'status': pool.status()
+    }
+
+    # Only QueuePool-style pools expose counters
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            stats[name] = counter()
+
+    return stats
@@ -0,0 +1,44 @@
+import importlib
+import threading
+
+class DeferredEngines:
+    """Planning and analytics engines imported on first use instead of at startup
+
+    These engines pull in numpy, which would dominate worker cold start.
+    create_app() only hands the app over here; each engine module registers
+    its global instance when it is first imported, and the instance is
+    configured from the app right then.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._engines = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure engines imported so far, and any imported later, from this app"""
+        with self._lock:
+            self.app = app
+            engines = list(self._engines)
+        for engine in engines:
+            engine.init_app(app)
+
+    def register(self, engine):
+        """Configure a global engine instance as its module is imported, returns it"""
+        with self._lock:
+            self._engines.append(engine)
+            app = self.app
+        if app is not None:
+            engine.init_app(app)
+        return engine
+
+    @staticmethod
+    def listener(module_name, instance_name, method_name):
+        """Telemetry listener that imports its engine with the first batch"""
+        def listener(readings):
+            engine = getattr(importlib.import_module(module_name), instance_name)
+            return getattr(engine, method_name)(readings)
+        return listener
+
+# Global deferred engine registry
+deferred_engines = DeferredEngines()
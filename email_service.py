@@ -1,18 +1,98 @@
 import smtplib
+import base64
+import json
+import mimetypes
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid
 import os
-from datetime import datetime
-from models import Product, User, Role
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, func, or_, and_
+from models import User, Role, OutboxEmail
 from database import db
+from alerts import stock_alert_engine
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Read size for attachments, a multiple of 57 so every base64 line is 76 characters
+ATTACHMENT_CHUNK = 57 * 1024
+
+class SMTPConnection:
+    """An authenticated SMTP connection kept open across messages"""
+
+    def __init__(self, service):
+        self.service = service
+        self.server = None
+        self.messages = 0
+        self.last_used = 0.0
+
+    def get(self):
+        """Return a live connection, reconnecting when stale or used up"""
+        service = self.service
+        if self.server is not None:
+            idle = time.monotonic() - self.last_used
+            if self.messages >= service.messages_per_connection or idle > service.connection_idle:
+                self.close()
+            elif idle > 5:
+                # The server may have dropped a connection that sat unused for a while
+                try:
+                    alive = self.server.noop()[0] == 250
+                except (smtplib.SMTPException, OSError):
+                    alive = False
+                if not alive:
+                    self.close()
+
+        if self.server is None:
+            server = smtplib.SMTP(service.smtp_server, service.smtp_port, timeout=service.smtp_timeout)
+            if service.use_tls:
+                server.starttls()
+            if service.use_auth:
+                server.login(service.smtp_username, service.smtp_password)
+            self.server = server
+            self.messages = 0
+            service._record('connections')
+        else:
+            service._record('reused')
+        return self.server
+
+    def used(self):
+        self.messages += 1
+        self.last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.service.connection_idle:
+            self.close()
+
+    def discard(self):
+        """Drop the socket without QUIT, for a session left in an unknown state"""
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                self.server.close()
+            self.server = None
+
 class EmailService:
-    """Email service for sending notifications and alerts"""
+    """Email service for sending notifications and alerts
+
+    send_email() only writes the message to the outbox_email table. Sender
+    threads claim due messages in batches and deliver them over SMTP
+    connections that stay open across messages; failures are retried with
+    exponential backoff until EMAIL_MAX_ATTEMPTS is reached.
+    """
     
     def __init__(self):
         self.smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
@@ -20,62 +100,363 @@ class EmailService:
         self.smtp_username = os.environ.get('SMTP_USERNAME', '')
         self.smtp_password = os.environ.get('SMTP_PASSWORD', '')
         self.from_email = os.environ.get('FROM_EMAIL', self.smtp_username)
-        self.enabled = bool(self.smtp_username and self.smtp_password)
+        self.use_tls = os.environ.get('SMTP_USE_TLS', 'true').lower() in ('1', 'true', 'yes', 'on')
+        self.use_auth = bool(self.smtp_username and self.smtp_password)
+        # A relay without authentication (or a local debugging server) must be opted into
+        allow_anonymous = os.environ.get('SMTP_ALLOW_ANONYMOUS', 'false').lower() in ('1', 'true', 'yes', 'on')
+        self.enabled = self.use_auth or (allow_anonymous and bool(self.from_email))
+        
+        self.app = None
+        self.running = False
+        self.workers = 2
+        self.batch_size = 20
+        self.max_attempts = 6
+        self.retry_base = 30
+        self.retry_max = 3600
+        self.claim_timeout = 300
+        self.poll_interval = 10
+        self.connection_idle = 60
+        self.messages_per_connection = 100
+        self.smtp_timeout = 30
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._minutes = deque(maxlen=60)
+        self._totals = {'sent': 0, 'retried': 0, 'failed': 0, 'connections': 0, 'reused': 0, 'bytes': 0}
+    
+    def init_app(self, app):
+        """Bind the outbox to an app and start the sender threads if enabled"""
+        self.app = app
+        self.workers = app.config.get('EMAIL_WORKERS', self.workers)
+        self.batch_size = app.config.get('EMAIL_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('EMAIL_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_base = app.config.get('EMAIL_RETRY_BASE', self.retry_base)
+        self.retry_max = app.config.get('EMAIL_RETRY_MAX', self.retry_max)
+        self.poll_interval = app.config.get('EMAIL_POLL_INTERVAL', self.poll_interval)
+        self.connection_idle = app.config.get('EMAIL_CONNECTION_IDLE', self.connection_idle)
+        self.messages_per_connection = app.config.get('EMAIL_MESSAGES_PER_CONNECTION', self.messages_per_connection)
+        if app.config.get('EMAIL_SENDER_ENABLED') and self.enabled:
+            self.start()
+    
+    def start(self):
+        """Start the background sender threads"""
+        if not self.running:
+            self.running = True
+            self._threads = [
+                threading.Thread(target=self._run_sender, name=f'email-sender-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Email sender started with {self.workers} workers")
     
-    def send_email(self, to_emails, subject, body, html_body=None, attachments=None):
-        """Send email to recipients"""
+    def stop(self):
+        """Stop the sender threads, letting in-flight batches finish"""
+        self.running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        logger.info("Email sender stopped")
+    
+    def send_email(self, to_emails, subject, body, html_body=None, attachments=None, session=None):
+        """Queue an email for background delivery
+
+        Attachments are file paths and are read when the message is sent, so
+        they must still exist then. Pass a session to queue the email as part
+        of the caller's transaction; otherwise it is committed on its own.
+        """
         if not self.enabled:
             logger.warning("Email service not configured. Skipping email send.")
             return False
         
+        if isinstance(to_emails, str):
+            to_emails = [email.strip() for email in to_emails.split(',') if email.strip()]
+        
+        row = {
+            'recipients': ', '.join(to_emails),
+            'subject': subject,
+            'body': body,
+            'html_body': html_body,
+            'attachments': json.dumps(list(attachments)) if attachments else None,
+            'status': 'PENDING',
+            'attempts': 0,
+            'next_attempt_at': datetime.utcnow(),
+            'created_at': datetime.utcnow()
+        }
+        
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.from_email
-            msg['To'] = ', '.join(to_emails) if isinstance(to_emails, list) else to_emails
-            msg['Subject'] = subject
-            
-            # Add text body
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Add HTML body if provided
-            if html_body:
-                msg.attach(MIMEText(html_body, 'html'))
-            
-            # Add attachments if provided
-            if attachments:
-                for attachment in attachments:
-                    with open(attachment, 'rb') as f:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(f.read())
-                        encoders.encode_base64(part)
-                        part.add_header(
-                            'Content-Disposition',
-                            f'attachment; filename= {os.path.basename(attachment)}'
-                        )
-                        msg.attach(part)
-            
-            # Send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.send_message(msg)
-            server.quit()
-            
-            logger.info(f"Email sent successfully to {to_emails}")
-            return True
-            
+            if session is not None:
+                session.execute(insert(OutboxEmail), [row])
+            else:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(OutboxEmail), [row])
         except Exception as e:
-            logger.error(f"Failed to send email: {str(e)}")
+            logger.error(f"Failed to queue email: {str(e)}")
             return False
+        
+        self._wakeup.set()
+        logger.info(f"Email queued for {row['recipients']}")
+        return True
+    
+    def deliver_pending(self):
+        """Send every due message from the calling thread, returning the number sent"""
+        connection = SMTPConnection(self)
+        sent = 0
+        try:
+            while True:
+                batch = self._claim_batch()
+                if not batch:
+                    break
+                sent += self._deliver_batch(batch, connection)
+        finally:
+            connection.close()
+        return sent
+    
+    def metrics(self):
+        """Queue depth, totals and per-minute throughput for the last hour"""
+        with db.engine.connect() as connection:
+            queue = dict(connection.execute(
+                select(OutboxEmail.status, func.count(OutboxEmail.id)).group_by(OutboxEmail.status)
+            ).all())
+        with self._lock:
+            minutes = [dict(bucket, minute=datetime.utcfromtimestamp(bucket['minute']).isoformat())
+                       for bucket in self._minutes]
+            totals = dict(self._totals)
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'workers': self.workers if self.running else 0,
+            'queue': queue,
+            'totals': totals,
+            'per_minute': minutes
+        }
+    
+    def purge_sent(self, days=30):
+        """Delete sent messages older than the given number of days"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                OutboxEmail.__table__.delete().where(OutboxEmail.status == 'SENT', OutboxEmail.sent_at < cutoff)
+            )
+        return result.rowcount
+    
+    def _record(self, key, count=1):
+        """Add to the current minute's counters"""
+        minute = int(time.time() // 60) * 60
+        with self._lock:
+            if not self._minutes or self._minutes[-1]['minute'] != minute:
+                self._minutes.append({'minute': minute, 'sent': 0, 'retried': 0, 'failed': 0,
+                                      'connections': 0, 'reused': 0, 'bytes': 0})
+            self._minutes[-1][key] += count
+            self._totals[key] += count
+    
+    def _run_sender(self):
+        """Sender thread loop: claim a batch, deliver it, sleep when the queue is empty"""
+        connection = SMTPConnection(self)
+        with self.app.app_context():
+            while self.running:
+                try:
+                    batch = self._claim_batch()
+                    if batch:
+                        self._deliver_batch(batch, connection)
+                        continue
+                except Exception as e:
+                    logger.error(f"Email sender error: {str(e)}")
+                connection.close_if_idle()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        connection.close()
+    
+    def _claim_batch(self):
+        """Mark up to batch_size due messages as being sent by this claim
+
+        Messages left in SENDING by a sender that died are claimable again
+        once their claim has expired.
+        """
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = or_(OutboxEmail.status == 'PENDING',
+                        and_(OutboxEmail.status == 'SENDING', OutboxEmail.claimed_until < now))
+        with db.engine.begin() as connection:
+            ids = connection.scalars(
+                select(OutboxEmail.id)
+                .where(claimable, OutboxEmail.next_attempt_at <= now)
+                .order_by(OutboxEmail.next_attempt_at, OutboxEmail.id)
+                .limit(self.batch_size)
+            ).all()
+            if not ids:
+                return []
+            connection.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id.in_(ids), claimable)
+                .values(status='SENDING', claimed_by=token,
+                        claimed_until=now + timedelta(seconds=self.claim_timeout))
+            )
+            return connection.execute(
+                select(OutboxEmail.id, OutboxEmail.recipients, OutboxEmail.subject, OutboxEmail.body,
+                       OutboxEmail.html_body, OutboxEmail.attachments, OutboxEmail.attempts,
+                       OutboxEmail.claimed_by)
+                .where(OutboxEmail.claimed_by == token)
+                .order_by(OutboxEmail.id)
+            ).all()
+    
+    def _deliver_batch(self, batch, connection):
+        """Send a claimed batch over one connection, returning the number sent"""
+        sent = 0
+        for email in batch:
+            recipients = [address.strip() for address in email.recipients.split(',') if address.strip()]
+            attachments = json.loads(email.attachments) if email.attachments else []
+            try:
+                missing = [path for path in attachments if not os.path.isfile(path)]
+                if missing:
+                    raise FileNotFoundError(f"Attachment not found: {', '.join(missing)}")
+                
+                server = connection.get()
+                try:
+                    size = self._transmit(server, recipients, self._message_chunks(email, recipients, attachments))
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused):
+                    # Refused before DATA, the connection is still usable
+                    server.rset()
+                    connection.used()
+                    raise
+                except Exception:
+                    # The session is in an unknown state, start over on a new connection
+                    connection.discard()
+                    raise
+                connection.used()
+            except Exception as e:
+                self._mark_failed(email, e)
+                continue
+            
+            self._mark_sent(email)
+            self._record('sent')
+            self._record('bytes', size)
+            sent += 1
+        return sent
+    
+    def _transmit(self, server, recipients, chunks):
+        """Run one SMTP transaction, streaming the DATA section chunk by chunk"""
+        server.ehlo_or_helo_if_needed()
+        code, response = server.mail(self.from_email)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, response, self.from_email)
+        
+        refused = {}
+        for recipient in recipients:
+            code, response = server.rcpt(recipient)
+            if code not in (250, 251):
+                refused[recipient] = (code, response)
+        if len(refused) == len(recipients):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if refused:
+            logger.warning(f"Recipients refused: {', '.join(refused)}")
+        
+        code, response = server.docmd('DATA')
+        if code != 354:
+            raise smtplib.SMTPDataError(code, response)
+        
+        size = 0
+        for chunk in chunks:
+            # Dot-stuffing: every chunk ends on a line boundary
+            chunk = re.sub(rb'(?m)^\.', b'..', chunk)
+            server.send(chunk)
+            size += len(chunk)
+        server.send(b'.\r\n')
+        code, response = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+        return size
+    
+    def _message_chunks(self, email, recipients, attachments):
+        """Yield the message as CRLF terminated byte chunks
+
+        Text and HTML bodies are small and built with the email package;
+        attachments are base64 encoded from disk a chunk at a time so a large
+        report never has to be held in memory.
+        """
+        boundary = f"=={uuid.uuid4().hex}"
+        headers = [
+            ('From', self.from_email),
+            ('To', ', '.join(recipients)),
+            ('Subject', email.subject),
+            ('Date', formatdate(localtime=True)),
+            ('Message-ID', make_msgid()),
+            ('MIME-Version', '1.0'),
+            ('Content-Type', f'multipart/mixed; boundary="{boundary}"')
+        ]
+        yield ''.join(SMTP.fold(*SMTP.header_store_parse(name, value)) for name, value in headers).encode('ascii') + b'\r\n'
+        
+        bodies = MIMEMultipart('alternative')
+        bodies.attach(MIMEText(email.body, 'plain', 'utf-8'))
+        if email.html_body:
+            bodies.attach(MIMEText(email.html_body, 'html', 'utf-8'))
+        del bodies['MIME-Version']
+        part = bodies.as_bytes(policy=SMTP)
+        yield f'--{boundary}\r\n'.encode('ascii') + part + (b'' if part.endswith(b'\r\n') else b'\r\n')
+        
+        for path in attachments:
+            filename = os.path.basename(path)
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            part_headers = [
+                ('Content-Type', content_type),
+                ('Content-Transfer-Encoding', 'base64'),
+                ('Content-Disposition', f'attachment; filename="{filename}"')
+            ]
+            yield (f'--{boundary}\r\n' + ''.join(SMTP.fold(*SMTP.header_store_parse(name, value)) for name, value in part_headers)
+                   ).encode('utf-8') + b'\r\n'
+            with open(path, 'rb') as f:
+                while True:
+                    data = f.read(ATTACHMENT_CHUNK)
+                    if not data:
+                        break
+                    yield base64.encodebytes(data).replace(b'\n', b'\r\n')
+        
+        yield f'--{boundary}--\r\n'.encode('ascii')
+    
+    def _is_permanent(self, error):
+        if isinstance(error, (FileNotFoundError, smtplib.SMTPRecipientsRefused)):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 500 <= error.smtp_code < 600
+        return False
+    
+    def _mark_sent(self, email):
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id == email.id, OutboxEmail.claimed_by == email.claimed_by)
+                .values(status='SENT', attempts=email.attempts + 1, sent_at=now,
+                        claimed_by=None, claimed_until=None, last_error=None)
+            )
+    
+    def _mark_failed(self, email, error):
+        """Schedule a retry with exponential backoff, or give up"""
+        attempts = email.attempts + 1
+        values = {'attempts': attempts, 'last_error': str(error)[:1000], 'claimed_by': None, 'claimed_until': None}
+        if self._is_permanent(error) or attempts >= self.max_attempts:
+            values['status'] = 'FAILED'
+            self._record('failed')
+            logger.error(f"Giving up on email {email.id} after {attempts} attempts: {str(error)}")
+        else:
+            delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            values['status'] = 'PENDING'
+            values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+            self._record('retried')
+            logger.warning(f"Email {email.id} failed (attempt {attempts}), retrying in {int(delay)}s: {str(error)}")
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id == email.id, OutboxEmail.claimed_by == email.claimed_by)
+                .values(**values)
+            )
     
     def send_low_stock_alert(self):
         """Send low stock alert to administrators"""
         try:
-            # Get low stock products
-            low_stock_products = Product.query.filter(
-                Product.quantity_in_stock <= Product.reorder_level,
-                Product.is_active == True
-            ).all()
+            # Get products with an active low stock alert
+            low_stock_products = stock_alert_engine.active_alerts()
             
             if not low_stock_products:
                 return True  # No low stock items
@@ -0,0 +1,128 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DomainEvent:
+    """Something that happened in the domain, delivered after commit"""
+
+    __slots__ = ('type', 'payload', 'occurred_at')
+
+    def __init__(self, event_type, payload, occurred_at=None):
+        self.type = event_type
+        self.payload = payload
+        self.occurred_at = occurred_at or datetime.utcnow()
+
+    def to_dict(self):
+        return {'type': self.type, 'payload': self.payload, 'occurred_at': self.occurred_at.isoformat()}
+
+_handlers = defaultdict(list)
+
+def subscribe(event_type, handler=None):
+    """Register a handler for an event type ('*' receives everything)
+
+    Can be used directly or as a decorator.
+    """
+    def register(func):
+        _handlers[event_type].append(func)
+        return func
+    return register(handler) if handler else register
+
+def emit(event_type, payload, session=None):
+    """Queue an event on the session; it is dispatched only if the transaction commits
+
+    Without a session the event is dispatched immediately.
+    """
+    domain_event = DomainEvent(event_type, payload)
+    if session is None:
+        dispatch(domain_event)
+    else:
+        session.info.setdefault('pending_events', []).append(domain_event)
+    return domain_event
+
+def dispatch(domain_event):
+    """Deliver an event to its handlers; handler errors are logged, never raised"""
+    for handler in _handlers.get(domain_event.type, []) + _handlers.get('*', []):
+        try:
+            handler(domain_event)
+        except Exception as e:
+            logger.error(f"Event handler {getattr(handler, '__name__', handler)} failed for {domain_event.type}: {e}")
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_after_commit(session):
+    for domain_event in session.info.pop('pending_events', []):
+        dispatch(domain_event)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('pending_events', None)
+
+def _number(value):
+    return float(value) if value is not None else None
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
+
+@event.listens_for(Session, 'after_flush')
+def _emit_domain_events(session, flush_context):
+    """Turn flushed stock movements, sales, orders and work order status changes into events"""
+    from models import StockMovement, Sale, Order, WorkOrder
+
+    for obj in session.new:
+        if isinstance(obj, StockMovement):
+            emit('stock.movement', {
+                'id': obj.id,
+                'product_id': obj.product_id,
+                'movement_type': obj.movement_type,
+                'quantity': obj.quantity,
+                'reference_type': obj.reference_type,
+                'reference_id': obj.reference_id,
+                'created_at': _timestamp(obj.created_at)
+            }, session)
+        elif isinstance(obj, Sale):
+            emit('sale.created', {
+                'id': obj.id,
+                'sale_number': obj.sale_number,
+                'customer_id': obj.customer_id,
+                'total_amount': _number(obj.total_amount),
+                'payment_status': obj.payment_status,
+                'sale_date': _timestamp(obj.sale_date)
+            }, session)
+        elif isinstance(obj, Order):
+            emit('order.created', {
+                'id': obj.id,
+                'order_number': obj.order_number,
+                'customer_id': obj.customer_id,
+                'status': obj.status,
+                'total_amount': _number(obj.total_amount)
+            }, session)
+
+    for obj in session.dirty:
+        if isinstance(obj, WorkOrder):
+            history = inspect(obj).attrs.status.history
+            if history.has_changes():
+                emit('work_order.status_changed', {
+                    'id': obj.id,
+                    'work_order_number': obj.work_order_number,
+                    'project_id': obj.project_id,
+                    'status': obj.status,
+                    'previous_status': history.deleted[0] if history.deleted else None
+                }, session)
+        elif isinstance(obj, Order):
+            history = inspect(obj).attrs.status.history
+            if history.has_changes():
+                emit('order.status_changed', {
+                    'id': obj.id,
+                    'order_number': obj.order_number,
+                    'customer_id': obj.customer_id,
+                    'status': obj.status,
+                    'previous_status': history.deleted[0] if history.deleted else None
+                }, session)
+
+    for obj in session.deleted:
+        if isinstance(obj, Sale):
+            emit('sale.deleted', {'id': obj.id, 'sale_number': obj.sale_number}, session)
@@ -162,6 +162,7 @@ class PurchaseReportForm(ReportFilterForm):
         ('supplier_performance', 'Supplier Performance Analysis'),
         ('cost_analysis', 'Purchase Cost Analysis'),
         ('reorder_suggestions', 'Reorder Suggestions Report'),
+        ('replenishment_policy', 'Replenishment Policy Comparison'),
         ('supplier_payment', 'Supplier Payment Status')
     ], default='purchase_history')
     supplier_id = SelectField('Supplier', coerce=int, validators=[Optional()], default=0)
@@ -197,7 +198,8 @@ class PerformanceReportForm(ReportFilterForm):
         ('inventory_turnover', 'Inventory Turnover Analysis'),
         ('revenue_forecast', 'Revenue Forecast Report'),
         ('product_profitability', 'Product Profitability Analysis'),
-        ('business_growth', 'Business Growth Analysis')
+        ('business_growth', 'Business Growth Analysis'),
+        ('equipment_utilization', 'Equipment Utilization Analysis')
     ], default='sales_trend')
     period_grouping = SelectField('Period Grouping', choices=[
         ('daily', 'Daily'),
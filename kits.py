@@ -0,0 +1,250 @@
+from datetime import datetime
+from sqlalchemy import event, select, update, case
+from sqlalchemy.orm import Session
+from database import db
+from models import Kit, KitItem, Product, StockMovement
+from cache import reference_cache
+from deferred import deferred_engines
+import numpy as np
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+ASSEMBLY = 'KIT_ASSEMBLY'
+DISASSEMBLY = 'KIT_DISASSEMBLY'
+
+class KitAvailability:
+    """How many of every active kit current component stock can make
+
+    The kit structure is held as flat arrays (one entry per kit item,
+    grouped by kit) next to a stock vector of the products they use, so all
+    kits are computed at once as the minimum over each kit's entries of
+    stock // quantity. The structure reloads when kits or kit items change,
+    or after ttl seconds to pick up stock written by other processes.
+
+    Committed stock changes are applied to the vector as they happen and
+    only the kits using those products are recomputed.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._state = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('KIT_AVAILABILITY_TTL', self.ttl)
+
+    def _versions(self):
+        return (reference_cache.version(Kit.__tablename__), reference_cache.version(KitItem.__tablename__))
+
+    def _load(self):
+        rows = db.session.execute(
+            select(KitItem.kit_id, KitItem.product_id, KitItem.quantity, Product.quantity_in_stock)
+            .join(Kit, Kit.id == KitItem.kit_id)
+            .join(Product, Product.id == KitItem.product_id)
+            .where(Kit.is_active == True, KitItem.quantity > 0)
+            .order_by(KitItem.kit_id)
+        ).all()
+        kit_ids, entry_kit = np.unique(np.array([row.kit_id for row in rows], dtype=np.int64), return_inverse=True)
+        product_ids, entry_product = np.unique(np.array([row.product_id for row in rows], dtype=np.int64),
+                                               return_inverse=True)
+        stock = np.zeros(len(product_ids), dtype=np.int64)
+        stock[entry_product] = [max(row.quantity_in_stock or 0, 0) for row in rows]
+        state = {
+            'versions': self._versions(),
+            'loaded_at': time.monotonic(),
+            'kit_ids': kit_ids,
+            'product_index': {int(product_id): i for i, product_id in enumerate(product_ids)},
+            'entry_kit': entry_kit.ravel(),
+            'entry_product': entry_product.ravel(),
+            'entry_quantity': np.array([row.quantity for row in rows], dtype=np.int64),
+            'stock': stock
+        }
+        state['buildable'] = self._compute(state)
+        return state
+
+    @staticmethod
+    def _compute(state, kits=None):
+        """Buildable counts for every kit, or only the given kit positions"""
+        per_entry = state['stock'][state['entry_product']] // state['entry_quantity']
+        entry_kit = state['entry_kit']
+        if kits is None:
+            buildable = np.full(len(state['kit_ids']), np.iinfo(np.int64).max)
+            np.minimum.at(buildable, entry_kit, per_entry)
+            return buildable
+        buildable = state['buildable'].copy()
+        buildable[kits] = np.iinfo(np.int64).max
+        touched = np.isin(entry_kit, kits)
+        np.minimum.at(buildable, entry_kit[touched], per_entry[touched])
+        return buildable
+
+    def _current(self):
+        state = self._state
+        if state is None or state['versions'] != self._versions() or time.monotonic() - state['loaded_at'] > self.ttl:
+            with self._lock:
+                state = self._state = self._load()
+        return state
+
+    def buildable(self, kit_ids=None):
+        """{kit_id: units buildable}; kits without items are left out"""
+        state = self._current()
+        counts = {int(kit_id): int(state['buildable'][i]) for i, kit_id in enumerate(state['kit_ids'])}
+        if kit_ids is None:
+            return counts
+        return {kit_id: counts.get(kit_id, 0) for kit_id in kit_ids}
+
+    def apply_stock(self, changes):
+        """Apply {product_id: quantity_in_stock} and recompute the kits using those products"""
+        state = self._state
+        if state is None or not changes:
+            return
+        with self._lock:
+            if state is not self._state:
+                return
+            positions = [(state['product_index'][product_id], quantity)
+                         for product_id, quantity in changes.items() if product_id in state['product_index']]
+            if not positions:
+                return
+            stock = state['stock'].copy()
+            for position, quantity in positions:
+                stock[position] = max(quantity or 0, 0)
+            changed = np.array([position for position, _ in positions], dtype=np.int64)
+            kits = np.unique(state['entry_kit'][np.isin(state['entry_product'], changed)])
+            updated = dict(state, stock=stock)
+            updated['buildable'] = self._compute(updated, kits)
+            self._state = updated
+
+    def refresh_products(self, product_ids):
+        """Reread stock of products changed outside the ORM unit of work (bulk UPDATEs)"""
+        if self._state is None or not product_ids:
+            return
+        self.apply_stock(dict(db.session.execute(
+            select(Product.id, Product.quantity_in_stock).where(Product.id.in_(list(product_ids)))
+        ).all()))
+
+    def stock_product(self, kit, create=False):
+        """The product holding assembled units of a kit: the one whose SKU is the kit code"""
+        product = Product.query.filter_by(sku=kit.kit_code).first()
+        if product is None and create:
+            components = [item.product for item in kit.kit_items]
+            cost = sum((item.product.cost or 0) * item.quantity for item in kit.kit_items)
+            product = Product(
+                name=kit.name,
+                description=kit.description,
+                sku=kit.kit_code,
+                category_id=kit.category_id or components[0].category_id,
+                price=kit.total_cost or cost,
+                cost=cost,
+                quantity_in_stock=0
+            )
+            db.session.add(product)
+            db.session.flush()
+        return product
+
+    def assemble(self, kit_id, quantity, user_id=None):
+        """Build quantity kits: components go OUT, the kit product comes IN
+
+        Stock of every product moves in one UPDATE guarded against going
+        negative; unless it reaches every row the transaction is rolled
+        back. The movements are inserted as one batch in the same
+        transaction. Raises ValueError when the kit cannot be built.
+        """
+        return self._post(kit_id, quantity, user_id, ASSEMBLY)
+
+    def disassemble(self, kit_id, quantity, user_id=None):
+        """Break quantity assembled kits back into their components"""
+        return self._post(kit_id, quantity, user_id, DISASSEMBLY)
+
+    def _post(self, kit_id, quantity, user_id, reference_type):
+        if quantity <= 0:
+            raise ValueError('Quantity must be positive')
+        kit = db.session.get(Kit, kit_id)
+        if kit is None or not kit.is_active:
+            raise ValueError(f"Kit {kit_id} not found")
+        if not kit.kit_items:
+            raise ValueError(f"Kit {kit.kit_code} has no items")
+
+        assembling = reference_type == ASSEMBLY
+        kit_product = self.stock_product(kit, create=assembling)
+        if kit_product is None:
+            raise ValueError(f"No assembled stock of kit {kit.kit_code}")
+
+        # Signed stock change per product, components combined when listed twice
+        delta = {}
+        for item in kit.kit_items:
+            delta[item.product_id] = delta.get(item.product_id, 0) - item.quantity * quantity
+        delta[kit_product.id] = delta.get(kit_product.id, 0) + quantity
+        if not assembling:
+            delta = {product_id: -change for product_id, change in delta.items()}
+
+        change = case(delta, value=Product.id)
+        try:
+            result = db.session.execute(
+                update(Product)
+                .where(Product.id.in_(list(delta)), Product.quantity_in_stock + change >= 0)
+                .values(quantity_in_stock=Product.quantity_in_stock + change)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(delta):
+                db.session.rollback()
+                short = db.session.execute(
+                    select(Product.name).where(Product.id.in_(list(delta)),
+                                               Product.quantity_in_stock + change < 0)
+                ).scalars().all()
+                raise ValueError(f"Insufficient stock for {', '.join(short) or 'kit'}")
+
+            # Added through the ORM so stock.movement events still go out; flushed as one batch
+            now = datetime.utcnow()
+            verb = 'Assembled' if assembling else 'Disassembled'
+            db.session.add_all([StockMovement(
+                product_id=product_id,
+                movement_type='IN' if change > 0 else 'OUT',
+                quantity=abs(change),
+                reference_type=reference_type,
+                reference_id=kit.id,
+                notes=f"{verb} {quantity} x kit {kit.kit_code}",
+                created_by=user_id,
+                created_at=now
+            ) for product_id, change in delta.items() if change])
+
+            from alerts import stock_alert_engine
+            stock_alert_engine.evaluate_products(db.session, list(delta))
+            db.session.commit()
+        except ValueError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Posting {reference_type} of kit {kit.kit_code} failed: {str(e)}")
+            raise ValueError(f"Could not post kit {kit.kit_code}") from e
+
+        # Product rows changed through Core, so ORM-based caches do not see them
+        reference_cache.bump(Product.__tablename__)
+        self.refresh_products(list(delta))
+        return {'kit_id': kit.id, 'kit_product_id': kit_product.id, 'quantity': quantity,
+                'movements': sum(1 for change in delta.values() if change)}
+
+# Global kit availability instance
+kit_availability = deferred_engines.register(KitAvailability())
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stock_changes(session, flush_context):
+    """Remember stock levels of products flushed in this transaction"""
+    if kit_availability._state is None:
+        return
+    changes = session.info.setdefault('kit_stock_changes', {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Product):
+            changes[obj.id] = obj.quantity_in_stock
+
+@event.listens_for(Session, 'after_commit')
+def _apply_stock_changes(session):
+    changes = session.info.pop('kit_stock_changes', None)
+    if changes:
+        kit_availability.apply_stock(changes)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_stock_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('kit_stock_changes', None)
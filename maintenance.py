@@ -0,0 +1,205 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, insert, func
+from database import db
+from models import MaintenanceLog, EquipmentMapping, UsageRollup
+from deferred import deferred_engines
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+FAILURE_TYPES = ('Corrective', 'Emergency')
+OPEN_STATUSES = ('Scheduled', 'In Progress')
+
+# Projections further out than this are not dates anyone can plan for
+MAX_PROJECTION_DAYS = 3650
+
+class MaintenancePlanner:
+    """Failure statistics and predicted service dates for the equipment fleet
+
+    Reliability is measured in usage hours, taken from the daily usage
+    rollups: MTBF is the hours run divided by the number of failures
+    (Corrective and Emergency logs), MTTR the mean time from a failure being
+    logged to its completion. Equipment with fewer than min_failures of its
+    own borrows the pooled MTBF of the same product, then of the fleet.
+
+    Hours run since the last failure or completed service, divided by the
+    recent usage rate, give the projected failure date; the service date is
+    set at service_fraction of the MTBF so work happens before the expected
+    failure. Equipment with no usable history falls back to a fixed
+    interval. Everything is computed for the whole fleet with array
+    operations over a handful of grouped queries.
+    """
+
+    def __init__(self, service_fraction=0.8, min_failures=2, rate_days=30, horizon_days=14,
+                 default_interval_days=180):
+        self.service_fraction = service_fraction
+        self.min_failures = min_failures
+        self.rate_days = rate_days
+        self.horizon_days = horizon_days
+        self.default_interval_days = default_interval_days
+
+    def init_app(self, app):
+        self.service_fraction = app.config.get('MAINTENANCE_SERVICE_FRACTION', self.service_fraction)
+        self.min_failures = app.config.get('MAINTENANCE_MIN_FAILURES', self.min_failures)
+        self.rate_days = app.config.get('MAINTENANCE_RATE_DAYS', self.rate_days)
+        self.horizon_days = app.config.get('MAINTENANCE_HORIZON_DAYS', self.horizon_days)
+        self.default_interval_days = app.config.get('MAINTENANCE_DEFAULT_INTERVAL_DAYS', self.default_interval_days)
+
+    def _load(self):
+        usage = db.session.execute(
+            select(UsageRollup.equipment_id, UsageRollup.period_start, func.sum(UsageRollup.hours_used))
+            .where(UsageRollup.period == 'day', UsageRollup.equipment_id != '')
+            .group_by(UsageRollup.equipment_id, UsageRollup.period_start)
+        ).all()
+        products = dict(db.session.execute(
+            select(UsageRollup.equipment_id, func.max(UsageRollup.product_id))
+            .where(UsageRollup.period == 'week', UsageRollup.equipment_id != '')
+            .group_by(UsageRollup.equipment_id)
+        ).all())
+        logs = db.session.execute(
+            select(MaintenanceLog.equipment_id, MaintenanceLog.product_id, MaintenanceLog.maintenance_type,
+                   MaintenanceLog.status, MaintenanceLog.scheduled_date, MaintenanceLog.completed_date,
+                   MaintenanceLog.created_at)
+            .where(MaintenanceLog.equipment_id.isnot(None), MaintenanceLog.status != 'Cancelled')
+        ).all()
+        mapping = {e.equipment_id: e for e in EquipmentMapping.query.all()}
+        return usage, products, logs, mapping
+
+    def forecast(self, today=None):
+        """Reliability figures and projected dates of every active equipment, soonest service first
+
+        Usage comes from the rollups as of the last rollup_equipment_usage run.
+        """
+        today = today or date.today()
+        usage, products, logs, mapping = self._load()
+
+        # The fleet: equipment seen in usage or logs, minus what is mapped as inactive
+        seen = {row.equipment_id for row in usage} | {row.equipment_id for row in logs}
+        fleet = sorted(e for e in seen if e and (e not in mapping or mapping[e].status == 'Active'))
+        if not fleet:
+            return []
+        index = {equipment_id: i for i, equipment_id in enumerate(fleet)}
+        count = len(fleet)
+        for row in logs:
+            products.setdefault(row.equipment_id, row.product_id)
+
+        # Failures, repair times and the last reset (failure or completed service)
+        failures = np.zeros(count)
+        repair_hours = np.zeros(count)
+        repairs = np.zeros(count)
+        reset = np.full(count, -1, dtype=np.int64)
+        open_service = np.zeros(count, dtype=bool)
+        for row in logs:
+            i = index.get(row.equipment_id)
+            if i is None:
+                continue
+            started = row.scheduled_date or row.created_at
+            if row.maintenance_type in FAILURE_TYPES:
+                failures[i] += 1
+                if row.completed_date and started and row.completed_date >= started:
+                    repair_hours[i] += (row.completed_date - started).total_seconds() / 3600
+                    repairs[i] += 1
+                if started:
+                    reset[i] = max(reset[i], started.date().toordinal())
+            elif row.status in OPEN_STATUSES:
+                open_service[i] = True
+            if row.completed_date:
+                reset[i] = max(reset[i], row.completed_date.date().toordinal())
+
+        # Usage hours: in total, since the last reset and over the recent window
+        rows = [(index[row.equipment_id], row.period_start.toordinal(), float(row[2] or 0))
+                for row in usage if row.equipment_id in index]
+        equipment_index = np.array([r[0] for r in rows], dtype=np.int64)
+        days = np.array([r[1] for r in rows], dtype=np.int64)
+        hours = np.array([r[2] for r in rows])
+        total_hours = np.bincount(equipment_index, weights=hours, minlength=count)
+        since_reset = np.bincount(equipment_index, weights=hours * (days > reset[equipment_index]),
+                                  minlength=count)
+        recent = days > today.toordinal() - self.rate_days
+        rate = np.bincount(equipment_index, weights=hours * recent, minlength=count) / self.rate_days
+        first_day = np.full(count, today.toordinal(), dtype=np.int64)
+        np.minimum.at(first_day, equipment_index, days)
+
+        # MTBF with pooling by product, then fleet, for sparse histories
+        product_keys = np.array([products.get(e) or 0 for e in fleet], dtype=np.int64)
+        _, product_index = np.unique(product_keys, return_inverse=True)
+        pooled_hours = np.bincount(product_index, weights=total_hours)[product_index]
+        pooled_failures = np.bincount(product_index, weights=failures)[product_index]
+        fleet_mtbf = total_hours.sum() / failures.sum() if failures.sum() else np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            own = total_hours / failures
+            pooled = np.where(pooled_failures > 0, pooled_hours / pooled_failures, fleet_mtbf)
+            mtbf = np.where(failures >= self.min_failures, own, pooled)
+            mttr = np.where(repairs > 0, repair_hours / repairs, np.nan)
+            days_to_failure = np.maximum(mtbf - since_reset, 0) / rate
+            days_to_service = np.maximum(self.service_fraction * mtbf - since_reset, 0) / rate
+
+        # Without an MTBF or any recent use, service on the fixed interval
+        start = np.where(reset >= 0, reset, first_day)
+        fallback = start + self.default_interval_days - today.toordinal()
+        predicted = np.isfinite(days_to_service)
+        days_to_service = np.where(predicted, days_to_service, np.maximum(fallback, 0))
+        days_to_service = np.minimum(days_to_service, MAX_PROJECTION_DAYS)
+        days_to_failure = np.where(days_to_failure <= MAX_PROJECTION_DAYS, days_to_failure, np.nan)
+
+        result = []
+        for i, equipment_id in enumerate(fleet):
+            failure_date = today + timedelta(days=int(days_to_failure[i])) if np.isfinite(days_to_failure[i]) else None
+            equipment = mapping.get(equipment_id)
+            result.append({
+                'equipment_id': equipment_id,
+                'equipment_name': equipment.equipment_name if equipment else equipment_id,
+                'product_id': products.get(equipment_id),
+                'failures': int(failures[i]),
+                'usage_hours': round(float(total_hours[i]), 1),
+                'hours_since_service': round(float(since_reset[i]), 1),
+                'hours_per_day': round(float(rate[i]), 2),
+                'mtbf_hours': round(float(mtbf[i]), 1) if np.isfinite(mtbf[i]) else None,
+                'mtbf_source': 'own' if failures[i] >= self.min_failures else
+                               'product' if pooled_failures[i] > 0 else 'fleet' if np.isfinite(mtbf[i]) else None,
+                'mttr_hours': round(float(mttr[i]), 1) if np.isfinite(mttr[i]) else None,
+                'projected_failure': failure_date.isoformat() if failure_date else None,
+                'next_service': (today + timedelta(days=int(days_to_service[i]))).isoformat(),
+                'basis': 'mtbf' if predicted[i] else 'interval',
+                'service_open': bool(open_service[i])
+            })
+        result.sort(key=lambda r: (r['next_service'], r['equipment_id']))
+        return result
+
+    def schedule(self, today=None, user_id=None):
+        """Add Preventive maintenance logs for services due within the horizon
+
+        Equipment that already has an open service, or no product to book it
+        against, is skipped. Returns the number of logs created.
+        """
+        today = today or date.today()
+        horizon = (today + timedelta(days=self.horizon_days)).isoformat()
+        due = [f for f in self.forecast(today)
+               if f['next_service'] <= horizon and not f['service_open'] and f['product_id']]
+        if not due:
+            return 0
+
+        now = datetime.utcnow()
+        rows = [{
+            'product_id': f['product_id'],
+            'equipment_id': f['equipment_id'],
+            'maintenance_type': 'Preventive',
+            'description': f"Predicted service after {f['hours_since_service']} h of use"
+                           + (f", MTBF {f['mtbf_hours']} h" if f['mtbf_hours'] else ''),
+            'performed_by': user_id,
+            'scheduled_date': datetime.combine(date.fromisoformat(f['next_service']), datetime.min.time()),
+            'status': 'Scheduled',
+            'created_at': now
+        } for f in due]
+        try:
+            db.session.execute(insert(MaintenanceLog), rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Scheduling maintenance failed: {str(e)}")
+            return 0
+        return len(rows)
+
+# Global maintenance planner instance
+maintenance_planner = deferred_engines.register(MaintenancePlanner())
@@ -121,6 +121,30 @@ class UsageHistory(db.Model):
     operator_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     notes = db.Column(db.Text)
 
+class UsageRollupGap(db.Model):
+    usage_id = db.Column(db.Integer, primary_key=True)  # usage_history id missing when a later one was rolled up
+    seen_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class UsageRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)  # day, week (weeks start on Monday)
+    period_start = db.Column(db.Date, nullable=False)
+    equipment_id = db.Column(db.String(100), nullable=False, default='')  # '' for usage without equipment
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    entries = db.Column(db.Integer, default=0, nullable=False)
+    hours_used = db.Column(db.Numeric(12, 2), default=0)
+    cycles_completed = db.Column(db.Integer, default=0)
+    efficiency_sum = db.Column(db.Float, default=0)
+    efficiency_count = db.Column(db.Integer, default=0)
+    anomaly_score = db.Column(db.Float)  # Day rows: z-score of mean efficiency against the rolling baseline
+    is_anomaly = db.Column(db.Boolean, default=False, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('period', 'period_start', 'equipment_id', 'product_id', name='uq_usage_rollup_key'),
+        db.Index('ix_usage_rollup_equipment', 'period', 'equipment_id', 'period_start'),
+    )
+
 class EquipmentMapping(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     equipment_id = db.Column(db.String(100), unique=True, nullable=False)
@@ -166,9 +190,9 @@ shelf_products = db.Table('shelf_products',
 class APIKey(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key_name = db.Column(db.String(100), nullable=False)
-    api_key = db.Column(db.String(255), unique=True, nullable=False)
+    api_key = db.Column(db.String(255), unique=True, nullable=False)  # SHA-256 hex digest of the key
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    permissions = db.Column(db.JSON)
+    permissions = db.Column(db.JSON)  # Permission names, narrows the user's role when set
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_used = db.Column(db.DateTime)
@@ -348,6 +372,23 @@ class WorkOrderItem(db.Model):
     total_cost = db.Column(db.Numeric(10, 2))
     product = db.relationship('Product', backref='work_order_items')
 
+class PlannedOrder(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    order_type = db.Column(db.String(10), nullable=False)  # Purchase, Work (the product has an active BOM)
+    quantity = db.Column(db.Integer, nullable=False)
+    release_date = db.Column(db.Date, nullable=False)
+    due_date = db.Column(db.Date, nullable=False)
+    low_level_code = db.Column(db.Integer, default=0, nullable=False)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'))
+    is_past_due = db.Column(db.Boolean, default=False, nullable=False)  # Should have been released already
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        db.Index('ix_planned_order_release', 'release_date'),
+    )
+
 class Sale(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sale_number = db.Column(db.String(20), unique=True, nullable=False)
@@ -371,4 +412,113 @@ class SaleItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
-    product = db.relationship('Product', backref='sale_items')
\ No newline at end of file
+    product = db.relationship('Product', backref='sale_items')
+
+class SystemSetting(db.Model):
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchedulerLease(db.Model):
+    job_name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(200), nullable=False)
+    last_fire_time = db.Column(db.DateTime)
+    acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class StockAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), unique=True, nullable=False)
+    level = db.Column(db.String(20), default='OK', nullable=False)  # OK, LOW, CRITICAL
+    is_active = db.Column(db.Boolean, default=False, nullable=False, index=True)
+    quantity = db.Column(db.Integer)
+    threshold = db.Column(db.Integer)
+    triggered_at = db.Column(db.DateTime)
+    cleared_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    product = db.relationship('Product', backref=db.backref('stock_alert', uselist=False, cascade='all, delete-orphan'))
+
+class OutboxEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # Comma separated
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    attachments = db.Column(db.Text)  # JSON list of file paths, read at send time
+    status = db.Column(db.String(20), default='PENDING', nullable=False)  # PENDING, SENDING, SENT, FAILED
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_by = db.Column(db.String(64))
+    claimed_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+class WebhookDeadLetter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_id = db.Column(db.Integer, db.ForeignKey('webhook.id', ondelete='CASCADE'), nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON list of events
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    status_code = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    webhook = db.relationship('Webhook', backref=db.backref('dead_letters', cascade='all, delete-orphan'))
+
+class ShelfEnvironmentAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    shelf_id = db.Column(db.Integer, db.ForeignKey('smart_shelf.id', ondelete='CASCADE'), nullable=False)
+    metric = db.Column(db.String(20), nullable=False)  # temperature, humidity
+    rule = db.Column(db.String(20), nullable=False)  # high, low, rate, excursion
+    value = db.Column(db.Numeric(10, 3))
+    limit_value = db.Column(db.Numeric(10, 3))
+    started_at = db.Column(db.DateTime, nullable=False)
+    cleared_at = db.Column(db.DateTime)
+    shelf = db.relationship('SmartShelf', backref=db.backref('environment_alerts', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_shelf_environment_alert_open', 'shelf_id', 'cleared_at'),
+    )
+
+class OutboxEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)  # product, category, supplier, customer, stock_movement, sale, order, project
+    entity_id = db.Column(db.Integer)  # NULL for bulk statements
+    operation = db.Column(db.String(20), nullable=False)  # INSERT, UPDATE, DELETE, BULK_UPDATE, BULK_DELETE
+    data = db.Column(db.Text)  # JSON: full row for INSERT/DELETE, changed columns for UPDATE
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_event_entity_id', 'entity', 'id'),
+    )
+
+class ChangeConsumerOffset(db.Model):
+    consumer = db.Column(db.String(100), primary_key=True)
+    position = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Notification(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    category = db.Column(db.String(20), nullable=False)  # stock, order, sale, work_order, system
+    level = db.Column(db.String(20), default='info', nullable=False)  # info, success, warning, danger
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text)
+    event_type = db.Column(db.String(50))
+    entity_id = db.Column(db.Integer)  # Product, order, sale or work order the event refers to
+    is_read = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    read_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_user_id_id', 'user_id', 'id'),
+        db.Index('ix_notification_user_unread', 'user_id', 'is_read'),
+    )
+
+class UserNotificationState(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,223 @@
+from collections import deque
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, insert, delete, func
+from database import db
+from models import (Product, WorkOrder, WorkOrderItem, Project, ProjectAssignment, ForecastData,
+                    PlannedOrder)
+from bom_engine import bom_engine
+from deferred import deferred_engines
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+OPEN_WORK_ORDER_STATUSES = ('Open', 'In Progress')
+
+def low_level_codes(graph):
+    """Deepest level each product appears at in any BOM (0 for end items)
+
+    Assemblies on a cycle are not exploded, so their edges are ignored.
+    """
+    edges = {parent: [child for child, _ in children] for parent, children in graph.children.items()
+             if parent not in graph.cyclic}
+    indegree = {}
+    for children in edges.values():
+        for child in children:
+            indegree[child] = indegree.get(child, 0) + 1
+    codes = {node: 0 for node in set(edges) | set(indegree)}
+    queue = deque(node for node in codes if node not in indegree)
+    while queue:
+        node = queue.popleft()
+        for child in edges.get(node, ()):
+            codes[child] = max(codes[child], codes[node] + 1)
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    return codes
+
+class MRPEngine:
+    """Regenerative material requirements planning over time buckets
+
+    Gross requirements come from open work orders (due at their project's
+    start, or now), less what the project has already reserved, and from
+    the newest forecast per product and day. Products are then planned one
+    low-level code at a time, so every product is netted only after all of
+    its parents have added their dependent demand:
+
+    - requirements are netted against on-hand stock above safety stock with
+      cumulative sums over the buckets (lot-for-lot),
+    - each planned receipt is offset by the product's lead time into a
+      planned release,
+    - releases of products with an active BOM are multiplied through their
+      BOM items into the next levels' gross requirements.
+
+    A run replaces all planned orders.
+    """
+
+    def __init__(self, bucket_days=7, horizon_buckets=26):
+        self.bucket_days = bucket_days
+        self.horizon_buckets = horizon_buckets
+
+    def init_app(self, app):
+        self.bucket_days = app.config.get('MRP_BUCKET_DAYS', self.bucket_days)
+        self.horizon_buckets = app.config.get('MRP_HORIZON_BUCKETS', self.horizon_buckets)
+
+    def _bucket(self, day, today):
+        """Bucket of a date; overdue dates fall in the first, None past the horizon"""
+        bucket = max((day - today).days, 0) // self.bucket_days
+        return bucket if bucket < self.horizon_buckets else None
+
+    def _work_order_demand(self, today):
+        """(product_id, bucket, quantity) still needed by open work orders, net of project reservations"""
+        rows = db.session.execute(
+            select(WorkOrderItem.product_id, WorkOrder.project_id, Project.start_date, WorkOrder.created_at,
+                   WorkOrderItem.quantity_required - func.coalesce(WorkOrderItem.quantity_used, 0))
+            .join(WorkOrder, WorkOrder.id == WorkOrderItem.work_order_id)
+            .outerjoin(Project, Project.id == WorkOrder.project_id)
+            .where(WorkOrder.status.in_(OPEN_WORK_ORDER_STATUSES))
+        ).all()
+        reserved = {(project_id, product_id): quantity for project_id, product_id, quantity in db.session.execute(
+            select(ProjectAssignment.project_id, ProjectAssignment.product_id,
+                   func.sum(ProjectAssignment.quantity_assigned - func.coalesce(ProjectAssignment.quantity_used, 0)))
+            .where(ProjectAssignment.status == 'Reserved')
+            .group_by(ProjectAssignment.project_id, ProjectAssignment.product_id)
+        ).all()}
+
+        # Reserved units were taken out of stock for the project, so they cover its earliest needs first
+        demand = []
+        for product_id, project_id, start_date, created_at, remaining in sorted(
+                rows, key=lambda row: row[2] or (row[3].date() if row[3] else today)):
+            if not remaining or remaining <= 0:
+                continue
+            key = (project_id, product_id)
+            covered = min(reserved.get(key) or 0, remaining) if project_id else 0
+            if covered:
+                reserved[key] -= covered
+                remaining -= covered
+            bucket = self._bucket(start_date or today, today)
+            if remaining > 0 and bucket is not None:
+                demand.append((product_id, bucket, remaining))
+        return demand
+
+    def _forecast_demand(self, today):
+        """(product_id, bucket, quantity) from the newest forecast per product and day in the horizon"""
+        horizon_end = today + timedelta(days=self.bucket_days * self.horizon_buckets)
+        newest = select(func.max(ForecastData.id)).where(
+            ForecastData.forecast_date >= today, ForecastData.forecast_date < horizon_end
+        ).group_by(ForecastData.product_id, ForecastData.forecast_date)
+        rows = db.session.execute(
+            select(ForecastData.product_id, ForecastData.forecast_date, ForecastData.predicted_demand)
+            .where(ForecastData.id.in_(newest), ForecastData.predicted_demand > 0)
+        ).all()
+        return [(product_id, self._bucket(forecast_date, today), quantity)
+                for product_id, forecast_date, quantity in rows]
+
+    def plan(self, today=None):
+        """Planned orders for the horizon as dicts, without writing them"""
+        today = today or date.today()
+        buckets = self.horizon_buckets
+        graph = bom_engine.graph()
+        codes = low_level_codes(graph)
+
+        products = db.session.execute(
+            select(Product.id, Product.quantity_in_stock, Product.safety_stock, Product.lead_time_days,
+                   Product.supplier_id)
+            .where(Product.is_active == True)
+        ).all()
+        if not products:
+            return []
+        index = {row.id: i for i, row in enumerate(products)}
+        count = len(products)
+        available = np.array([(row.quantity_in_stock or 0) - (row.safety_stock or 0) for row in products],
+                             dtype=np.float64)
+        lead_days = np.array([max(row.lead_time_days or 0, 0) for row in products], dtype=np.int64)
+        lead_buckets = -(-lead_days // self.bucket_days)
+        level = np.array([codes.get(row.id, 0) for row in products], dtype=np.int64)
+
+        # Independent demand
+        gross = np.zeros((count, buckets))
+        demand = [(index[product_id], bucket, quantity)
+                  for product_id, bucket, quantity in self._work_order_demand(today) + self._forecast_demand(today)
+                  if product_id in index]
+        if demand:
+            rows, columns, quantities = zip(*demand)
+            np.add.at(gross, (np.array(rows), np.array(columns)), np.array(quantities, dtype=np.float64))
+
+        # BOM edges between active products, by the parent's level
+        edges = [(index[parent], index[child], quantity)
+                 for parent, children in graph.children.items() if parent in index and parent not in graph.cyclic
+                 for child, quantity in children if child in index]
+        edge_array = np.array(edges, dtype=np.float64).reshape(-1, 3)
+        edge_parent = edge_array[:, 0].astype(np.int64)
+        edge_child = edge_array[:, 1].astype(np.int64)
+        edge_quantity = edge_array[:, 2]
+        made = np.zeros(count, dtype=bool)
+        made[[index[product_id] for product_id in graph.children if product_id in index]] = True
+
+        receipts = np.zeros((count, buckets))
+        columns = np.arange(buckets)
+        for current in range(int(level.max()) + 1):
+            rows = np.nonzero(level == current)[0]
+            if not len(rows):
+                continue
+            # Lot-for-lot netting: cumulative shortage against stock, bucket by bucket
+            shortage = np.maximum(np.cumsum(gross[rows], axis=1) - available[rows, None], 0)
+            net = np.ceil(np.diff(shortage, axis=1, prepend=0) - 1e-9).clip(min=0)
+            receipts[rows] = net
+
+            level_edges = np.nonzero(level[edge_parent] == current)[0]
+            if not len(level_edges):
+                continue
+            # Releases are receipts moved earlier by the lead time, overdue ones into the first bucket
+            parents = np.unique(edge_parent[level_edges])
+            releases = np.zeros((count, buckets))
+            release_columns = np.maximum(columns[None, :] - lead_buckets[parents, None], 0)
+            np.add.at(releases, (np.repeat(parents, buckets), release_columns.ravel()), receipts[parents].ravel())
+            np.add.at(gross, edge_child[level_edges],
+                      releases[edge_parent[level_edges]] * edge_quantity[level_edges, None])
+
+        planned_rows, planned_buckets = np.nonzero(receipts > 0)
+        orders = []
+        for row, bucket in zip(planned_rows.tolist(), planned_buckets.tolist()):
+            product = products[row]
+            due = today + timedelta(days=bucket * self.bucket_days)
+            release = due - timedelta(days=int(lead_days[row]))
+            orders.append({
+                'product_id': product.id,
+                'order_type': 'Work' if made[row] else 'Purchase',
+                'quantity': int(receipts[row, bucket]),
+                'release_date': release,
+                'due_date': due,
+                'low_level_code': int(level[row]),
+                'supplier_id': None if made[row] else product.supplier_id,
+                'is_past_due': release < today
+            })
+        return orders
+
+    def run(self, today=None):
+        """Replace the planned orders with a fresh plan, returns how many were planned"""
+        started = time.monotonic()
+        orders = self.plan(today)
+        now = datetime.utcnow()
+        try:
+            db.session.execute(delete(PlannedOrder.__table__))
+            if orders:
+                db.session.execute(insert(PlannedOrder.__table__), [dict(order, created_at=now) for order in orders])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Saving the MRP plan failed: {str(e)}")
+            return 0
+        logger.info(f"MRP planned {len(orders)} orders in {time.monotonic() - started:.2f}s")
+        return len(orders)
+
+    def planned_orders(self, order_type=None):
+        """Stored planned orders, earliest release first"""
+        query = PlannedOrder.query
+        if order_type:
+            query = query.filter(PlannedOrder.order_type == order_type)
+        return query.order_by(PlannedOrder.release_date, PlannedOrder.product_id).all()
+
+# Global MRP engine instance
+mrp_engine = deferred_engines.register(MRPEngine())
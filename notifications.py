@@ -0,0 +1,247 @@
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import select, update, insert, func, case
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import User, Role, Permission, Notification, UserNotificationState, role_permissions
+from cache import reference_cache
+from events import subscribe
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Permission a user needs to be notified about a category
+CATEGORY_PERMISSIONS = {
+    'stock': 'inventory.view',
+    'order': 'operations.basic',
+    'sale': 'sales.view',
+    'work_order': 'projects.view',
+    'shelf': 'inventory.view',
+    'system': 'settings.edit'
+}
+
+def _stock_low(payload):
+    critical = payload['level'] == 'CRITICAL'
+    return ('stock', 'danger' if critical else 'warning',
+            f"{'Critical' if critical else 'Low'} stock: {payload['name']}",
+            f"{payload['quantity']} left (SKU {payload['sku']}), reorder level {payload['reorder_level']}",
+            payload['product_id'])
+
+def _stock_recovered(payload):
+    return ('stock', 'success', f"Stock recovered: {payload['name']}",
+            f"{payload['quantity']} in stock (SKU {payload['sku']})", payload['product_id'])
+
+def _order_created(payload):
+    return ('order', 'info', f"New order {payload['order_number']}",
+            f"Status {payload['status']}", payload['id'])
+
+def _order_status_changed(payload):
+    return ('order', 'info', f"Order {payload['order_number']} is {payload['status']}",
+            f"Changed from {payload['previous_status']}", payload['id'])
+
+def _sale_created(payload):
+    total = payload['total_amount'] or 0
+    return ('sale', 'success', f"Sale {payload['sale_number']} recorded",
+            f"Total {total:,.2f}, payment {payload['payment_status']}", payload['id'])
+
+def _work_order_status_changed(payload):
+    return ('work_order', 'info', f"Work order {payload['work_order_number']} is {payload['status']}",
+            f"Changed from {payload['previous_status']}", payload['id'])
+
+def _shelf_environment_alert(payload):
+    return ('shelf', 'danger', f"Shelf {payload['shelf']}: {payload['metric']} {payload['rule']}",
+            f"{payload['value']} against limit {payload['limit']} at {payload['location']}", payload['shelf_id'])
+
+# Domain events that become notifications: event type -> payload formatter
+NOTIFYING_EVENTS = {
+    'stock.low': _stock_low,
+    'stock.recovered': _stock_recovered,
+    'order.created': _order_created,
+    'order.status_changed': _order_status_changed,
+    'sale.created': _sale_created,
+    'work_order.status_changed': _work_order_status_changed,
+    'shelf.environment_alert': _shelf_environment_alert
+}
+
+def wants_category(preferences, category):
+    """preferences['notifications'] is either a bool or a {category: bool} map"""
+    setting = (preferences or {}).get('notifications', True)
+    if isinstance(setting, dict):
+        return bool(setting.get(category, True))
+    return bool(setting)
+
+class NotificationCenter:
+    """Persisted per-user notifications
+
+    Domain events are fanned out after commit to every active user whose
+    role grants the category's permission and whose preferences allow it.
+    Each user's unread count is maintained in user_notification_state, so
+    the navbar badge is a primary key lookup.
+    """
+
+    def __init__(self, page_size=20, recipients_ttl=60):
+        self.page_size = page_size
+        self.recipients_ttl = recipients_ttl
+        self._recipients = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._subscribed = False
+
+    def init_app(self, app):
+        self.page_size = app.config.get('NOTIFICATIONS_PAGE_SIZE', self.page_size)
+        self.recipients_ttl = app.config.get('NOTIFICATIONS_RECIPIENTS_TTL', self.recipients_ttl)
+        if not self._subscribed:
+            for event_type in NOTIFYING_EVENTS:
+                subscribe(event_type, self.handle_event)
+            self._subscribed = True
+
+    def add_listener(self, listener):
+        """Call listener(user_ids, notification) after each fan-out is stored"""
+        self._listeners.append(listener)
+
+    def recipients(self, category):
+        """Ids of users to notify for a category
+
+        Cached until users or roles change in this process, or for
+        recipients_ttl seconds so changes made by other workers are seen.
+        """
+        versions = tuple(reference_cache.version(table) for table in ('user', 'role', 'role_permissions', 'permission'))
+        with self._lock:
+            cached = self._recipients.get(category)
+            if cached and cached[0] == versions and time.monotonic() - cached[2] < self.recipients_ttl:
+                return cached[1]
+
+        permission_name = CATEGORY_PERMISSIONS[category]
+        with db.engine.connect() as connection:
+            granted = select(role_permissions.c.role_id) \
+                .join(Permission, Permission.id == role_permissions.c.permission_id) \
+                .where(Permission.name == permission_name)
+            rows = connection.execute(
+                select(User.id, User.preferences)
+                .join(Role, Role.id == User.role_id)
+                .where(User.is_active == True, (Role.name == 'Admin') | Role.id.in_(granted))
+            ).all()
+        user_ids = [row.id for row in rows if wants_category(row.preferences, category)]
+
+        with self._lock:
+            self._recipients[category] = (versions, user_ids, time.monotonic())
+        return user_ids
+
+    def handle_event(self, domain_event):
+        """Event handler: store a notification for each recipient"""
+        category, level, title, message, entity_id = NOTIFYING_EVENTS[domain_event.type](domain_event.payload)
+        self.notify(self.recipients(category), category, title, message, level,
+                    event_type=domain_event.type, entity_id=entity_id)
+
+    def notify(self, user_ids, category, title, message=None, level='info', event_type=None, entity_id=None):
+        """Insert one notification per user and bump their unread counters
+
+        Runs on its own connection, so it is safe to call from after-commit
+        event handlers.
+        """
+        if not user_ids:
+            return 0
+        now = datetime.utcnow()
+        rows = [{'user_id': user_id, 'category': category, 'level': level, 'title': title[:200],
+                 'message': message, 'event_type': event_type, 'entity_id': entity_id,
+                 'is_read': False, 'created_at': now} for user_id in user_ids]
+        with db.engine.begin() as connection:
+            connection.execute(insert(Notification), rows)
+            result = connection.execute(
+                update(UserNotificationState)
+                .where(UserNotificationState.user_id.in_(user_ids))
+                .values(unread_count=UserNotificationState.unread_count + 1, updated_at=now)
+            )
+            if result.rowcount < len(user_ids):
+                self._create_states(connection, user_ids, now)
+
+        notification = {'category': category, 'level': level, 'title': rows[0]['title'], 'message': message,
+                        'event_type': event_type, 'entity_id': entity_id, 'created_at': now.isoformat()}
+        for listener in self._listeners:
+            try:
+                listener(user_ids, notification)
+            except Exception as e:
+                logger.error(f"Notification listener failed: {str(e)}")
+        return len(rows)
+
+    def _create_states(self, connection, user_ids, now):
+        """Create missing counter rows, counting unread notifications once"""
+        existing = set(connection.scalars(
+            select(UserNotificationState.user_id).where(UserNotificationState.user_id.in_(user_ids))
+        ))
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        counts = dict(connection.execute(
+            select(Notification.user_id, func.count(Notification.id))
+            .where(Notification.user_id.in_(missing), Notification.is_read == False)
+            .group_by(Notification.user_id)
+        ).all())
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(UserNotificationState), [
+                    {'user_id': user_id, 'unread_count': counts.get(user_id, 0), 'updated_at': now}
+                    for user_id in missing
+                ])
+        except IntegrityError:
+            # Another fan-out created the rows first without seeing our notifications
+            connection.execute(
+                update(UserNotificationState)
+                .where(UserNotificationState.user_id.in_(missing))
+                .values(unread_count=UserNotificationState.unread_count + 1, updated_at=now)
+            )
+
+    def unread_count(self, user_id):
+        """Unread notifications of a user (one primary key lookup)"""
+        state = db.session.get(UserNotificationState, user_id)
+        return state.unread_count if state else 0
+
+    def page(self, user_id, before=None, limit=None, unread_only=False):
+        """Newest notifications first, keyset paginated on id
+
+        Returns (notifications, next_before); next_before is None on the
+        last page.
+        """
+        limit = limit or self.page_size
+        query = Notification.query.filter(Notification.user_id == user_id)
+        if before:
+            query = query.filter(Notification.id < before)
+        if unread_only:
+            query = query.filter(Notification.is_read == False)
+        items = query.order_by(Notification.id.desc()).limit(limit + 1).all()
+        next_before = items[limit - 1].id if len(items) > limit else None
+        return items[:limit], next_before
+
+    def mark_read(self, user_id, notification_ids=None):
+        """Mark some (or all) of a user's notifications read and adjust the counter"""
+        now = datetime.utcnow()
+        statement = update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+        if notification_ids is not None:
+            statement = statement.where(Notification.id.in_(notification_ids))
+        changed = db.session.execute(statement.values(is_read=True, read_at=now)).rowcount
+
+        if notification_ids is None:
+            db.session.execute(update(UserNotificationState).where(UserNotificationState.user_id == user_id)
+                               .values(unread_count=0, updated_at=now))
+        elif changed:
+            db.session.execute(update(UserNotificationState).where(UserNotificationState.user_id == user_id)
+                               .values(unread_count=case((UserNotificationState.unread_count > changed,
+                                                          UserNotificationState.unread_count - changed), else_=0),
+                                       updated_at=now))
+        db.session.commit()
+        return changed
+
+    def link_for(self, notification):
+        """URL of the page a notification refers to"""
+        if notification.category in ('stock', 'shelf'):
+            return url_for('inventory.inventory')
+        if notification.category == 'order':
+            return url_for('sales.operations')
+        if notification.category == 'sale':
+            return url_for('sales.sales')
+        if notification.category == 'work_order' and notification.entity_id:
+            return url_for('projects.view_work_order', id=notification.entity_id)
+        return url_for('main.notifications')
+
+# Global notification center instance
+notification_center = NotificationCenter()
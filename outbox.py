@@ -0,0 +1,198 @@
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from sqlalchemy import event, inspect, select, update, insert, delete, func
+from sqlalchemy.orm import Session
+from database import db
+from models import (Product, Category, Supplier, Customer, StockMovement, Sale, Order, Project, Role, Permission,
+                    OutboxEvent, ChangeConsumerOffset)
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Models whose writes are recorded, and the entity name used in the stream
+TRACKED_MODELS = {
+    Product: 'product',
+    Category: 'category',
+    Supplier: 'supplier',
+    Customer: 'customer',
+    StockMovement: 'stock_movement',
+    Sale: 'sale',
+    Order: 'order',
+    Project: 'project',
+    Role: 'role',
+    Permission: 'permission'
+}
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _row_data(obj):
+    return {attr.key: _json_value(getattr(obj, attr.key)) for attr in inspect(obj).mapper.column_attrs}
+
+def _changed_data(obj):
+    """Changed columns, plus ids linked and unlinked through many-to-many relationships"""
+    state = inspect(obj)
+    data = {attr.key: _json_value(getattr(obj, attr.key))
+            for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()}
+    for relationship in state.mapper.relationships:
+        history = state.attrs[relationship.key].history
+        if relationship.secondary is not None and (history.added or history.deleted):
+            data[relationship.key] = {'added': sorted(related.id for related in history.added),
+                                      'removed': sorted(related.id for related in history.deleted)}
+    return data
+
+class ChangeStream:
+    """Ordered change stream over the outbox_event table
+
+    Every flush that writes a tracked model adds outbox rows in the same
+    transaction, so a change is visible in the stream exactly when it is
+    committed. Consumers read by id with a cursor and store their position
+    in change_consumer_offset; processing then committing the offset gives
+    at-least-once delivery.
+
+    Ids are allocated at insert time, so a transaction that commits late can
+    leave a temporary hole below ids that are already visible. Reads stop at
+    such a gap until it is filled or older than gap_timeout (ids consumed by
+    rolled back transactions never appear).
+    """
+
+    def __init__(self, gap_timeout=30, retention_days=7):
+        self.gap_timeout = gap_timeout
+        self.retention_days = retention_days
+
+    def init_app(self, app):
+        self.gap_timeout = app.config.get('CHANGE_STREAM_GAP_TIMEOUT', self.gap_timeout)
+        self.retention_days = app.config.get('CHANGE_STREAM_RETENTION_DAYS', self.retention_days)
+
+    def head(self):
+        """Id of the newest change"""
+        return db.session.scalar(select(func.max(OutboxEvent.id))) or 0
+
+    def read(self, after=0, limit=500, entities=None):
+        """Changes after a cursor, returned as (changes, next_cursor)
+
+        next_cursor can move past changes that were filtered out by entities,
+        so it is always safe to pass back in.
+        """
+        rows = db.session.execute(
+            select(OutboxEvent.id, OutboxEvent.entity, OutboxEvent.entity_id, OutboxEvent.operation,
+                   OutboxEvent.data, OutboxEvent.created_at)
+            .where(OutboxEvent.id > after)
+            .order_by(OutboxEvent.id)
+            .limit(limit)
+        ).all()
+
+        settled_before = datetime.utcnow() - timedelta(seconds=self.gap_timeout)
+        changes = []
+        cursor = after
+        for row in rows:
+            if row.id != cursor + 1 and cursor != 0 and row.created_at > settled_before:
+                # A lower id may still be committing
+                break
+            cursor = row.id
+            if entities and row.entity not in entities:
+                continue
+            changes.append({
+                'id': row.id,
+                'entity': row.entity,
+                'entity_id': row.entity_id,
+                'operation': row.operation,
+                'data': json.loads(row.data) if row.data else None,
+                'created_at': row.created_at.isoformat()
+            })
+        return changes, cursor
+
+    def position(self, consumer):
+        """Stored offset of a consumer, 0 when it never committed one"""
+        offset = db.session.get(ChangeConsumerOffset, consumer)
+        return offset.position if offset else 0
+
+    def poll(self, consumer, limit=500, entities=None):
+        """Changes after the consumer's stored offset, as (changes, next_cursor)"""
+        return self.read(self.position(consumer), limit, entities)
+
+    def commit(self, consumer, position):
+        """Move a consumer's offset forward (never backwards)"""
+        result = db.session.execute(
+            update(ChangeConsumerOffset)
+            .where(ChangeConsumerOffset.consumer == consumer, ChangeConsumerOffset.position < position)
+            .values(position=position, updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0 and db.session.get(ChangeConsumerOffset, consumer) is None:
+            db.session.add(ChangeConsumerOffset(consumer=consumer, position=position))
+        db.session.commit()
+
+    def consume(self, consumer, handler, limit=500, entities=None):
+        """Pass the next page of changes to handler, then commit the offset
+
+        Returns the number of changes handled. If the handler raises, the
+        offset stays put and the same changes are delivered again next time.
+        """
+        changes, cursor = self.poll(consumer, limit, entities)
+        if changes:
+            handler(changes)
+        if cursor > self.position(consumer):
+            self.commit(consumer, cursor)
+        return len(changes)
+
+    def consumers(self):
+        """Every consumer's offset and how far it is behind the head"""
+        head = self.head()
+        return {offset.consumer: {'position': offset.position, 'lag': head - offset.position,
+                                  'updated_at': offset.updated_at.isoformat() if offset.updated_at else None}
+                for offset in ChangeConsumerOffset.query.all()}
+
+    def trim(self):
+        """Delete changes older than the retention period
+
+        The newest entry is always kept so ids never restart, which cursors
+        and conditional GET validators rely on.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        result = db.session.execute(delete(OutboxEvent).where(OutboxEvent.created_at < cutoff,
+                                                              OutboxEvent.id < self.head()))
+        db.session.commit()
+        return result.rowcount
+
+# Global change stream instance
+change_stream = ChangeStream()
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    """Write outbox rows for tracked models in the flushing transaction"""
+    now = datetime.utcnow()
+    rows = []
+    for operation, objects in (('INSERT', session.new), ('UPDATE', session.dirty), ('DELETE', session.deleted)):
+        for obj in objects:
+            entity = TRACKED_MODELS.get(type(obj))
+            if entity is None:
+                continue
+            data = _changed_data(obj) if operation == 'UPDATE' else _row_data(obj)
+            if operation == 'UPDATE' and not data:
+                continue
+            rows.append({'entity': entity, 'entity_id': obj.id, 'operation': operation,
+                         'data': json.dumps(data), 'created_at': now})
+    if rows:
+        session.connection().execute(insert(OutboxEvent), rows)
+
+def _record_bulk(operation, context):
+    entity = TRACKED_MODELS.get(context.mapper.class_) if context.mapper is not None else None
+    if entity is not None:
+        # Affected ids are unknown, consumers should resynchronise the entity
+        context.session.connection().execute(insert(OutboxEvent), [{
+            'entity': entity, 'entity_id': None, 'operation': operation,
+            'data': None, 'created_at': datetime.utcnow()
+        }])
+
+@event.listens_for(Session, 'after_bulk_update')
+def _record_bulk_update(update_context):
+    _record_bulk('BULK_UPDATE', update_context)
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _record_bulk_delete(delete_context):
+    _record_bulk('BULK_DELETE', delete_context)
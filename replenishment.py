@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from sqlalchemy import select, update, insert, bindparam, func
+from database import db
+from models import Product, StockMovement, OutboxEvent
+from cache import reference_cache
+from spare_parts import REFERENCE_TYPE as MAINTENANCE_REFERENCE
+from deferred import deferred_engines
+import numpy as np
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ReplenishmentPolicies:
+    """Safety stock, reorder points and order quantities from demand history
+
+    Daily demand is the OUT movement quantity per product and day over the
+    last history_days, days without movements counting as zero. Parts issued
+    to maintenance jobs are left out, since the reorder report adds projected
+    maintenance demand on top. With mean d, standard deviation s and lead
+    time L days:
+
+    - safety stock = z * s * sqrt(L), z taken from the service level,
+    - reorder point = d * L + safety stock,
+    - EOQ = sqrt(2 * annual demand * ordering_cost / (holding_rate * unit cost)).
+
+    Products with fewer than min_demand_days days of demand get no policy
+    and keep their current settings.
+    """
+
+    def __init__(self, history_days=180, service_level=0.95, ordering_cost=50.0, holding_rate=0.25,
+                 min_demand_days=5):
+        self.auto_apply = False
+        self.history_days = history_days
+        self.service_level = service_level
+        self.ordering_cost = ordering_cost
+        self.holding_rate = holding_rate
+        self.min_demand_days = min_demand_days
+
+    def init_app(self, app):
+        self.auto_apply = app.config.get('REPLENISHMENT_AUTO_APPLY', self.auto_apply)
+        self.history_days = app.config.get('REPLENISHMENT_HISTORY_DAYS', self.history_days)
+        self.service_level = app.config.get('REPLENISHMENT_SERVICE_LEVEL', self.service_level)
+        self.ordering_cost = app.config.get('REPLENISHMENT_ORDERING_COST', self.ordering_cost)
+        self.holding_rate = app.config.get('REPLENISHMENT_HOLDING_RATE', self.holding_rate)
+        self.min_demand_days = app.config.get('REPLENISHMENT_MIN_DEMAND_DAYS', self.min_demand_days)
+
+    def compute(self, supplier_id=None):
+        """Current and proposed policy of every active product as a list of dicts"""
+        query = select(Product.id, Product.name, Product.sku, Product.supplier_id, Product.cost,
+                       Product.quantity_in_stock, Product.reorder_level, Product.safety_stock,
+                       Product.lead_time_days).where(Product.is_active == True)
+        if supplier_id:
+            query = query.where(Product.supplier_id == supplier_id)
+        products = db.session.execute(query.order_by(Product.id)).all()
+        if not products:
+            return []
+        index = {row.id: i for i, row in enumerate(products)}
+        count = len(products)
+
+        since = datetime.utcnow() - timedelta(days=self.history_days)
+        daily = db.session.execute(
+            select(StockMovement.product_id, func.sum(StockMovement.quantity))
+            .where(StockMovement.movement_type == 'OUT', StockMovement.created_at >= since,
+                   StockMovement.reference_type.is_distinct_from(MAINTENANCE_REFERENCE))
+            .group_by(StockMovement.product_id, func.date(StockMovement.created_at))
+        ).all()
+        rows = np.array([index[product_id] for product_id, _ in daily if product_id in index], dtype=np.int64)
+        quantities = np.array([float(quantity or 0) for product_id, quantity in daily if product_id in index])
+
+        # Moments over every day of the window, including days without demand
+        days = self.history_days
+        total = np.bincount(rows, weights=quantities, minlength=count)
+        squares = np.bincount(rows, weights=quantities * quantities, minlength=count)
+        demand_days = np.bincount(rows, minlength=count)
+        mean = total / days
+        deviation = np.sqrt(np.maximum(squares / days - mean * mean, 0) * days / max(days - 1, 1))
+
+        lead_time = np.array([max(row.lead_time_days or 0, 0) for row in products], dtype=np.float64)
+        cost = np.array([float(row.cost or 0) for row in products])
+        z = NormalDist().inv_cdf(self.service_level)
+        safety = np.ceil(z * deviation * np.sqrt(lead_time))
+        reorder_point = np.ceil(mean * lead_time + safety)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            eoq = np.sqrt(2 * mean * 365 * self.ordering_cost / (self.holding_rate * cost))
+        eoq = np.where(np.isfinite(eoq), np.ceil(eoq), np.nan)
+        enough = demand_days >= self.min_demand_days
+
+        result = []
+        for i, row in enumerate(products):
+            result.append({
+                'product_id': row.id,
+                'name': row.name,
+                'sku': row.sku,
+                'supplier_id': row.supplier_id,
+                'quantity_in_stock': row.quantity_in_stock,
+                'lead_time_days': row.lead_time_days,
+                'demand_days': int(demand_days[i]),
+                'daily_demand': round(float(mean[i]), 3),
+                'demand_std': round(float(deviation[i]), 3),
+                'current_safety_stock': row.safety_stock or 0,
+                'current_reorder_level': row.reorder_level,
+                'safety_stock': int(safety[i]) if enough[i] else None,
+                'reorder_point': int(reorder_point[i]) if enough[i] else None,
+                'eoq': int(eoq[i]) if enough[i] and np.isfinite(eoq[i]) else None
+            })
+        return result
+
+    def apply(self, policies=None):
+        """Write proposed safety stock and reorder points to the products, returns how many changed"""
+        policies = policies if policies is not None else self.compute()
+        changes = [{'b_id': p['product_id'], 'b_safety': p['safety_stock'], 'b_reorder': p['reorder_point']}
+                   for p in policies
+                   if p['reorder_point'] is not None
+                   and (p['safety_stock'], p['reorder_point']) != (p['current_safety_stock'], p['current_reorder_level'])]
+        if not changes:
+            return 0
+        now = datetime.utcnow()
+        try:
+            db.session.execute(
+                update(Product.__table__).where(Product.__table__.c.id == bindparam('b_id'))
+                .values(safety_stock=bindparam('b_safety'), reorder_level=bindparam('b_reorder'), updated_at=now),
+                changes
+            )
+            # Core executemany skips the flush events, so the change stream rows are written here
+            db.session.execute(insert(OutboxEvent), [{
+                'entity': 'product', 'entity_id': change['b_id'], 'operation': 'UPDATE',
+                'data': json.dumps({'safety_stock': change['b_safety'], 'reorder_level': change['b_reorder'],
+                                    'updated_at': now.isoformat()}),
+                'created_at': now
+            } for change in changes])
+            # Thresholds changed through Core, so alert state is re-evaluated explicitly
+            from alerts import stock_alert_engine
+            stock_alert_engine.evaluate_products(db.session, [change['b_id'] for change in changes])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Writing replenishment policies failed: {str(e)}")
+            return 0
+        reference_cache.bump(Product.__tablename__)
+        logger.info(f"Updated replenishment policy of {len(changes)} products")
+        return len(changes)
+
+# Global replenishment policy instance
+replenishment_policies = deferred_engines.register(ReplenishmentPolicies())
@@ -4,8 +4,6 @@ from models import *
 from sqlalchemy import func, desc, asc, and_, or_
 import csv
 import io
-import xlsxwriter
-from weasyprint import HTML
 import tempfile
 import os
 import json
@@ -66,6 +64,9 @@ class ReportGenerator:
     @staticmethod
     def export_as_excel(data, filename, headers):
         """Generate Excel file from data"""
+        # Imported on first use to keep application startup fast
+        import xlsxwriter
+        
         output = io.BytesIO()
         workbook = xlsxwriter.Workbook(output)
         worksheet = workbook.add_worksheet('Report')
@@ -130,6 +131,9 @@ class ReportGenerator:
     @staticmethod
     def export_as_pdf(data, filename, headers, title, logo=None):
         """Generate PDF file from data"""
+        # WeasyPrint is slow to import, so load it only when a PDF is requested
+        from weasyprint import HTML
+        
         # Create a temporary HTML file
         context = {
             'title': title,
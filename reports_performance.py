@@ -3,6 +3,7 @@ from models import *
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_, extract
 from decimal import Decimal
+from collections import Counter
 
 class PerformanceReportGenerator(ReportGenerator):
     """Handles all performance and forecasting reports"""
@@ -250,4 +251,82 @@ class PerformanceReportGenerator(ReportGenerator):
             'trend': 'Up' if customer_growth > 0 else 'Down' if customer_growth < 0 else 'Flat'
         }]
         
-        return result
\ No newline at end of file
+        return result
+    
+    @staticmethod
+    def generate_equipment_utilization_report(start_date, end_date, period_grouping='weekly'):
+        """Generate equipment utilization report from the usage rollups"""
+        from utilization import usage_rollups
+        start_day = ReportGenerator.format_date(start_date).date()
+        end_day = ReportGenerator.format_date(end_date).date()
+        if period_grouping == 'weekly':
+            # Week rollups cover whole weeks, Monday to Sunday
+            start_day -= timedelta(days=start_day.weekday())
+            end_day += timedelta(days=6 - end_day.weekday())
+        
+        def period_of(day):
+            if period_grouping == 'daily':
+                return day.isoformat()
+            elif period_grouping == 'weekly':
+                year, week, _ = day.isocalendar()
+                return f"{year}-W{week:02d}"
+            elif period_grouping == 'monthly':
+                return day.strftime('%Y-%m')
+            elif period_grouping == 'quarterly':
+                return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+            return str(day.year)
+        
+        # Calendar days of each period inside the range, for available hours
+        days_in_period = Counter(period_of(start_day + timedelta(days=i))
+                                 for i in range((end_day - start_day).days + 1))
+        
+        # Weekly totals come from the week rollups, everything else from days
+        period = 'week' if period_grouping == 'weekly' else 'day'
+        rows = db.session.query(
+            UsageRollup.period_start,
+            UsageRollup.equipment_id,
+            func.sum(UsageRollup.hours_used),
+            func.sum(UsageRollup.cycles_completed),
+            func.sum(UsageRollup.efficiency_sum),
+            func.sum(UsageRollup.efficiency_count)
+        ).filter(
+            UsageRollup.period == period,
+            UsageRollup.period_start.between(start_day, end_day)
+        ).group_by(UsageRollup.period_start, UsageRollup.equipment_id).all()
+        
+        anomalies = Counter(
+            (period_of(day), equipment_id) for day, equipment_id in db.session.query(
+                UsageRollup.period_start, UsageRollup.equipment_id
+            ).filter(
+                UsageRollup.period == 'day',
+                UsageRollup.is_anomaly == True,
+                UsageRollup.period_start.between(start_day, end_day)
+            ).all()
+        )
+        
+        totals = {}
+        for period_start, equipment_id, hours, cycles, efficiency_sum, efficiency_count in rows:
+            key = (period_of(period_start), equipment_id)
+            entry = totals.setdefault(key, [0.0, 0, 0.0, 0])
+            entry[0] += float(hours or 0)
+            entry[1] += int(cycles or 0)
+            entry[2] += float(efficiency_sum or 0)
+            entry[3] += int(efficiency_count or 0)
+        
+        names = {e.equipment_id: e.equipment_name for e in EquipmentMapping.query.all()}
+        
+        result = []
+        for (period_label, equipment_id), (hours, cycles, efficiency_sum, efficiency_count) in sorted(totals.items()):
+            available = days_in_period.get(period_label, 0) * usage_rollups.hours_per_day
+            result.append({
+                'period': period_label,
+                'equipment_id': equipment_id or '-',
+                'equipment_name': names.get(equipment_id, equipment_id or 'Unassigned'),
+                'hours_used': round(hours, 2),
+                'cycles_completed': cycles,
+                'utilization': round(hours / available * 100, 1) if available else 0,
+                'avg_efficiency': round(efficiency_sum / efficiency_count, 2) if efficiency_count else None,
+                'anomalies': anomalies.get((period_label, equipment_id), 0)
+            })
+        
+        return result
@@ -3,6 +3,7 @@ from models import *
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_
 from decimal import Decimal
+import math
 
 class PurchaseReportGenerator(ReportGenerator):
     """Handles all purchase and supplier-related reports"""
@@ -72,11 +73,18 @@ class PurchaseReportGenerator(ReportGenerator):
     @staticmethod
     def generate_reorder_suggestions_report(start_date, end_date, supplier_id=None):
         """Generate reorder suggestions report"""
+        from spare_parts import spare_parts_planner
+        # Spare parts needed by upcoming maintenance count against stock
+        maintenance_demand = spare_parts_planner.cached_projection().totals()
+        
         query = db.session.query(
             Product,
             Category.name.label('category_name'),
             Supplier.name.label('supplier_name')
-        ).join(Category).outerjoin(Supplier).filter(Product.quantity_in_stock <= Product.reorder_level)
+        ).join(Category).outerjoin(Supplier).filter(or_(
+            Product.quantity_in_stock <= Product.reorder_level,
+            Product.id.in_(list(maintenance_demand))
+        ))
         
         if supplier_id and int(supplier_id) > 0:
             query = query.filter(Product.supplier_id == supplier_id)
@@ -85,22 +93,49 @@ class PurchaseReportGenerator(ReportGenerator):
         
         result = []
         for product, category_name, supplier_name in products:
+            reserved = math.ceil(maintenance_demand.get(product.id, 0))
+            available = product.quantity_in_stock - reserved
+            if available > product.reorder_level:
+                continue
             product_dict = ReportGenerator.convert_to_dict(product)
             
             # Calculate reorder amount - typically reorder to get to 2x reorder_level
-            reorder_amount = (product.reorder_level * 2) - product.quantity_in_stock
+            reorder_amount = (product.reorder_level * 2) - available
             estimated_cost = reorder_amount * product.cost
             
             # Add additional data
             product_dict['category_name'] = category_name
             product_dict['supplier_name'] = supplier_name or "No Supplier"
+            product_dict['maintenance_demand'] = reserved
             product_dict['reorder_amount'] = reorder_amount
             product_dict['estimated_cost'] = estimated_cost
-            product_dict['priority'] = "High" if product.quantity_in_stock == 0 else "Medium" if product.quantity_in_stock < product.reorder_level else "Low"
+            product_dict['priority'] = "High" if available <= 0 else "Medium" if available < product.reorder_level else "Low"
             
             result.append(product_dict)
         
         # Sort by priority and then by quantity in stock
         result.sort(key=lambda x: (0 if x['priority'] == "High" else 1 if x['priority'] == "Medium" else 2, x['quantity_in_stock']))
         
-        return result
\ No newline at end of file
+        return result
+    
+    @staticmethod
+    def generate_replenishment_policy_report(start_date, end_date, supplier_id=None):
+        """Compare current reorder levels and safety stock with demand-based policies"""
+        from replenishment import replenishment_policies
+        supplier_id = int(supplier_id) if supplier_id and int(supplier_id) > 0 else None
+        suppliers = {s.id: s.name for s in Supplier.query.all()}
+        
+        result = []
+        for policy in replenishment_policies.compute(supplier_id):
+            if policy['reorder_point'] is None:
+                continue
+            policy['supplier_name'] = suppliers.get(policy['supplier_id'], "No Supplier")
+            policy['reorder_level_change'] = policy['reorder_point'] - policy['current_reorder_level']
+            policy['safety_stock_change'] = policy['safety_stock'] - policy['current_safety_stock']
+            policy['below_new_reorder_point'] = policy['quantity_in_stock'] <= policy['reorder_point']
+            result.append(policy)
+        
+        # Largest corrections first
+        result.sort(key=lambda x: -abs(x['reorder_level_change']))
+        
+        return result
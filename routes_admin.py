@@ -0,0 +1,216 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, current_app
+from flask_login import current_user, login_required
+from database import db, pool_statistics
+from models import Role, Permission, User
+from forms import UserForm
+from auth import bcrypt, has_permission
+from cache import reference_cache
+from tasks import task_scheduler
+from email_service import email_service
+from webhooks import webhook_dispatcher
+from outbox import change_stream
+from sse import event_hub
+from telemetry import telemetry_buffer
+
+bp = Blueprint('admin', __name__)
+
+@bp.route('/users')
+@login_required
+def users():
+    # Check if user has permission to view users
+    if not has_permission('users.view'):
+        abort(403)
+        
+    users_list = User.query.all()
+    return render_template('users.html', title='User Management', users=users_list, has_permission=has_permission)
+
+@bp.route('/users/add', methods=['GET', 'POST'])
+@login_required
+def add_user():
+    # Check if user has permission to create users
+    if not has_permission('users.create'):
+        abort(403)
+        
+    form = UserForm()
+    form.role.choices = [(role.id, role.name) for role in reference_cache.all(Role)]
+    
+    if form.validate_on_submit():
+        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            password_hash=hashed_password,
+            role_id=form.role.data,
+            is_active=form.is_active.data
+        )
+        db.session.add(user)
+        db.session.commit()
+        flash(f'User {form.username.data} has been created!', 'success')
+        return redirect(url_for('admin.users'))
+    
+    return render_template('add_user.html', title='Add User', form=form, has_permission=has_permission)
+
+@bp.route('/users/<int:user_id>/edit', methods=['GET', 'POST'])
+@login_required
+def edit_user(user_id):
+    # Check if user has permission to edit users
+    if not has_permission('users.edit'):
+        abort(403)
+        
+    user = User.query.get_or_404(user_id)
+    form = UserForm()
+    form.role.choices = [(role.id, role.name) for role in reference_cache.all(Role)]
+    
+    if form.validate_on_submit():
+        user.username = form.username.data
+        user.email = form.email.data
+        user.role_id = form.role.data
+        user.is_active = form.is_active.data
+        
+        if form.password.data:
+            user.password_hash = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+            
+        db.session.commit()
+        flash('User has been updated!', 'success')
+        return redirect(url_for('admin.users'))
+    
+    elif request.method == 'GET':
+        form.username.data = user.username
+        form.email.data = user.email
+        form.role.data = user.role_id
+        form.is_active.data = user.is_active
+    
+    return render_template('edit_user.html', title='Edit User', form=form, user=user, has_permission=has_permission)
+
+@bp.route('/users/<int:user_id>/delete', methods=['POST'])
+@login_required
+def delete_user(user_id):
+    # Check if user has permission to delete users
+    if not has_permission('users.delete'):
+        abort(403)
+        
+    user = User.query.get_or_404(user_id)
+    
+    # Prevent deletion of own account
+    if user.id == current_user.id:
+        flash('You cannot delete your own account!', 'danger')
+        return redirect(url_for('admin.users'))
+    
+    db.session.delete(user)
+    db.session.commit()
+    flash('User has been deleted!', 'success')
+    return redirect(url_for('admin.users'))
+
+@bp.route('/roles')
+@login_required
+def roles():
+    # Check if user has permission to manage roles
+    if not has_permission('roles.manage'):
+        abort(403)
+        
+    roles_list = reference_cache.all(Role)
+    permissions = reference_cache.all(Permission)
+    return render_template('roles.html', title='Role Management', roles=roles_list, permissions=permissions, has_permission=has_permission)
+
+@bp.route('/roles/<int:role_id>/permissions', methods=['GET', 'POST'])
+@login_required
+def role_permissions(role_id):
+    # Check if user has permission to manage roles
+    if not has_permission('roles.manage'):
+        abort(403)
+        
+    role = Role.query.get_or_404(role_id)
+    permissions = reference_cache.all(Permission)
+    
+    if request.method == 'POST':
+        # Update permissions for the role
+        role_permissions = []
+        for permission in permissions:
+            if str(permission.id) in request.form.getlist('permissions'):
+                role_permissions.append(permission)
+        
+        role.permissions = role_permissions
+        db.session.commit()
+        flash(f'Permissions for {role.name} role have been updated!', 'success')
+        return redirect(url_for('admin.roles'))
+    
+    return render_template('role_permissions.html', title='Role Permissions', role=role, permissions=permissions, has_permission=has_permission)
+
+
+@bp.route('/settings')
+@login_required
+def settings():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return render_template('settings.html', title='System Settings', has_permission=has_permission)
+
+@bp.route('/settings/database-stats')
+@login_required
+def database_stats():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify({
+        'profile': current_app.config['DB_ENGINE_PROFILE']['name'],
+        'pool': pool_statistics(),
+        'reference_cache': reference_cache.stats()
+    })
+
+@bp.route('/settings/scheduler-stats')
+@login_required
+def scheduler_stats():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify({
+        'node': task_scheduler.node_id,
+        'running': task_scheduler.running,
+        'jobs': task_scheduler.metrics()
+    })
+
+@bp.route('/settings/email-stats')
+@login_required
+def email_stats():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify(email_service.metrics())
+
+@bp.route('/settings/webhook-stats')
+@login_required
+def webhook_stats():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify(webhook_dispatcher.metrics())
+
+@bp.route('/settings/change-stream')
+@login_required
+def change_stream_stats():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify({
+        'head': change_stream.head(),
+        'consumers': change_stream.consumers()
+    })
+
+@bp.route('/settings/live-stats')
+@login_required
+def live_stats():
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify(event_hub.stats())
+
+@bp.route('/settings/telemetry-stats')
+@login_required
+def telemetry_stats():
+    from timeseries import shelf_history
+    from shelf_rules import shelf_rule_engine
+    if not has_permission('settings.edit'):
+        abort(403)
+    
+    return jsonify({'buffer': telemetry_buffer.metrics(), 'history': shelf_history.stats(),
+                    'rules': shelf_rule_engine.stats()})
@@ -0,0 +1,215 @@
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from flask import Blueprint, Response, request, abort, current_app, g
+from sqlalchemy import select
+from werkzeug.exceptions import HTTPException
+from database import db
+from models import Product, StockMovement, Order, Sale, Project
+from api_keys import api_key_index
+from outbox import TRACKED_MODELS
+from conditional import Validator
+from telemetry import telemetry_buffer, parse_timestamp, METRICS
+import json
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+class Resource:
+    """A model exposed by the API: its columns, filters and required permission"""
+
+    def __init__(self, model, permission, columns=None, filters=()):
+        self.model = model
+        self.entity = TRACKED_MODELS[model]
+        self.permission = permission
+        table = model.__table__
+        names = columns or [column.name for column in table.columns]
+        self.columns = {name: table.c[name] for name in names}
+        self.filters = {name: table.c[name] for name in filters}
+
+RESOURCES = {
+    'products': Resource(Product, 'inventory.view', filters=('category_id', 'supplier_id', 'is_active')),
+    'stock': Resource(Product, 'inventory.view',
+                      columns=('id', 'sku', 'name', 'quantity_in_stock', 'reorder_level', 'safety_stock',
+                               'location', 'shelf_position', 'updated_at'),
+                      filters=('category_id', 'is_active')),
+    'movements': Resource(StockMovement, 'inventory.view', filters=('product_id', 'movement_type', 'reference_type')),
+    'orders': Resource(Order, 'operations.basic', filters=('customer_id', 'status')),
+    'sales': Resource(Sale, 'sales.view', filters=('customer_id', 'payment_status')),
+    'projects': Resource(Project, 'projects.view', filters=('customer_id', 'status'))
+}
+
+def _json_default(value):
+    # Money stays exact as a string
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def json_response(payload, status=200):
+    """Serialize with the C encoder; only Decimal and date values reach _json_default"""
+    body = json.dumps(payload, default=_json_default, separators=(',', ':'))
+    return Response(body, status=status, mimetype='application/json')
+
+def _id_list(value, limit):
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        abort(400, description="ids must be a comma separated list of integers")
+    if len(ids) > limit:
+        abort(400, description=f"At most {limit} ids per request")
+    return list(dict.fromkeys(ids))
+
+def _int_arg(name, default, maximum=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, description=f"{name} must be an integer")
+    if value < 0:
+        abort(400, description=f"{name} must not be negative")
+    return min(value, maximum) if maximum else value
+
+def _filter_value(column, value):
+    python_type = column.type.python_type
+    if python_type is bool:
+        return value.lower() in ('1', 'true', 'yes')
+    if python_type is int:
+        try:
+            return int(value)
+        except ValueError:
+            abort(400, description=f"{column.name} must be an integer")
+    return value
+
+def _require(permission):
+    if g.api_permissions is not None and permission not in g.api_permissions:
+        abort(403, description=f"API key lacks the {permission} permission")
+
+def _resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        abort(404, description=f"Unknown resource '{name}'")
+    _require(resource.permission)
+    return resource
+
+def _projection(resource):
+    """Columns selected by ?fields=, always starting with id"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(resource.columns.values())
+    names = ['id'] + [name.strip() for name in fields.split(',') if name.strip() and name.strip() != 'id']
+    unknown = [name for name in names if name not in resource.columns]
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    return [resource.columns[name] for name in dict.fromkeys(names)]
+
+def _rows(columns, statement):
+    names = [column.name for column in columns]
+    return [dict(zip(names, row)) for row in db.session.execute(statement)]
+
+@bp.before_request
+def authenticate():
+    """Every API call needs a valid X-API-Key header"""
+    entry = api_key_index.authenticate(request.headers.get('X-API-Key'))
+    if entry is None:
+        abort(401, description="Missing, invalid or expired API key")
+    g.api_key = entry
+    g.api_permissions = api_key_index.permissions(entry)
+
+@bp.errorhandler(HTTPException)
+def handle_error(error):
+    return json_response({'error': error.description, 'status': error.code}, error.code)
+
+@bp.route('')
+def index():
+    """Resources, their fields and filters"""
+    return json_response({name: {'fields': list(resource.columns), 'filters': list(resource.filters),
+                                 'permission': resource.permission}
+                          for name, resource in RESOURCES.items()})
+
+@bp.route('/<resource_name>')
+def list_resource(resource_name):
+    """Keyset paginated list, or a bulk read with ?ids=1,2,3
+
+    Pages are ordered by id; pass next_after back as ?after= for the next
+    page. Bulk reads return found rows in request order plus the missing ids.
+    """
+    resource = _resource(resource_name)
+    validator = Validator([resource.entity], request.full_path)
+    if validator.is_fresh():
+        return validator.not_modified()
+    columns = _projection(resource)
+    id_column = resource.columns['id']
+    max_page = current_app.config.get('API_MAX_PAGE_SIZE', 1000)
+
+    if 'ids' in request.args:
+        ids = _id_list(request.args['ids'], max_page)
+        found = {row['id']: row for row in _rows(columns, select(*columns).where(id_column.in_(ids)))} if ids else {}
+        return validator.apply(json_response({'data': [found[i] for i in ids if i in found],
+                                              'missing': [i for i in ids if i not in found]}))
+
+    limit = _int_arg('limit', current_app.config.get('API_PAGE_SIZE', 100), max_page) or 1
+    statement = select(*columns).where(id_column > _int_arg('after', 0))
+    for name, value in request.args.items():
+        if name in resource.filters:
+            statement = statement.where(resource.filters[name] == _filter_value(resource.filters[name], value))
+    data = _rows(columns, statement.order_by(id_column).limit(limit + 1))
+    next_after = data[limit - 1]['id'] if len(data) > limit else None
+    return validator.apply(json_response({'data': data[:limit], 'next_after': next_after}))
+
+@bp.route('/<resource_name>/<int:id>')
+def get_resource(resource_name, id):
+    resource = _resource(resource_name)
+    validator = Validator([resource.entity], request.full_path)
+    if validator.is_fresh():
+        return validator.not_modified()
+    columns = _projection(resource)
+    data = _rows(columns, select(*columns).where(resource.columns['id'] == id))
+    if not data:
+        abort(404, description=f"No {resource_name} with id {id}")
+    return validator.apply(json_response({'data': data[0]}))
+
+@bp.route('/telemetry', methods=['POST'])
+def ingest_telemetry():
+    """Accept a batch of smart shelf readings: {"readings": [{"shelf_id", "timestamp", "weight", ...}]}
+
+    Readings are buffered and written in timed batches, so the response is
+    202 and the shelf rows lag by up to TELEMETRY_FLUSH_INTERVAL.
+    """
+    _require('inventory.edit')
+    payload = request.get_json(silent=True)
+    readings = payload.get('readings') if isinstance(payload, dict) else payload
+    if not isinstance(readings, list):
+        abort(400, description="Expected a JSON list of readings")
+    if len(readings) > telemetry_buffer.max_batch:
+        abort(413, description=f"At most {telemetry_buffer.max_batch} readings per request")
+    accepted, rejected, unknown = telemetry_buffer.ingest(readings)
+    return json_response({'accepted': accepted, 'rejected': rejected, 'unknown_shelves': unknown}, 202)
+
+@bp.route('/shelves/<path:shelf_id>/history')
+def shelf_sensor_history(shelf_id):
+    """Aggregated readings of one shelf: ?metric=temperature&start=...&end=...&resolution=1m|1h|1d
+
+    start and end take epoch seconds or ISO 8601 and default to the last 24
+    hours; without resolution the finest one that fits is chosen.
+    """
+    from timeseries import shelf_history
+    _require('inventory.view')
+    metric = request.args.get('metric', 'temperature')
+    if metric not in METRICS:
+        abort(400, description=f"metric must be one of {', '.join(METRICS)}")
+    try:
+        end = parse_timestamp(_number_or_text(request.args.get('end')))
+        start = parse_timestamp(_number_or_text(request.args.get('start'))) if request.args.get('start') \
+            else end - timedelta(days=1)
+        resolution, points = shelf_history.query(shelf_id, metric, start, end, request.args.get('resolution'))
+    except ValueError as e:
+        abort(400, description=str(e))
+    return json_response({'shelf_id': shelf_id, 'metric': metric, 'resolution': resolution, 'points': points})
+
+def _number_or_text(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
@@ -0,0 +1,552 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, abort, request, jsonify
+from flask_login import current_user, login_required
+from database import db
+from models import Category, Product, Supplier, StockMovement, ProjectAssignment, BillOfMaterials, BOMItem, Kit
+from forms import CategoryForm, ProductForm, SupplierForm, StockAdjustmentForm, BOMForm, BOMItemForm, KitForm, KitItemForm
+from auth import has_permission, permission_required
+from cache import reference_cache
+from conditional import conditional
+
+bp = Blueprint('inventory', __name__)
+
+@bp.route('/inventory')
+@login_required
+@permission_required('inventory.view')
+@conditional('product', 'category', 'supplier')
+def inventory():
+    products = Product.query.filter_by(is_active=True).all()
+    categories = reference_cache.all(Category)
+    suppliers = reference_cache.all(Supplier, is_active=True)
+    
+    return render_template('inventory.html', 
+                         title='Inventory Management', 
+                         has_permission=has_permission,
+                         products=products,
+                         categories=categories,
+                         suppliers=suppliers)
+
+@bp.route('/inventory/products/add', methods=['GET', 'POST'])
+@login_required
+def add_product():
+    if not has_permission('inventory.edit'):
+        abort(403)
+    
+    form = ProductForm()
+    form.category.choices = [(c.id, c.name) for c in reference_cache.all(Category)]
+    form.supplier.choices = [(0, 'Select Supplier')] + [(s.id, s.name) for s in reference_cache.all(Supplier, is_active=True)]
+    
+    if form.validate_on_submit():
+        product = Product(
+            name=form.name.data,
+            description=form.description.data,
+            sku=form.sku.data,
+            category_id=form.category.data,
+            supplier_id=form.supplier.data if form.supplier.data != 0 else None,
+            price=form.price.data,
+            cost=form.cost.data,
+            quantity_in_stock=form.quantity_in_stock.data,
+            reorder_level=form.reorder_level.data,
+            is_active=form.is_active.data
+        )
+        db.session.add(product)
+        db.session.commit()
+        flash('Product added successfully!', 'success')
+        return redirect(url_for('inventory.inventory'))
+    
+    return render_template('add_product.html', title='Add Product', form=form, has_permission=has_permission)
+
+@bp.route('/inventory/categories')
+@login_required
+def categories():
+    if not has_permission('inventory.view'):
+        abort(403)
+    
+    categories_list = reference_cache.all(Category)
+    return render_template('categories.html', title='Categories', categories=categories_list, has_permission=has_permission)
+
+@bp.route('/inventory/categories/add', methods=['GET', 'POST'])
+@login_required
+def add_category():
+    if not has_permission('inventory.edit'):
+        abort(403)
+    
+    form = CategoryForm()
+    if form.validate_on_submit():
+        category = Category(
+            name=form.name.data,
+            description=form.description.data
+        )
+        db.session.add(category)
+        db.session.commit()
+        flash('Category added successfully!', 'success')
+        return redirect(url_for('inventory.categories'))
+    
+    return render_template('add_category.html', title='Add Category', form=form, has_permission=has_permission)
+
+@bp.route('/inventory/suppliers')
+@login_required
+def suppliers():
+    if not has_permission('inventory.view'):
+        abort(403)
+    
+    suppliers_list = Supplier.query.all()
+    return render_template('suppliers.html', title='Suppliers', suppliers=suppliers_list, has_permission=has_permission)
+
+@bp.route('/inventory/suppliers/add', methods=['GET', 'POST'])
+@login_required
+def add_supplier():
+    if not has_permission('inventory.edit'):
+        abort(403)
+    
+    form = SupplierForm()
+    if form.validate_on_submit():
+        supplier = Supplier(
+            name=form.name.data,
+            contact_person=form.contact_person.data,
+            email=form.email.data,
+            phone=form.phone.data,
+            address=form.address.data,
+            is_active=form.is_active.data
+        )
+        db.session.add(supplier)
+        db.session.commit()
+        flash('Supplier added successfully!', 'success')
+        return redirect(url_for('inventory.suppliers'))
+    
+    return render_template('add_supplier.html', title='Add Supplier', form=form, has_permission=has_permission)
+
+
+@bp.route('/operations/stock-adjustment', methods=['GET', 'POST'])
+@login_required
+def stock_adjustment():
+    if not has_permission('operations.basic'):
+        abort(403)
+    
+    form = StockAdjustmentForm()
+    form.product.choices = [(p.id, f"{p.name} (Current: {p.quantity_in_stock})") for p in Product.query.filter_by(is_active=True).all()]
+    
+    if form.validate_on_submit():
+        product = Product.query.get(form.product.data)
+        
+        # Create stock movement record
+        movement = StockMovement(
+            product_id=form.product.data,
+            movement_type=form.movement_type.data,
+            quantity=form.quantity.data,
+            reference_type='ADJUSTMENT',
+            notes=form.notes.data,
+            created_by=current_user.id
+        )
+        
+        # Update product stock
+        if form.movement_type.data == 'IN':
+            product.quantity_in_stock += form.quantity.data
+        elif form.movement_type.data == 'OUT':
+            product.quantity_in_stock = max(0, product.quantity_in_stock - form.quantity.data)
+        else:  # ADJUSTMENT
+            product.quantity_in_stock = form.quantity.data
+        
+        db.session.add(movement)
+        db.session.commit()
+        flash('Stock adjustment processed successfully!', 'success')
+        return redirect(url_for('sales.operations'))
+    
+    return render_template('stock_adjustment.html', title='Stock Adjustment', form=form, has_permission=has_permission)
+
+@bp.route('/inventory/shelf-estimates')
+@login_required
+@permission_required('inventory.view')
+def shelf_estimates():
+    """Weight-based stock estimates; ?all=1 includes products that agree"""
+    from shelf_estimation import shelf_stock_estimator
+    if request.args.get('all'):
+        estimates = list(shelf_stock_estimator.estimate()[0].values())
+    else:
+        estimates = shelf_stock_estimator.discrepancies()
+    return jsonify(estimates)
+
+@bp.route('/inventory/shelf-estimates/reconcile', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def reconcile_shelf_estimates():
+    """Adjust disagreeing products to their estimate (mixed shelves only with include_mixed=1)"""
+    from shelf_estimation import shelf_stock_estimator
+    product_ids = request.form.getlist('product_id', type=int) or None
+    adjusted = shelf_stock_estimator.reconcile(product_ids, current_user.id,
+                                               exact_only=not request.form.get('include_mixed'))
+    return jsonify({'adjusted': adjusted})
+
+@bp.route('/inventory/slotting')
+@login_required
+@permission_required('inventory.view')
+def slotting_plan():
+    """Proposed shelf assignment by pick velocity; ?limit= caps the move list"""
+    from slotting import slotting_engine
+    plan = slotting_engine.plan()
+    return jsonify(plan.to_dict(request.args.get('limit', type=int)))
+
+@bp.route('/inventory/slotting/apply', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def apply_slotting():
+    """Recompute the plan and write it to the shelves"""
+    from slotting import slotting_engine
+    plan = slotting_engine.plan()
+    relocated = slotting_engine.apply(plan)
+    return jsonify({'relocated': relocated, 'summary': plan.summary})
+
+@bp.route('/maintenance/forecast')
+@login_required
+@permission_required('inventory.view')
+def maintenance_forecast():
+    """MTBF, MTTR and projected failure and service dates per equipment"""
+    from maintenance import maintenance_planner
+    return jsonify(maintenance_planner.forecast())
+
+@bp.route('/maintenance/schedule', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def schedule_maintenance():
+    """Book preventive maintenance for services due within the horizon"""
+    from maintenance import maintenance_planner
+    return jsonify({'scheduled': maintenance_planner.schedule(user_id=current_user.id)})
+
+@bp.route('/maintenance/<int:log_id>/parts', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def issue_maintenance_parts(log_id):
+    """Take ?product_id= and ?quantity= out of stock for a maintenance job"""
+    from spare_parts import spare_parts_planner
+    try:
+        movement = spare_parts_planner.issue(log_id, request.values.get('product_id', type=int),
+                                             request.values.get('quantity', type=int), current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'movement_id': movement.id, 'product_id': movement.product_id, 'quantity': movement.quantity})
+
+@bp.route('/maintenance/parts-forecast')
+@login_required
+@permission_required('inventory.view')
+def maintenance_parts_forecast():
+    """Weekly spare part requirements from scheduled and predicted maintenance"""
+    from spare_parts import spare_parts_planner
+    return jsonify(spare_parts_planner.project().to_dict())
+
+@bp.route('/mrp/planned-orders')
+@login_required
+@permission_required('inventory.view')
+def mrp_planned_orders():
+    """Planned purchase and work orders from the last MRP run; ?type=Purchase or Work"""
+    from mrp import mrp_engine
+    return jsonify([{
+        'id': order.id,
+        'product_id': order.product_id,
+        'product_name': order.product.name,
+        'order_type': order.order_type,
+        'quantity': order.quantity,
+        'release_date': order.release_date.isoformat(),
+        'due_date': order.due_date.isoformat(),
+        'low_level_code': order.low_level_code,
+        'supplier_id': order.supplier_id,
+        'is_past_due': order.is_past_due
+    } for order in mrp_engine.planned_orders(request.args.get('type'))])
+
+@bp.route('/mrp/run', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def run_mrp():
+    """Replan now instead of waiting for the nightly run"""
+    from mrp import mrp_engine
+    return jsonify({'planned': mrp_engine.run()})
+
+@bp.route('/inventory/replenishment/apply', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def apply_replenishment_policies():
+    """Write demand-based safety stock and reorder points to the products"""
+    from replenishment import replenishment_policies
+    return jsonify({'updated': replenishment_policies.apply()})
+
+# Delete routes
+@bp.route('/delete_product/<int:id>', methods=['POST'])
+@login_required
+@permission_required('products.delete')
+def delete_product(id):
+    product = Product.query.get_or_404(id)
+    
+    # Check if product is used in any active projects or orders
+    active_assignments = ProjectAssignment.query.filter_by(product_id=id, status='Reserved').count()
+    if active_assignments > 0:
+        flash(f'Cannot delete {product.name}. It is currently assigned to {active_assignments} active project(s).', 'error')
+        return redirect(url_for('inventory.inventory'))
+    
+    try:
+        # Create stock movement record for deletion
+        if product.quantity_in_stock > 0:
+            movement = StockMovement(
+                product_id=product.id,
+                movement_type='OUT',
+                quantity=product.quantity_in_stock,
+                reference_type='DELETION',
+                notes=f'Product deleted: {product.name}',
+                created_by=current_user.id
+            )
+            db.session.add(movement)
+        
+        db.session.delete(product)
+        db.session.commit()
+        flash(f'Product "{product.name}" has been deleted successfully.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error deleting product. Please try again.', 'error')
+    
+    return redirect(url_for('inventory.inventory'))
+
+@bp.route('/delete_category/<int:id>', methods=['POST'])
+@login_required
+@permission_required('categories.delete')
+def delete_category(id):
+    category = Category.query.get_or_404(id)
+    
+    # Check if category has products
+    product_count = Product.query.filter_by(category_id=id).count()
+    if product_count > 0:
+        flash(f'Cannot delete category "{category.name}". It contains {product_count} product(s).', 'error')
+        return redirect(url_for('inventory.categories'))
+    
+    try:
+        db.session.delete(category)
+        db.session.commit()
+        flash(f'Category "{category.name}" has been deleted successfully.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error deleting category. Please try again.', 'error')
+    
+    return redirect(url_for('inventory.categories'))
+
+@bp.route('/delete_supplier/<int:id>', methods=['POST'])
+@login_required
+@permission_required('suppliers.delete')
+def delete_supplier(id):
+    supplier = Supplier.query.get_or_404(id)
+    
+    # Check if supplier has products
+    product_count = Product.query.filter_by(supplier_id=id).count()
+    if product_count > 0:
+        flash(f'Cannot delete supplier "{supplier.name}". It supplies {product_count} product(s).', 'error')
+        return redirect(url_for('inventory.suppliers'))
+    
+    try:
+        db.session.delete(supplier)
+        db.session.commit()
+        flash(f'Supplier "{supplier.name}" has been deleted successfully.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error deleting supplier. Please try again.', 'error')
+    
+    return redirect(url_for('inventory.suppliers'))
+
+
+# Bill of Materials routes
+@bp.route('/bom')
+@login_required
+@permission_required('inventory.view')
+def bom_list():
+    boms = BillOfMaterials.query.filter_by(is_active=True).all()
+    return render_template('inventory/bom_list.html', boms=boms)
+
+@bp.route('/bom/new', methods=['GET', 'POST'])
+@login_required
+@permission_required('inventory.create')
+def create_bom():
+    form = BOMForm()
+    
+    # Populate product choices
+    products = Product.query.filter_by(is_active=True).all()
+    form.product_id.choices = [(0, 'Select Final Product (Optional)')] + [(p.id, p.name) for p in products]
+    
+    if form.validate_on_submit():
+        bom = BillOfMaterials(
+            name=form.name.data,
+            description=form.description.data,
+            version=form.version.data or '1.0',
+            product_id=form.product_id.data if form.product_id.data > 0 else None,
+            created_by=current_user.id
+        )
+        
+        db.session.add(bom)
+        db.session.commit()
+        
+        flash(f'BOM "{bom.name}" created successfully.', 'success')
+        return redirect(url_for('inventory.view_bom', id=bom.id))
+    
+    return render_template('inventory/bom_form.html', form=form, title='Create Bill of Materials')
+
+@bp.route('/bom/<int:id>')
+@login_required
+@permission_required('inventory.view')
+def view_bom(id):
+    from bom_engine import bom_engine
+    bom = BillOfMaterials.query.get_or_404(id)
+    form = BOMItemForm()
+    
+    # Populate product choices for adding items
+    products = Product.query.filter_by(is_active=True).all()
+    form.product_id.choices = [(0, 'Select Component')] + [(p.id, f"{p.name} (Stock: {p.quantity_in_stock})") for p in products]
+    
+    # Multi-level view of the final product's structure
+    explosion, buildable, cycle_error = [], None, None
+    if bom.product_id and bom_engine.graph().bom_of.get(bom.product_id) == bom.id:
+        try:
+            rows = bom_engine.tree(bom.product_id)
+            buildable = bom_engine.buildable(bom.product_id)
+        except ValueError as e:
+            rows, cycle_error = [], str(e)
+        names = {p.id: p for p in Product.query.filter(Product.id.in_({row[1] for row in rows})).all()} if rows else {}
+        explosion = [(level, names.get(product_id), per_unit, total) for level, product_id, per_unit, total in rows]
+    
+    short_items = [item for item in bom.bom_items if item.product.quantity_in_stock < item.quantity_required]
+    
+    return render_template('inventory/bom_detail.html', bom=bom, form=form, short_items=short_items,
+                           explosion=explosion, buildable=buildable, cycle_error=cycle_error)
+
+@bp.route('/bom/<int:id>/explode')
+@login_required
+@permission_required('inventory.view')
+def explode_bom(id):
+    """Purchased parts for ?quantity= units of the BOM's final product, with shortages"""
+    from bom_engine import bom_engine
+    bom = BillOfMaterials.query.get_or_404(id)
+    if not bom.product_id:
+        abort(400)
+    quantity = max(request.args.get('quantity', 1, type=int), 1)
+    try:
+        parts = bom_engine.explode(bom.product_id, quantity)
+        buildable = bom_engine.buildable(bom.product_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    stock = dict(db.session.query(Product.id, Product.quantity_in_stock).filter(Product.id.in_(list(parts))).all())
+    return jsonify({
+        'product_id': bom.product_id,
+        'quantity': quantity,
+        'buildable': buildable,
+        'components': [{'product_id': product_id, 'required': required, 'in_stock': stock.get(product_id, 0),
+                        'short': max(required - (stock.get(product_id) or 0), 0)}
+                       for product_id, required in sorted(parts.items())]
+    })
+
+@bp.route('/bom/<int:bom_id>/add_item', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def add_bom_item(bom_id):
+    from bom_engine import bom_engine
+    bom = BillOfMaterials.query.get_or_404(bom_id)
+    form = BOMItemForm()
+    
+    products = Product.query.filter_by(is_active=True).all()
+    form.product_id.choices = [(0, 'Select Component')] + [(p.id, p.name) for p in products]
+    
+    if form.validate_on_submit():
+        # Check if item already exists in BOM
+        existing_item = BOMItem.query.filter_by(bom_id=bom_id, product_id=form.product_id.data).first()
+        if existing_item:
+            flash('This component is already in the BOM.', 'error')
+            return redirect(url_for('inventory.view_bom', id=bom_id))
+        
+        if bom_engine.would_cycle(bom.product_id, form.product_id.data):
+            flash('This component contains the BOM\'s own product and would create a cycle.', 'error')
+            return redirect(url_for('inventory.view_bom', id=bom_id))
+        
+        product = reference_cache.get(Product, form.product_id.data)
+        bom_item = BOMItem(
+            bom_id=bom_id,
+            product_id=form.product_id.data,
+            quantity_required=form.quantity_required.data,
+            unit_cost=product.cost,
+            notes=form.notes.data
+        )
+        
+        db.session.add(bom_item)
+        db.session.commit()
+        
+        flash(f'Added {product.name} to BOM.', 'success')
+    
+    return redirect(url_for('inventory.view_bom', id=bom_id))
+
+# Kit Management routes
+@bp.route('/kits')
+@login_required
+@permission_required('inventory.view')
+def kits():
+    kits = Kit.query.filter_by(is_active=True).all()
+    return render_template('inventory/kits.html', kits=kits)
+
+@bp.route('/kits/availability')
+@login_required
+@permission_required('inventory.view')
+def kit_availability_counts():
+    """Units of every active kit that component stock can build"""
+    from kits import kit_availability
+    return jsonify({str(kit_id): count for kit_id, count in kit_availability.buildable().items()})
+
+@bp.route('/kit/<int:id>/assemble', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def assemble_kit(id):
+    """Consume components and add ?quantity= assembled kits to stock"""
+    from kits import kit_availability
+    try:
+        result = kit_availability.assemble(id, request.values.get('quantity', 1, type=int), current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(result)
+
+@bp.route('/kit/<int:id>/disassemble', methods=['POST'])
+@login_required
+@permission_required('inventory.edit')
+def disassemble_kit(id):
+    """Return ?quantity= assembled kits to their components"""
+    from kits import kit_availability
+    try:
+        result = kit_availability.disassemble(id, request.values.get('quantity', 1, type=int), current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(result)
+
+@bp.route('/kit/new', methods=['GET', 'POST'])
+@login_required
+@permission_required('inventory.create')
+def create_kit():
+    form = KitForm()
+    
+    categories = reference_cache.all(Category)
+    form.category_id.choices = [(0, 'Select Category (Optional)')] + [(c.id, c.name) for c in categories]
+    
+    if form.validate_on_submit():
+        kit = Kit(
+            name=form.name.data,
+            description=form.description.data,
+            kit_code=form.kit_code.data,
+            category_id=form.category_id.data if form.category_id.data > 0 else None,
+            created_by=current_user.id
+        )
+        
+        db.session.add(kit)
+        db.session.commit()
+        
+        flash(f'Kit "{kit.name}" created successfully.', 'success')
+        return redirect(url_for('inventory.view_kit', id=kit.id))
+    
+    return render_template('inventory/kit_form.html', form=form, title='Create Kit')
+
+@bp.route('/kit/<int:id>')
+@login_required
+@permission_required('inventory.view')
+def view_kit(id):
+    kit = Kit.query.get_or_404(id)
+    form = KitItemForm()
+    
+    products = Product.query.filter_by(is_active=True).all()
+    form.product_id.choices = [(0, 'Select Product')] + [(p.id, f"{p.name} (Stock: {p.quantity_in_stock})") for p in products]
+    
+    return render_template('inventory/kit_detail.html', kit=kit, form=form)
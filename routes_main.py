@@ -0,0 +1,254 @@
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask_login import login_user, current_user, logout_user, login_required
+from datetime import datetime, timedelta
+from sqlalchemy import func, and_
+from database import db
+from models import Role, User, Category, Product, Customer, Order, StockMovement, Project, Sale
+from forms import LoginForm, UserForm
+from auth import bcrypt, has_permission
+from cache import reference_cache
+from alerts import stock_alert_engine
+from notifications import notification_center, CATEGORY_PERMISSIONS
+from sse import event_hub
+
+bp = Blueprint('main', __name__)
+
+# Routes
+@bp.route('/')
+def index():
+    return redirect(url_for('main.login'))
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.dashboard'))
+    
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        
+        if user and user.is_active and bcrypt.check_password_hash(user.password_hash, form.password.data):
+            login_user(user)
+            user.last_login = datetime.utcnow()
+            db.session.commit()
+            
+            next_page = request.args.get('next')
+            return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
+        else:
+            flash('Login unsuccessful. Please check username, password, and account status.', 'danger')
+    
+    return render_template('login.html', title='Login', form=form)
+
+@bp.route('/logout')
+def logout():
+    logout_user()
+    return redirect(url_for('main.login'))
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    # Check if user has permission to view dashboard
+    if not has_permission('dashboard.view'):
+        abort(403)
+    
+    # Get dashboard statistics
+    total_products = Product.query.filter_by(is_active=True).count()
+    total_customers = Customer.query.filter_by(is_active=True).count()
+    total_orders = Order.query.count()
+    low_stock_products = stock_alert_engine.active_count()
+    
+    # Recent orders
+    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
+    
+    # Low stock products
+    low_stock_items = stock_alert_engine.active_alerts(limit=5)
+    
+    return render_template('dashboard.html', 
+                         title='Dashboard', 
+                         has_permission=has_permission,
+                         total_products=total_products,
+                         total_customers=total_customers,
+                         total_orders=total_orders,
+                         low_stock_products=low_stock_products,
+                         recent_orders=recent_orders,
+                         low_stock_items=low_stock_items)
+
+
+# Analytics Routes
+@bp.route('/analytics')
+@login_required
+def analytics():
+    if not has_permission('analytics.view'):
+        abort(403)
+    
+    # Get current date and calculate periods
+    today = datetime.now().date()
+    thirty_days_ago = today - timedelta(days=30)
+    this_month_start = today.replace(day=1)
+    last_month_start = (this_month_start - timedelta(days=1)).replace(day=1)
+    last_month_end = this_month_start - timedelta(days=1)
+    
+    # Inventory Analytics
+    total_products = Product.query.filter_by(is_active=True).count()
+    low_stock_count = stock_alert_engine.active_count()
+    total_inventory_value = db.session.query(func.sum(Product.price * Product.quantity_in_stock)).filter_by(is_active=True).scalar() or 0
+    
+    # Top categories by product count
+    top_categories = db.session.query(
+        Category.name,
+        func.count(Product.id).label('product_count')
+    ).join(Product).filter(Product.is_active == True).group_by(Category.name).order_by(func.count(Product.id).desc()).limit(5).all()
+    
+    # Customer Analytics
+    total_customers = Customer.query.filter_by(is_active=True).count()
+    new_customers_this_month = Customer.query.filter(
+        Customer.created_at >= this_month_start,
+        Customer.is_active == True
+    ).count()
+    
+    # Customer types distribution
+    customer_types = db.session.query(
+        Customer.customer_type,
+        func.count(Customer.id).label('count')
+    ).filter_by(is_active=True).group_by(Customer.customer_type).all()
+    
+    # Sales Analytics
+    total_sales = Sale.query.count()
+    this_month_sales = Sale.query.filter(Sale.sale_date >= this_month_start).count()
+    this_month_revenue = db.session.query(func.sum(Sale.total_amount)).filter(Sale.sale_date >= this_month_start).scalar() or 0
+    last_month_revenue = db.session.query(func.sum(Sale.total_amount)).filter(
+        and_(Sale.sale_date >= last_month_start, Sale.sale_date <= last_month_end)
+    ).scalar() or 0
+    
+    # Revenue growth
+    revenue_growth = 0
+    if last_month_revenue > 0:
+        revenue_growth = ((this_month_revenue - last_month_revenue) / last_month_revenue) * 100
+    
+    # Project Analytics
+    total_projects = Project.query.count()
+    active_projects = Project.query.filter_by(status='Active').count()
+    completed_projects = Project.query.filter_by(status='Completed').count()
+    
+    # Project status distribution
+    project_status = db.session.query(
+        Project.status,
+        func.count(Project.id).label('count')
+    ).group_by(Project.status).all()
+    
+    # Recent stock movements
+    recent_movements = StockMovement.query.order_by(StockMovement.created_at.desc()).limit(10).all()
+    
+    return render_template('analytics.html',
+                         title='Analytics Dashboard',
+                         has_permission=has_permission,
+                         # Inventory
+                         total_products=total_products,
+                         low_stock_count=low_stock_count,
+                         total_inventory_value=total_inventory_value,
+                         top_categories=top_categories,
+                         # Customers
+                         total_customers=total_customers,
+                         new_customers_this_month=new_customers_this_month,
+                         customer_types=customer_types,
+                         # Sales
+                         total_sales=total_sales,
+                         this_month_sales=this_month_sales,
+                         this_month_revenue=this_month_revenue,
+                         revenue_growth=revenue_growth,
+                         # Projects
+                         total_projects=total_projects,
+                         active_projects=active_projects,
+                         completed_projects=completed_projects,
+                         project_status=project_status,
+                         recent_movements=recent_movements)
+
+
+# Profile and Settings Routes
+@bp.route('/profile')
+@login_required
+def profile():
+    return render_template('profile.html', title='User Profile', has_permission=has_permission)
+
+@bp.route('/profile/edit', methods=['GET', 'POST'])
+@login_required
+def edit_profile():
+    form = UserForm()
+    form.role.choices = [(role.id, role.name) for role in reference_cache.all(Role)]
+    
+    if form.validate_on_submit():
+        current_user.username = form.username.data
+        current_user.email = form.email.data
+        
+        if form.password.data:
+            current_user.password_hash = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+            
+        db.session.commit()
+        flash('Profile updated successfully!', 'success')
+        return redirect(url_for('main.profile'))
+    
+    elif request.method == 'GET':
+        form.username.data = current_user.username
+        form.email.data = current_user.email
+        form.role.data = current_user.role_id
+        form.is_active.data = current_user.is_active
+    
+    return render_template('edit_profile.html', title='Edit Profile', form=form, has_permission=has_permission)
+
+@bp.route('/notifications')
+@login_required
+def notifications():
+    before = request.args.get('before', type=int)
+    unread_only = request.args.get('unread') == '1'
+    items, next_before = notification_center.page(current_user.id, before=before, unread_only=unread_only)
+    low_stock_items = stock_alert_engine.active_alerts(limit=5)
+    
+    return render_template('notifications.html', 
+                         title='Notifications', 
+                         notifications=items,
+                         next_before=next_before,
+                         unread_only=unread_only,
+                         link_for=notification_center.link_for,
+                         preferences=(current_user.preferences or {}).get('notifications', True),
+                         low_stock_items=low_stock_items,
+                         has_permission=has_permission)
+
+@bp.route('/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    ids = request.form.getlist('ids', type=int)
+    changed = notification_center.mark_read(current_user.id, ids or None)
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'marked': changed, 'unread': notification_center.unread_count(current_user.id)})
+    return redirect(request.referrer or url_for('main.notifications'))
+
+@bp.route('/notifications/settings', methods=['POST'])
+@login_required
+def notification_settings():
+    preferences = dict(current_user.preferences or {})
+    preferences['notifications'] = {category: request.form.get(category) == 'on'
+                                    for category in CATEGORY_PERMISSIONS}
+    # Reassign so the JSON column is detected as changed
+    current_user.preferences = preferences
+    db.session.commit()
+    flash('Notification settings saved', 'success')
+    return redirect(url_for('main.notifications'))
+
+@bp.route('/events/stream')
+@login_required
+def event_stream():
+    """Server-Sent Events stream of live stock, order and notification updates"""
+    permissions = {name for name in set(CATEGORY_PERMISSIONS.values()) if has_permission(name)}
+    subscription = event_hub.subscribe(current_user.id, permissions)
+    if subscription is None:
+        return Response('Too many live connections', status=503, headers={'Retry-After': '30'})
+    
+    # The generator never touches the database, so the request's session and
+    # connection are released as soon as this view returns
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(event_hub.stream(subscription, last_event_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The generator's cleanup never runs if the client leaves before the first chunk
+    response.call_on_close(lambda: event_hub.unsubscribe(subscription))
+    return response
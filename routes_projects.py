@@ -0,0 +1,353 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from flask_login import current_user, login_required
+from datetime import datetime
+from database import db
+from models import User, Product, Customer, StockMovement, Project, ProjectAssignment, WorkOrder
+from forms import ProjectForm, ProjectAssignmentForm, WorkOrderForm
+from auth import has_permission, permission_required
+from conditional import conditional
+import random
+import string
+
+bp = Blueprint('projects', __name__)
+
+# Project Management Routes
+@bp.route('/projects')
+@login_required
+@permission_required('projects.view')
+@conditional('project', 'customer')
+def projects():
+    projects_list = Project.query.order_by(Project.created_at.desc()).all()
+    return render_template('projects.html', title='Project Management', projects=projects_list, has_permission=has_permission)
+
+@bp.route('/projects/add', methods=['GET', 'POST'])
+@login_required
+def add_project():
+    if not has_permission('projects.edit'):
+        abort(403)
+    
+    form = ProjectForm()
+    form.customer.choices = [(0, 'Select Customer (Optional)')] + [(c.id, c.full_name) for c in Customer.query.filter_by(is_active=True).all()]
+    
+    if form.validate_on_submit():
+        # Generate project code if not provided
+        project_code = form.project_code.data
+        if not project_code:
+            project_code = 'PRJ' + ''.join(random.choices(string.digits, k=6))
+        
+        project = Project(
+            name=form.name.data,
+            description=form.description.data,
+            project_code=project_code,
+            customer_id=form.customer.data if form.customer.data != 0 else None,
+            status=form.status.data,
+            start_date=datetime.strptime(form.start_date.data, '%Y-%m-%d').date() if form.start_date.data else None,
+            end_date=datetime.strptime(form.end_date.data, '%Y-%m-%d').date() if form.end_date.data else None,
+            estimated_budget=form.estimated_budget.data,
+            priority=form.priority.data,
+            created_by=current_user.id
+        )
+        db.session.add(project)
+        db.session.commit()
+        flash('Project created successfully!', 'success')
+        return redirect(url_for('projects.projects'))
+    
+    return render_template('add_project.html', title='Add Project', form=form, has_permission=has_permission)
+
+@bp.route('/projects/<int:project_id>')
+@login_required
+def project_detail(project_id):
+    if not has_permission('projects.view'):
+        abort(403)
+    
+    project = Project.query.get_or_404(project_id)
+    assignments = ProjectAssignment.query.filter_by(project_id=project_id).all()
+    
+    # Calculate total assigned cost
+    total_assigned_cost = sum(assignment.total_cost or 0 for assignment in assignments)
+    
+    return render_template('project_detail.html', 
+                         title=f'Project: {project.name}', 
+                         project=project, 
+                         assignments=assignments,
+                         total_assigned_cost=total_assigned_cost,
+                         has_permission=has_permission)
+
+@bp.route('/projects/<int:project_id>/assign', methods=['GET', 'POST'])
+@login_required
+def assign_to_project(project_id):
+    if not has_permission('projects.edit'):
+        abort(403)
+    
+    project = Project.query.get_or_404(project_id)
+    form = ProjectAssignmentForm()
+    form.product.choices = [(p.id, f"{p.name} (Stock: {p.quantity_in_stock})") for p in Product.query.filter_by(is_active=True).all()]
+    
+    if form.validate_on_submit():
+        product = Product.query.get(form.product.data)
+        
+        # Check if enough stock is available
+        if product.quantity_in_stock < form.quantity_assigned.data:
+            flash(f'Insufficient stock! Only {product.quantity_in_stock} units available.', 'danger')
+            return render_template('assign_to_project.html', title='Assign Parts', form=form, project=project, has_permission=has_permission)
+        
+        # Calculate costs
+        unit_cost = product.cost
+        total_cost = unit_cost * form.quantity_assigned.data
+        
+        # Create assignment
+        assignment = ProjectAssignment(
+            project_id=project_id,
+            product_id=form.product.data,
+            quantity_assigned=form.quantity_assigned.data,
+            unit_cost=unit_cost,
+            total_cost=total_cost,
+            notes=form.notes.data,
+            assigned_by=current_user.id
+        )
+        
+        # Update product stock
+        product.quantity_in_stock -= form.quantity_assigned.data
+        
+        # Create stock movement record
+        movement = StockMovement(
+            product_id=form.product.data,
+            movement_type='OUT',
+            quantity=form.quantity_assigned.data,
+            reference_type='PROJECT',
+            reference_id=project_id,
+            notes=f'Assigned to project: {project.name}',
+            created_by=current_user.id
+        )
+        
+        # Update project actual cost
+        project.actual_cost = (project.actual_cost or 0) + total_cost
+        
+        db.session.add(assignment)
+        db.session.add(movement)
+        db.session.commit()
+        
+        flash(f'Successfully assigned {form.quantity_assigned.data} units of {product.name} to project!', 'success')
+        return redirect(url_for('projects.project_detail', project_id=project_id))
+    
+    return render_template('assign_to_project.html', title='Assign Parts', form=form, project=project, has_permission=has_permission)
+
+@bp.route('/projects/<int:project_id>/delete', methods=['POST'])
+@login_required
+def delete_project(project_id):
+    if not has_permission('projects.delete'):
+        abort(403)
+    
+    project = Project.query.get_or_404(project_id)
+    
+    # Return assigned parts to inventory
+    for assignment in project.assignments:
+        product = assignment.product
+        product.quantity_in_stock += assignment.quantity_assigned
+        
+        # Create stock movement record
+        movement = StockMovement(
+            product_id=assignment.product_id,
+            movement_type='IN',
+            quantity=assignment.quantity_assigned,
+            reference_type='PROJECT_RETURN',
+            reference_id=project_id,
+            notes=f'Returned from deleted project: {project.name}',
+            created_by=current_user.id
+        )
+        db.session.add(movement)
+    
+    db.session.delete(project)
+    db.session.commit()
+    flash('Project deleted and parts returned to inventory!', 'success')
+    return redirect(url_for('projects.projects'))
+
+
+@bp.route('/delete_project/<int:id>', methods=['POST'])
+@login_required
+@permission_required('projects.delete')
+def cancel_project(id):
+    project = Project.query.get_or_404(id)
+    
+    try:
+        # Return reserved inventory to available stock
+        assignments = ProjectAssignment.query.filter_by(project_id=id, status='Reserved').all()
+        for assignment in assignments:
+            product = Product.query.get(assignment.product_id)
+            if product:
+                product.quantity_in_stock += assignment.quantity_assigned
+                
+                # Create stock movement record
+                movement = StockMovement(
+                    product_id=product.id,
+                    movement_type='IN',
+                    quantity=assignment.quantity_assigned,
+                    reference_type='PROJECT_CANCELLATION',
+                    reference_id=project.id,
+                    notes=f'Returned from cancelled project: {project.name}',
+                    created_by=current_user.id
+                )
+                db.session.add(movement)
+        
+        db.session.delete(project)
+        db.session.commit()
+        flash(f'Project "{project.name}" has been deleted successfully. Reserved inventory has been returned.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error deleting project. Please try again.', 'error')
+    
+    return redirect(url_for('projects.projects'))
+
+
+# Project assignment routes
+@bp.route('/project/<int:project_id>/assign', methods=['GET', 'POST'])
+@login_required
+@permission_required('projects.edit')
+def reserve_for_project(project_id):
+    project = Project.query.get_or_404(project_id)
+    form = ProjectAssignmentForm()
+    
+    # Populate product choices with available stock
+    available_products = Product.query.filter(
+        Product.is_active == True,
+        Product.quantity_in_stock > 0
+    ).all()
+    form.product.choices = [(0, 'Select Product')] + [(p.id, f"{p.name} (Available: {p.quantity_in_stock})") for p in available_products]
+    
+    if form.validate_on_submit():
+        product = Product.query.get(form.product.data)
+        quantity = form.quantity_assigned.data
+        
+        if product.quantity_in_stock < quantity:
+            flash(f'Insufficient stock. Available: {product.quantity_in_stock}', 'error')
+            return render_template('projects/assign.html', form=form, project=project)
+        
+        # Create assignment
+        assignment = ProjectAssignment(
+            project_id=project.id,
+            product_id=product.id,
+            quantity_assigned=quantity,
+            unit_cost=product.cost,
+            total_cost=product.cost * quantity,
+            notes=form.notes.data,
+            assigned_by=current_user.id,
+            status='Reserved'
+        )
+        
+        if form.reserved_until.data:
+            try:
+                assignment.reserved_until = datetime.strptime(form.reserved_until.data, '%Y-%m-%d')
+            except ValueError:
+                pass
+        
+        # Update product stock
+        product.quantity_in_stock -= quantity
+        
+        # Create stock movement
+        movement = StockMovement(
+            product_id=product.id,
+            movement_type='OUT',
+            quantity=quantity,
+            reference_type='PROJECT',
+            reference_id=project.id,
+            notes=f'Assigned to project: {project.name}',
+            created_by=current_user.id
+        )
+        
+        db.session.add(assignment)
+        db.session.add(movement)
+        db.session.commit()
+        
+        flash(f'Successfully assigned {quantity} units of {product.name} to {project.name}', 'success')
+        return redirect(url_for('projects.project_detail', project_id=project.id))
+    
+    return render_template('projects/assign.html', form=form, project=project)
+
+@bp.route('/project/<int:project_id>/unassign/<int:assignment_id>', methods=['POST'])
+@login_required
+@permission_required('projects.edit')
+def unassign_from_project(project_id, assignment_id):
+    assignment = ProjectAssignment.query.get_or_404(assignment_id)
+    
+    if assignment.status == 'Used':
+        flash('Cannot unassign items that have already been used.', 'error')
+        return redirect(url_for('projects.project_detail', project_id=project_id))
+    
+    try:
+        # Return inventory to stock
+        product = Product.query.get(assignment.product_id)
+        product.quantity_in_stock += assignment.quantity_assigned
+        
+        # Create stock movement
+        movement = StockMovement(
+            product_id=product.id,
+            movement_type='IN',
+            quantity=assignment.quantity_assigned,
+            reference_type='PROJECT_RETURN',
+            reference_id=project_id,
+            notes=f'Returned from project: {assignment.project.name}',
+            created_by=current_user.id
+        )
+        
+        db.session.add(movement)
+        db.session.delete(assignment)
+        db.session.commit()
+        
+        flash(f'Successfully returned {assignment.quantity_assigned} units of {product.name} to inventory.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error returning items to inventory.', 'error')
+    
+    return redirect(url_for('projects.project_detail', project_id=project_id))
+
+
+# Work Order routes
+@bp.route('/work_orders')
+@login_required
+@permission_required('operations.view')
+def work_orders():
+    orders = WorkOrder.query.order_by(WorkOrder.created_at.desc()).all()
+    return render_template('operations/work_orders.html', orders=orders)
+
+@bp.route('/work_order/new', methods=['GET', 'POST'])
+@login_required
+@permission_required('operations.create')
+def create_work_order():
+    form = WorkOrderForm()
+    
+    projects = Project.query.filter_by(status='Active').all()
+    form.project_id.choices = [(0, 'No Project')] + [(p.id, p.name) for p in projects]
+    
+    users = User.query.filter_by(is_active=True).all()
+    form.assigned_to.choices = [(0, 'Unassigned')] + [(u.id, u.username) for u in users]
+    
+    if form.validate_on_submit():
+        # Generate work order number
+        last_order = WorkOrder.query.order_by(WorkOrder.id.desc()).first()
+        order_number = f"WO{(last_order.id + 1) if last_order else 1:06d}"
+        
+        work_order = WorkOrder(
+            work_order_number=order_number,
+            title=form.title.data,
+            description=form.description.data,
+            project_id=form.project_id.data if form.project_id.data > 0 else None,
+            priority=form.priority.data,
+            assigned_to=form.assigned_to.data if form.assigned_to.data > 0 else None,
+            estimated_hours=form.estimated_hours.data,
+            created_by=current_user.id
+        )
+        
+        db.session.add(work_order)
+        db.session.commit()
+        
+        flash(f'Work Order "{work_order.work_order_number}" created successfully.', 'success')
+        return redirect(url_for('projects.view_work_order', id=work_order.id))
+    
+    return render_template('operations/work_order_form.html', form=form, title='Create Work Order')
+
+@bp.route('/work_order/<int:id>')
+@login_required
+@permission_required('operations.view')
+def view_work_order(id):
+    work_order = WorkOrder.query.get_or_404(id)
+    return render_template('operations/work_order_detail.html', work_order=work_order)
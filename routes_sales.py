@@ -0,0 +1,188 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from flask_login import current_user, login_required
+from database import db
+from models import Product, Customer, Order, StockMovement, Project, Sale
+from forms import CustomerForm, OrderForm, SaleForm
+from auth import has_permission, permission_required
+from conditional import conditional
+import random
+import string
+
+bp = Blueprint('sales', __name__)
+
+@bp.route('/customers')
+@login_required
+def customers():
+    # Check if user has permission to view customers
+    if not has_permission('customers.view'):
+        abort(403)
+    
+    customers_list = Customer.query.filter_by(is_active=True).all()
+    return render_template('customers.html', title='Customer Management', customers=customers_list, has_permission=has_permission)
+
+@bp.route('/customers/add', methods=['GET', 'POST'])
+@login_required
+def add_customer():
+    if not has_permission('customers.edit'):
+        abort(403)
+    
+    form = CustomerForm()
+    if form.validate_on_submit():
+        customer = Customer(
+            first_name=form.first_name.data,
+            last_name=form.last_name.data,
+            email=form.email.data,
+            phone=form.phone.data,
+            address=form.address.data,
+            city=form.city.data,
+            state=form.state.data,
+            zip_code=form.zip_code.data,
+            customer_type=form.customer_type.data,
+            is_active=form.is_active.data
+        )
+        db.session.add(customer)
+        db.session.commit()
+        flash('Customer added successfully!', 'success')
+        return redirect(url_for('sales.customers'))
+    
+    return render_template('add_customer.html', title='Add Customer', form=form, has_permission=has_permission)
+
+@bp.route('/operations')
+@login_required
+def operations():
+    # Check if user has permission to perform basic operations
+    if not has_permission('operations.basic'):
+        abort(403)
+    
+    orders = Order.query.order_by(Order.created_at.desc()).all()
+    return render_template('operations.html', title='Basic Operations', orders=orders, has_permission=has_permission)
+
+@bp.route('/operations/orders/add', methods=['GET', 'POST'])
+@login_required
+def add_order():
+    if not has_permission('operations.basic'):
+        abort(403)
+    
+    form = OrderForm()
+    form.customer.choices = [(c.id, c.full_name) for c in Customer.query.filter_by(is_active=True).all()]
+    
+    if form.validate_on_submit():
+        # Generate order number
+        order_number = 'ORD' + ''.join(random.choices(string.digits, k=6))
+        
+        order = Order(
+            order_number=order_number,
+            customer_id=form.customer.data,
+            status=form.status.data,
+            notes=form.notes.data,
+            created_by=current_user.id
+        )
+        db.session.add(order)
+        db.session.commit()
+        flash('Order created successfully!', 'success')
+        return redirect(url_for('sales.operations'))
+    
+    return render_template('add_order.html', title='Add Order', form=form, has_permission=has_permission)
+
+
+# Sales Routes
+@bp.route('/sales')
+@login_required
+@permission_required('sales.view')
+@conditional('sale', 'customer')
+def sales():
+    sales_list = Sale.query.order_by(Sale.sale_date.desc()).all()
+    return render_template('sales.html', title='Sales Management', sales=sales_list, has_permission=has_permission)
+
+@bp.route('/sales/add', methods=['GET', 'POST'])
+@login_required
+def add_sale():
+    if not has_permission('sales.edit'):
+        abort(403)
+    
+    form = SaleForm()
+    form.customer.choices = [(c.id, c.full_name) for c in Customer.query.filter_by(is_active=True).all()]
+    
+    if form.validate_on_submit():
+        # Generate sale number
+        sale_number = 'SAL' + ''.join(random.choices(string.digits, k=6))
+        
+        sale = Sale(
+            sale_number=sale_number,
+            customer_id=form.customer.data,
+            payment_method=form.payment_method.data,
+            payment_status=form.payment_status.data,
+            notes=form.notes.data,
+            created_by=current_user.id
+        )
+        db.session.add(sale)
+        db.session.commit()
+        flash('Sale created successfully!', 'success')
+        return redirect(url_for('sales.sales'))
+    
+    return render_template('add_sale.html', title='Add Sale', form=form, has_permission=has_permission)
+
+
+@bp.route('/delete_customer/<int:id>', methods=['POST'])
+@login_required
+@permission_required('customers.delete')
+def delete_customer(id):
+    customer = Customer.query.get_or_404(id)
+    
+    # Check if customer has orders or projects
+    order_count = Order.query.filter_by(customer_id=id).count()
+    project_count = Project.query.filter_by(customer_id=id).count()
+    
+    if order_count > 0 or project_count > 0:
+        flash(f'Cannot delete customer "{customer.full_name}". They have {order_count} order(s) and {project_count} project(s).', 'error')
+        return redirect(url_for('sales.customers'))
+    
+    try:
+        db.session.delete(customer)
+        db.session.commit()
+        flash(f'Customer "{customer.full_name}" has been deleted successfully.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error deleting customer. Please try again.', 'error')
+    
+    return redirect(url_for('sales.customers'))
+
+
+@bp.route('/delete_sale/<int:id>', methods=['POST'])
+@login_required
+@permission_required('sales.delete')
+def delete_sale(id):
+    sale = Sale.query.get_or_404(id)
+    
+    # Only allow deletion of pending sales
+    if sale.payment_status not in ['Pending', 'Cancelled']:
+        flash('Only pending or cancelled sales can be deleted.', 'error')
+        return redirect(url_for('sales.sales'))
+    
+    try:
+        # Return inventory if sale items were deducted
+        for item in sale.sale_items:
+            product = Product.query.get(item.product_id)
+            if product:
+                product.quantity_in_stock += item.quantity
+                
+                # Create stock movement record
+                movement = StockMovement(
+                    product_id=product.id,
+                    movement_type='IN',
+                    quantity=item.quantity,
+                    reference_type='SALE_CANCELLATION',
+                    reference_id=sale.id,
+                    notes=f'Returned from cancelled sale: {sale.sale_number}',
+                    created_by=current_user.id
+                )
+                db.session.add(movement)
+        
+        db.session.delete(sale)
+        db.session.commit()
+        flash(f'Sale "{sale.sale_number}" has been deleted successfully.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error deleting sale. Please try again.', 'error')
+    
+    return redirect(url_for('sales.sales'))
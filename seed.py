@@ -0,0 +1,160 @@
+from datetime import datetime
+from sqlalchemy import select, insert
+from sqlalchemy.exc import DBAPIError
+from database import db
+from models import Role, Permission, Category, User, SystemSetting, OutboxEvent, role_permissions
+from cache import reference_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the default data below or the set of tables changes so existing
+# databases re-seed (init_db skips create_all while the marker matches)
+SEED_VERSION = '11'
+SEED_VERSION_KEY = 'seed_version'
+
+DEFAULT_ROLES = [
+    ('Admin', 'Full system access'),
+    ('Manager', 'Access to inventory and customer management'),
+    ('Operator', 'Access to basic operations'),
+    ('Viewer', 'Read-only access to the system')
+]
+
+DEFAULT_PERMISSIONS = [
+    ('users.view', 'View Users'),
+    ('users.create', 'Create Users'),
+    ('users.edit', 'Edit Users'),
+    ('users.delete', 'Delete Users'),
+    ('roles.manage', 'Manage Roles'),
+    ('dashboard.view', 'View Dashboard'),
+    ('settings.edit', 'Edit Settings'),
+    ('inventory.view', 'View Inventory'),
+    ('inventory.edit', 'Edit Inventory'),
+    ('customers.view', 'View Customers'),
+    ('customers.edit', 'Edit Customers'),
+    ('operations.basic', 'Perform Basic Operations'),
+    ('analytics.view', 'View Analytics'),
+    ('projects.view', 'View Projects'),
+    ('projects.edit', 'Edit Projects'),
+    ('projects.delete', 'Delete Projects'),
+    ('sales.view', 'View Sales'),
+    ('sales.edit', 'Edit Sales'),
+    ('reports.view', 'View Reports'),
+    ('reports.export', 'Export Reports')
+]
+
+DEFAULT_CATEGORIES = [
+    ('Electronics', 'Electronic devices and components'),
+    ('Clothing', 'Apparel and accessories'),
+    ('Books', 'Books and publications'),
+    ('Home & Garden', 'Home improvement and gardening supplies'),
+    ('Sports', 'Sports equipment and accessories')
+]
+
+# None means every permission
+DEFAULT_ROLE_PERMISSIONS = {
+    'Admin': None,
+    'Manager': [
+        'dashboard.view', 'inventory.view', 'inventory.edit', 'customers.view', 'customers.edit',
+        'operations.basic', 'analytics.view', 'projects.view', 'projects.edit', 'sales.view',
+        'sales.edit', 'reports.view', 'reports.export'
+    ],
+    'Operator': [
+        'dashboard.view', 'operations.basic', 'inventory.view', 'customers.view', 'projects.view',
+        'sales.view', 'reports.view'
+    ],
+    'Viewer': [
+        'dashboard.view', 'inventory.view', 'customers.view', 'analytics.view', 'projects.view',
+        'sales.view', 'reports.view'
+    ]
+}
+
+def _insert_missing(model, rows):
+    """Insert (name, description) rows whose name is not in the table yet"""
+    existing = set(db.session.scalars(select(model.name)))
+    missing = [{'name': name, 'description': description} for name, description in rows if name not in existing]
+    if missing:
+        db.session.execute(insert(model), missing)
+    return len(missing)
+
+def _name_to_id(model):
+    return dict(db.session.execute(select(model.name, model.id)).all())
+
+def _link_role_permissions():
+    """Add default role-permission links that are missing
+
+    Links that were removed or added by an administrator are otherwise left
+    alone; only pairs from DEFAULT_ROLE_PERMISSIONS are ever inserted.
+    """
+    role_ids = _name_to_id(Role)
+    permission_ids = _name_to_id(Permission)
+
+    wanted = set()
+    for role_name, permission_names in DEFAULT_ROLE_PERMISSIONS.items():
+        names = permission_ids.keys() if permission_names is None else permission_names
+        wanted.update((role_ids[role_name], permission_ids[name]) for name in names)
+
+    existing = set(db.session.execute(
+        select(role_permissions.c.role_id, role_permissions.c.permission_id)
+    ).all())
+    missing = [{'role_id': role_id, 'permission_id': permission_id}
+               for role_id, permission_id in sorted(wanted - existing)]
+    if missing:
+        db.session.execute(insert(role_permissions), missing)
+    return role_ids, len(missing)
+
+def is_seeded():
+    """True when the seed marker matches SEED_VERSION (one primary key lookup)"""
+    try:
+        marker = db.session.get(SystemSetting, SEED_VERSION_KEY)
+    except DBAPIError:
+        # The settings table does not exist yet
+        db.session.rollback()
+        return False
+    return marker is not None and marker.value == SEED_VERSION
+
+def seed_database(password_hasher):
+    """Insert default roles, permissions, categories and the admin user
+
+    Returns False without touching anything when the database is already
+    seeded at SEED_VERSION.
+    """
+    marker = db.session.get(SystemSetting, SEED_VERSION_KEY)
+    if marker is not None and marker.value == SEED_VERSION:
+        logger.info(f"Database already seeded at version {SEED_VERSION}")
+        return False
+
+    roles_added = _insert_missing(Role, DEFAULT_ROLES)
+    permissions_added = _insert_missing(Permission, DEFAULT_PERMISSIONS)
+    categories_added = _insert_missing(Category, DEFAULT_CATEGORIES)
+    role_ids, links_added = _link_role_permissions()
+    if roles_added or permissions_added or links_added:
+        # Core inserts write no change stream rows, which page ETags rely on
+        db.session.execute(insert(OutboxEvent), [
+            {'entity': entity, 'entity_id': None, 'operation': 'BULK_UPDATE', 'data': None,
+             'created_at': datetime.utcnow()}
+            for entity in ('role', 'permission')
+        ])
+
+    # Create default admin user if no users exist
+    if db.session.execute(select(User.id).limit(1)).first() is None:
+        db.session.execute(insert(User), [{
+            'username': 'admin',
+            'email': 'admin@example.com',
+            'password_hash': password_hasher('admin'),
+            'role_id': role_ids['Admin'],
+            'is_active': True
+        }])
+
+    if marker is None:
+        db.session.add(SystemSetting(key=SEED_VERSION_KEY, value=SEED_VERSION))
+    else:
+        marker.value = SEED_VERSION
+    db.session.commit()
+
+    # Bulk inserts bypass the flush events that normally bump cache versions
+    reference_cache.bump('role', 'permission', 'category', 'role_permissions', 'user')
+
+    logger.info(f"Seeded database to version {SEED_VERSION}: {roles_added} roles, {permissions_added} permissions, "
+                f"{categories_added} categories, {links_added} role permissions")
+    return True
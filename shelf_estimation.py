@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, bindparam
+from database import db
+from models import Product, SmartShelf, StockMovement, shelf_products
+from deferred import deferred_engines
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ShelfStockEstimator:
+    """Unit counts estimated from smart shelf weights
+
+    For every shelf the expected load is the sum of quantity x unit weight
+    of the products recorded on it (shelf_products). The difference with
+    the measured current_weight is shared among those products in
+    proportion to their part of the expected load and converted back to
+    units. Shelves holding one product give exact counts; mixed shelves give
+    an approximation and are marked as such.
+    """
+
+    def __init__(self, tolerance_units=1, tolerance_ratio=0.05, max_age=900):
+        self.tolerance_units = tolerance_units
+        self.tolerance_ratio = tolerance_ratio
+        self.max_age = max_age
+        self.auto_reconcile = False
+
+    def init_app(self, app):
+        self.tolerance_units = app.config.get('SHELF_ESTIMATE_TOLERANCE_UNITS', self.tolerance_units)
+        self.tolerance_ratio = app.config.get('SHELF_ESTIMATE_TOLERANCE_PERCENT', self.tolerance_ratio * 100) / 100
+        self.max_age = app.config.get('SHELF_ESTIMATE_MAX_AGE', self.max_age)
+        self.auto_reconcile = app.config.get('SHELF_AUTO_RECONCILE', self.auto_reconcile)
+
+    def _load(self, product_ids=None):
+        statement = select(
+            shelf_products.c.shelf_id, shelf_products.c.product_id, shelf_products.c.quantity,
+            SmartShelf.current_weight, SmartShelf.last_updated, Product.weight, Product.quantity_in_stock
+        ).join(SmartShelf, SmartShelf.id == shelf_products.c.shelf_id) \
+         .join(Product, Product.id == shelf_products.c.product_id) \
+         .where(Product.is_active == True, Product.weight > 0)
+        if product_ids is not None:
+            # Whole shelves, so products sharing a shelf still take their part of its weight
+            statement = statement.where(shelf_products.c.shelf_id.in_(
+                select(shelf_products.c.shelf_id).where(shelf_products.c.product_id.in_(product_ids))
+            ))
+        return db.session.execute(statement).all()
+
+    def estimate(self, product_ids=None):
+        """Per-product estimates, as (products, placements)
+
+        products maps product id to recorded and estimated quantities;
+        placements lists (shelf_id, product_id, estimated_quantity) for every
+        shelf slot that could be measured.
+        """
+        rows = self._load(product_ids)
+        if not rows:
+            return {}, []
+
+        shelf_ids = np.array([row.shelf_id for row in rows], dtype=np.int64)
+        slot_products = np.array([row.product_id for row in rows], dtype=np.int64)
+        quantity = np.array([row.quantity or 0 for row in rows], dtype=np.float64)
+        unit_weight = np.array([float(row.weight) for row in rows])
+        measured_by_row = np.array([np.nan if row.current_weight is None else float(row.current_weight) for row in rows])
+        fresh_after = datetime.utcnow() - timedelta(seconds=self.max_age)
+        fresh_by_row = np.array([row.last_updated is not None and row.last_updated >= fresh_after for row in rows])
+
+        shelves, shelf_index = np.unique(shelf_ids, return_inverse=True)
+        load = quantity * unit_weight
+        expected = np.bincount(shelf_index, weights=load, minlength=len(shelves))
+        slots = np.bincount(shelf_index, minlength=len(shelves))
+        measured = np.full(len(shelves), np.nan)
+        measured[shelf_index] = measured_by_row
+        fresh = np.zeros(len(shelves), dtype=bool)
+        fresh[shelf_index] = fresh_by_row
+        usable = fresh & ~np.isnan(measured)
+
+        # Share of the weight change per slot; an empty shelf splits it evenly
+        delta = np.where(usable, measured - expected, 0.0)
+        share = np.where(expected[shelf_index] > 0,
+                         load / np.where(expected[shelf_index] > 0, expected[shelf_index], 1.0),
+                         1.0 / slots[shelf_index])
+        estimated = np.where(usable[shelf_index],
+                             np.maximum(np.rint(quantity + delta[shelf_index] * share / unit_weight), 0),
+                             quantity)
+
+        products, product_index = np.unique(slot_products, return_inverse=True)
+        recorded_total = np.bincount(product_index, weights=quantity, minlength=len(products))
+        estimated_total = np.bincount(product_index, weights=estimated, minlength=len(products))
+        measured_slots = np.bincount(product_index, weights=usable[shelf_index], minlength=len(products))
+        mixed = np.bincount(product_index, weights=usable[shelf_index] & (slots[shelf_index] > 1),
+                            minlength=len(products))
+        stock = {row.product_id: row.quantity_in_stock for row in rows}
+
+        results = {}
+        for i, product_id in enumerate(products.tolist()):
+            in_stock = stock[product_id]
+            # Stock that is not on a shelf is taken from the books as is
+            off_shelf = max(in_stock - int(recorded_total[i]), 0)
+            estimated_stock = off_shelf + int(estimated_total[i])
+            difference = estimated_stock - in_stock
+            results[product_id] = {
+                'product_id': product_id,
+                'quantity_in_stock': in_stock,
+                'on_shelves_recorded': int(recorded_total[i]),
+                'on_shelves_estimated': int(estimated_total[i]),
+                'estimated_stock': estimated_stock,
+                'difference': difference,
+                'measured_shelves': int(measured_slots[i]),
+                'exact': bool(measured_slots[i] > 0 and mixed[i] == 0),
+                'disagrees': bool(measured_slots[i] > 0 and abs(difference) > max(self.tolerance_units,
+                                                                                  self.tolerance_ratio * in_stock))
+            }
+        placements = [(int(shelf_ids[i]), int(slot_products[i]), int(estimated[i]))
+                      for i in np.nonzero(usable[shelf_index])[0]]
+        if product_ids is not None:
+            wanted = set(product_ids)
+            results = {product_id: r for product_id, r in results.items() if product_id in wanted}
+            placements = [placement for placement in placements if placement[1] in wanted]
+        return results, placements
+
+    def discrepancies(self):
+        """Estimates that disagree with quantity_in_stock beyond the tolerance"""
+        results = self.estimate()[0]
+        return sorted((r for r in results.values() if r['disagrees']), key=lambda r: -abs(r['difference']))
+
+    def reconcile(self, product_ids=None, user_id=None, exact_only=True):
+        """Post ADJUSTMENT movements bringing disagreeing products to their estimate
+
+        Shelf slot quantities are updated to the estimates as well, so the
+        next estimate starts from the corrected baseline. Everything is
+        written in one transaction. Returns the number of products adjusted.
+        """
+        results, placements = self.estimate(product_ids)
+        adjust = {product_id: r for product_id, r in results.items()
+                  if r['disagrees'] and (r['exact'] or not exact_only)}
+        if not adjust:
+            return 0
+
+        products = Product.query.filter(Product.id.in_(list(adjust))).all()
+        for product in products:
+            estimate = adjust[product.id]
+            db.session.add(StockMovement(
+                product_id=product.id,
+                movement_type='ADJUSTMENT',
+                quantity=estimate['estimated_stock'],
+                reference_type='SHELF_ESTIMATE',
+                notes=f"Shelf weight estimate, was {product.quantity_in_stock}",
+                created_by=user_id
+            ))
+            product.quantity_in_stock = estimate['estimated_stock']
+
+        slots = [{'b_shelf_id': shelf_id, 'b_product_id': product_id, 'b_quantity': quantity}
+                 for shelf_id, product_id, quantity in placements if product_id in adjust]
+        if slots:
+            db.session.execute(
+                update(shelf_products)
+                .where(shelf_products.c.shelf_id == bindparam('b_shelf_id'),
+                       shelf_products.c.product_id == bindparam('b_product_id'))
+                .values(quantity=bindparam('b_quantity')),
+                slots
+            )
+        db.session.commit()
+        logger.info(f"Reconciled {len(products)} products from shelf weights")
+        return len(products)
+
+# Global shelf stock estimator instance
+shelf_stock_estimator = deferred_engines.register(ShelfStockEstimator())
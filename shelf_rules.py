@@ -0,0 +1,288 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, bindparam
+from database import db
+from models import Product, SmartShelf, ShelfEnvironmentAlert, shelf_products
+from cache import reference_cache
+from events import emit
+from timeseries import to_epoch
+from deferred import deferred_engines
+import numpy as np
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+WATCHED_METRICS = ('temperature', 'humidity')
+
+# Rules evaluated for every watched metric, in state bit order
+RULES = ('high', 'low', 'rate', 'excursion')
+
+# Named limit sets that products opt into through compliance_tags
+ENVIRONMENT_PROFILES = {
+    'cold_chain': {'temperature_min': 2, 'temperature_max': 8, 'temperature_rate': 1, 'temperature_minutes_above': 30},
+    'frozen': {'temperature_max': -18, 'temperature_minutes_above': 15},
+    'controlled_room': {'temperature_min': 15, 'temperature_max': 25},
+    'dry': {'humidity_max': 60}
+}
+
+def product_limits(compliance_tags, safety_labels):
+    """Environmental limits of a product: its profiles, overridden by safety_labels
+
+    safety_labels may set <metric>_min, <metric>_max, <metric>_rate (change
+    per minute) and <metric>_minutes_above (time allowed above max).
+    """
+    limits = {}
+    tags = compliance_tags if isinstance(compliance_tags, list) else []
+    for tag in tags:
+        for key, value in ENVIRONMENT_PROFILES.get(str(tag).lower(), {}).items():
+            limits[key] = _tighter(key, limits.get(key), value)
+    if isinstance(safety_labels, dict):
+        for metric in WATCHED_METRICS:
+            for suffix in ('min', 'max', 'rate', 'minutes_above'):
+                key = f'{metric}_{suffix}'
+                if safety_labels.get(key) is not None:
+                    limits[key] = float(safety_labels[key])
+    return limits
+
+def _tighter(key, current, value):
+    if current is None:
+        return value
+    return max(current, value) if key.endswith('_min') else min(current, value)
+
+class ShelfLimits:
+    """Per-shelf limits as arrays: the tightest limits of the products on each shelf"""
+
+    def __init__(self, rows):
+        combined = {}
+        for row in rows:
+            limits = product_limits(row.compliance_tags, row.safety_labels)
+            if not limits:
+                continue
+            shelf = combined.setdefault(row.shelf_code, {'id': row.id, 'location': row.location, 'limits': {}})
+            for key, value in limits.items():
+                shelf['limits'][key] = _tighter(key, shelf['limits'].get(key), value)
+
+        self.codes = list(combined)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.ids = np.array([combined[code]['id'] for code in self.codes], dtype=np.int64)
+        self.locations = [combined[code]['location'] for code in self.codes]
+        self.arrays = {}
+        for metric in WATCHED_METRICS:
+            for suffix in ('min', 'max', 'rate', 'minutes_above'):
+                key = f'{metric}_{suffix}'
+                self.arrays[key] = np.array([combined[code]['limits'].get(key, np.nan) for code in self.codes],
+                                            dtype=np.float64)
+
+class ShelfRuleEngine:
+    """Incremental environmental rules over shelf telemetry
+
+    Each telemetry batch is checked against per-shelf limits for
+    temperature and humidity: above max or below min, change faster than
+    the allowed rate per minute, and time continuously above max longer
+    than allowed. Per shelf only the last value and time, the start of the
+    current excursion and a bitmask of active alerts are kept, in NumPy
+    arrays, so a batch costs time proportional to its samples. Alerts are
+    raised when a rule starts failing and cleared when it passes again,
+    stored in shelf_environment_alert and emitted as events in bulk.
+    """
+
+    def __init__(self, limits_ttl=300):
+        self.limits_ttl = limits_ttl
+        self._limits = None
+        self._state = None
+        self._versions = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.raised = 0
+        self.cleared = 0
+        self.eval_ms = 0.0
+
+    def init_app(self, app):
+        self.limits_ttl = app.config.get('SHELF_RULES_LIMITS_TTL', self.limits_ttl)
+
+    def _state_arrays(self, size):
+        state = {'active': np.zeros(size, dtype=np.uint8)}
+        for metric in WATCHED_METRICS:
+            state[f'{metric}_value'] = np.full(size, np.nan)
+            state[f'{metric}_time'] = np.full(size, np.nan)
+            state[f'{metric}_above_since'] = np.full(size, np.nan)
+        return state
+
+    def limits(self):
+        """Current shelf limits, reloaded when products or shelves change
+
+        Per-shelf state is carried over to the new arrays, and alerts still
+        open in the database are marked active so they are not raised twice.
+        """
+        versions = tuple(reference_cache.version(table) for table in ('product', 'smart_shelf', 'shelf_products'))
+        with self._lock:
+            if self._limits is not None and self._versions == versions and \
+                    time.monotonic() - self._loaded_at < self.limits_ttl:
+                return self._limits
+
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(SmartShelf.id, SmartShelf.shelf_id.label('shelf_code'), SmartShelf.location,
+                       Product.compliance_tags, Product.safety_labels)
+                .join(shelf_products, shelf_products.c.shelf_id == SmartShelf.id)
+                .join(Product, Product.id == shelf_products.c.product_id)
+                .where(Product.is_active == True,
+                       (Product.compliance_tags.isnot(None)) | (Product.safety_labels.isnot(None)))
+            ).all()
+            open_alerts = connection.execute(
+                select(ShelfEnvironmentAlert.shelf_id, ShelfEnvironmentAlert.metric, ShelfEnvironmentAlert.rule)
+                .where(ShelfEnvironmentAlert.cleared_at.is_(None))
+            ).all()
+        limits = ShelfLimits(rows)
+        state = self._state_arrays(len(limits.codes))
+
+        with self._lock:
+            previous, old_state = self._limits, self._state
+            if previous is not None:
+                for code, i in limits.index.items():
+                    j = previous.index.get(code)
+                    if j is not None:
+                        for key, values in old_state.items():
+                            state[key][i] = values[j]
+            by_id = {shelf_id: i for i, shelf_id in enumerate(limits.ids.tolist())}
+            for shelf_id, metric, rule in open_alerts:
+                if shelf_id in by_id and metric in WATCHED_METRICS and rule in RULES:
+                    state['active'][by_id[shelf_id]] |= self._bit(metric, rule)
+            self._limits, self._state = limits, state
+            self._versions, self._loaded_at = versions, time.monotonic()
+        return limits
+
+    @staticmethod
+    def _bit(metric, rule):
+        return 1 << (WATCHED_METRICS.index(metric) * len(RULES) + RULES.index(rule))
+
+    def evaluate(self, readings):
+        """Check a batch of (shelf_id, timestamp, {metric: value}) readings"""
+        started = time.monotonic()
+        self.limits()
+        raised, cleared = [], []
+
+        with self._lock:
+            limits, state = self._limits, self._state
+            batch = [(limits.index[shelf_code], to_epoch(timestamp) + timestamp.microsecond / 1e6, values)
+                     for shelf_code, timestamp, values in readings if shelf_code in limits.index]
+            if not batch:
+                return
+            shelves = np.array([row[0] for row in batch], dtype=np.int64)
+            times = np.array([row[1] for row in batch])
+            order = np.lexsort((times, shelves))
+            shelves, times = shelves[order], times[order]
+            for metric in WATCHED_METRICS:
+                values = np.array([batch[i][2].get(metric, np.nan) for i in order], dtype=np.float64)
+                present = np.nonzero(~np.isnan(values))[0]
+                if len(present):
+                    self._evaluate_metric(metric, limits, state, shelves[present], times[present],
+                                          values[present], raised, cleared)
+            self.samples += len(batch)
+            self.raised += len(raised)
+            self.cleared += len(cleared)
+            self.eval_ms += (time.monotonic() - started) * 1000
+
+        if raised or cleared:
+            self._publish(raised, cleared)
+
+    def _evaluate_metric(self, metric, limits, state, shelves, times, values, raised, cleared):
+        """Vectorized rule checks for one metric; readings are sorted by shelf then time"""
+        first = np.r_[True, shelves[1:] != shelves[:-1]]
+        last = np.r_[shelves[1:] != shelves[:-1], True]
+        low = limits.arrays[f'{metric}_min'][shelves]
+        high = limits.arrays[f'{metric}_max'][shelves]
+        max_rate = limits.arrays[f'{metric}_rate'][shelves]
+        grace = limits.arrays[f'{metric}_minutes_above'][shelves] * 60
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            above = values > high
+            below = values < low
+
+            # Previous reading: the last one of the shelf's previous batch for the first of each run
+            previous_value = np.where(first, state[f'{metric}_value'][shelves], np.r_[np.nan, values[:-1]])
+            previous_time = np.where(first, state[f'{metric}_time'][shelves], np.r_[np.nan, times[:-1]])
+            elapsed = times - previous_time
+            rate = np.abs(values - previous_value) / np.where(elapsed > 0, elapsed, np.nan) * 60
+            too_fast = rate > max_rate
+
+            # Start of the current time above max, continuing from the previous batch
+            starts = above & (first | ~np.r_[False, above[:-1]])
+            carried = state[f'{metric}_above_since'][shelves]
+            start_times = np.where(first & ~np.isnan(carried), carried, times)
+            start_index = np.maximum.accumulate(np.where(starts, np.arange(len(values)), 0))
+            above_since = np.where(above, start_times[start_index], np.nan)
+            excursion = above & (times - above_since >= grace)
+
+        active = state['active']
+        for rule, failing, limit in (('high', above, high), ('low', below, low),
+                                     ('rate', too_fast, max_rate), ('excursion', excursion, high)):
+            bit = self._bit(metric, rule)
+            failing_at = np.nonzero(failing)[0]
+            if len(failing_at):
+                failing_shelves, first_failure = np.unique(shelves[failing_at], return_index=True)
+                for shelf, position in zip(failing_shelves.tolist(), failing_at[first_failure].tolist()):
+                    if not active[shelf] & bit:
+                        active[shelf] |= bit
+                        raised.append(self._alert(limits, shelf, metric, rule, values[position],
+                                                  limit[position], times[position]))
+            # A rule that passes on the shelf's latest reading clears its alert
+            for shelf, position in zip(shelves[last].tolist(), np.nonzero(last)[0].tolist()):
+                if active[shelf] & bit and not failing[position]:
+                    active[shelf] &= ~bit & 0xFF
+                    cleared.append(self._alert(limits, shelf, metric, rule, values[position],
+                                               limit[position], times[position]))
+
+        state[f'{metric}_value'][shelves[last]] = values[last]
+        state[f'{metric}_time'][shelves[last]] = times[last]
+        state[f'{metric}_above_since'][shelves[last]] = above_since[last]
+
+    @staticmethod
+    def _alert(limits, shelf, metric, rule, value, limit, at):
+        return {'shelf_id': int(limits.ids[shelf]), 'shelf': limits.codes[shelf],
+                'location': limits.locations[shelf], 'metric': metric, 'rule': rule,
+                'value': round(float(value), 3), 'limit': None if np.isnan(limit) else float(limit),
+                'at': datetime.utcfromtimestamp(float(at))}
+
+    def _publish(self, raised, cleared):
+        """Store raised and cleared alerts with two batched statements, then emit events"""
+        try:
+            with db.engine.begin() as connection:
+                if raised:
+                    connection.execute(insert(ShelfEnvironmentAlert), [
+                        {'shelf_id': a['shelf_id'], 'metric': a['metric'], 'rule': a['rule'], 'value': a['value'],
+                         'limit_value': a['limit'], 'started_at': a['at']} for a in raised
+                    ])
+                if cleared:
+                    table = ShelfEnvironmentAlert.__table__
+                    connection.execute(
+                        update(table).where(table.c.shelf_id == bindparam('b_shelf_id'),
+                                            table.c.metric == bindparam('b_metric'),
+                                            table.c.rule == bindparam('b_rule'),
+                                            table.c.cleared_at.is_(None))
+                        .values(cleared_at=bindparam('b_cleared_at')),
+                        [{'b_shelf_id': a['shelf_id'], 'b_metric': a['metric'], 'b_rule': a['rule'],
+                          'b_cleared_at': a['at']} for a in cleared]
+                    )
+        except Exception as e:
+            logger.error(f"Failed to store {len(raised)} raised and {len(cleared)} cleared shelf alerts: {str(e)}")
+
+        for event_type, alerts in (('shelf.environment_alert', raised), ('shelf.environment_cleared', cleared)):
+            for alert in alerts:
+                emit(event_type, dict(alert, at=alert['at'].isoformat()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'watched_shelves': len(self._limits.codes) if self._limits else 0,
+                'active_alerts': int(np.count_nonzero(self._state['active'])) if self._limits else 0,
+                'samples': self.samples,
+                'raised': self.raised,
+                'cleared': self.cleared,
+                'avg_eval_ms_per_sample': round(self.eval_ms / self.samples, 4) if self.samples else None
+            }
+
+# Global shelf rule engine instance
+shelf_rule_engine = deferred_engines.register(ShelfRuleEngine())
@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert, func
+from database import db
+from models import Product, SmartShelf, StockMovement, shelf_products
+from cache import reference_cache
+from deferred import deferred_engines
+import numpy as np
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_NUMBER = re.compile(r'\d+')
+
+def location_key(location, shelf_id=''):
+    """Sort key placing shelves in walking order from dispatch
+
+    Locations are read as their numbers in order (aisle, bay, level), so
+    'A-2-1' comes before 'A-10-1'; lower means closer to dispatch.
+    """
+    text = location or ''
+    return (tuple(int(n) for n in _NUMBER.findall(text)), _NUMBER.sub('', text), shelf_id)
+
+def _segments(demand_end, capacity_end):
+    """Cut two cumulative lines into (demand index, capacity index, quantity) pieces
+
+    demand_end and capacity_end are cumulative sums in priority and distance
+    order; every piece is a stretch of units that belongs to one item on the
+    first line and one shelf on the second.
+    """
+    total = min(demand_end[-1] if len(demand_end) else 0, capacity_end[-1] if len(capacity_end) else 0)
+    if total <= 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    points = np.union1d(demand_end, capacity_end)
+    points = np.concatenate([[0], points[points < total], [total]])
+    starts, ends = points[:-1], points[1:]
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+    return (np.searchsorted(demand_end, starts, side='right'),
+            np.searchsorted(capacity_end, starts, side='right'),
+            ends - starts)
+
+class SlottingPlan:
+    """Result of a slotting run: the move list and before/after summary
+
+    shelf_ids are the shelves the plan covers; slots on any other shelf are
+    left alone when it is applied.
+    """
+
+    def __init__(self, moves, slots, summary, shelf_ids=()):
+        self.moves = moves
+        self.slots = slots
+        self.summary = summary
+        self.shelf_ids = list(shelf_ids)
+
+    def to_dict(self, limit=None):
+        moves = self.moves if limit is None else self.moves[:limit]
+        return {'summary': self.summary, 'moves': moves}
+
+class SlottingEngine:
+    """Velocity-based assignment of products to smart shelves
+
+    Pick velocity is the number of OUT movements per day over the last
+    velocity_days. Shelves are ordered by location (see location_key) and
+    their capacity, in units, is laid end to end; products are laid on the
+    same line in order of picks per unit of space, so the fastest movers per
+    unit fill the closest shelves. This greedy fill is optimal for a cost of
+    velocity x distance when units can be split across shelves.
+
+    To keep reshuffling down the line is cut into bands of equal capacity.
+    A product already sitting in the band it would get anyway keeps its
+    slots; only products in the wrong band move, into the free space left
+    around the kept ones.
+    """
+
+    def __init__(self, velocity_days=90, bands=10):
+        self.velocity_days = velocity_days
+        self.bands = bands
+
+    def init_app(self, app):
+        self.velocity_days = app.config.get('SLOTTING_VELOCITY_DAYS', self.velocity_days)
+        self.bands = app.config.get('SLOTTING_BANDS', self.bands)
+
+    def _load(self):
+        since = datetime.utcnow() - timedelta(days=self.velocity_days)
+        products = db.session.execute(
+            select(Product.id, Product.sku, Product.quantity_in_stock).where(Product.is_active == True)
+        ).all()
+        picks = dict(db.session.execute(
+            select(StockMovement.product_id, func.count(StockMovement.id))
+            .where(StockMovement.movement_type == 'OUT', StockMovement.created_at >= since)
+            .group_by(StockMovement.product_id)
+        ).all())
+        shelves = db.session.execute(
+            select(SmartShelf.id, SmartShelf.shelf_id, SmartShelf.location, SmartShelf.capacity)
+            .where(SmartShelf.status == 'Active')
+        ).all()
+        slots = db.session.execute(
+            select(shelf_products.c.shelf_id, shelf_products.c.product_id, shelf_products.c.quantity)
+        ).all()
+        return products, picks, shelves, slots
+
+    def plan(self):
+        """Compute the target slotting and the moves that reach it"""
+        started = time.monotonic()
+        products, picks, shelves, slots = self._load()
+        shelves = sorted(shelves, key=lambda s: location_key(s.location, s.shelf_id))
+
+        product_ids = np.array([p.id for p in products], dtype=np.int64)
+        stock = np.array([max(p.quantity_in_stock or 0, 0) for p in products], dtype=np.int64)
+        velocity = np.array([picks.get(p.id, 0) for p in products], dtype=np.float64) / self.velocity_days
+        shelf_ids = np.array([s.id for s in shelves], dtype=np.int64)
+        capacity = np.array([max(s.capacity or 0, 0) for s in shelves], dtype=np.int64)
+        capacity_end = np.cumsum(capacity)
+        total_capacity = int(capacity_end[-1]) if len(capacity_end) else 0
+        # Band of every shelf by where it starts on the capacity line
+        shelf_band = ((capacity_end - capacity) * self.bands // max(total_capacity, 1)).astype(np.int64)
+
+        # Current slots of active products on active shelves
+        product_position = {pid: i for i, pid in enumerate(product_ids.tolist())}
+        shelf_position = {sid: i for i, sid in enumerate(shelf_ids.tolist())}
+        current = [(product_position[s.product_id], shelf_position[s.shelf_id], s.quantity or 0) for s in slots
+                   if s.product_id in product_position and s.shelf_id in shelf_position and (s.quantity or 0) > 0]
+        slot_product = np.array([c[0] for c in current], dtype=np.int64)
+        slot_shelf = np.array([c[1] for c in current], dtype=np.int64)
+        slot_quantity = np.array([c[2] for c in current], dtype=np.int64)
+        shelved = np.bincount(slot_product, weights=slot_quantity, minlength=len(product_ids)).astype(np.int64)
+
+        # Units to place: stock on hand, or what the shelves say if that is more
+        demand = np.maximum(stock, shelved)
+
+        # Priority order: picks per unit of space, then raw velocity
+        priority = velocity / np.maximum(demand, 1)
+        order = np.lexsort((product_ids, -velocity, -priority))
+        order = order[demand[order] > 0]
+        rank = np.full(len(product_ids), -1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+
+        # Band each product would get on an empty floor; -1 is reserve storage
+        demand_start = np.cumsum(demand[order]) - demand[order]
+        target_band = np.full(len(product_ids), -1, dtype=np.int64)
+        fits = demand_start < total_capacity
+        target_band[order[fits]] = shelf_band[np.searchsorted(capacity_end, demand_start[fits], side='right')]
+
+        # Band each product is in now: the one holding most of its units
+        current_band = np.full(len(product_ids), -1, dtype=np.int64)
+        if len(current):
+            by_size = np.lexsort((slot_quantity, slot_product))
+            last = np.r_[slot_product[by_size][1:] != slot_product[by_size][:-1], True]
+            major = by_size[last]
+            current_band[slot_product[major]] = shelf_band[slot_shelf[major]]
+
+        kept = (current_band >= 0) & (current_band == target_band)
+        kept_slot = kept[slot_product]
+        kept_units = np.bincount(slot_product[kept_slot], weights=slot_quantity[kept_slot],
+                                 minlength=len(product_ids)).astype(np.int64)
+        occupied = np.bincount(slot_shelf[kept_slot], weights=slot_quantity[kept_slot],
+                               minlength=len(shelf_ids)).astype(np.int64)
+        free = np.maximum(capacity - occupied, 0)
+
+        # Lay what still needs a slot over the free space, in priority order
+        remaining = np.where(kept, np.maximum(demand - kept_units, 0), demand)
+        to_place = order[(remaining[order] > 0) & (target_band[order] >= 0)]
+        with_space = np.nonzero(free)[0]
+        piece_item, piece_shelf, piece_quantity = _segments(np.cumsum(remaining[to_place]),
+                                                            np.cumsum(free[with_space]))
+        piece_product = to_place[piece_item]
+        piece_shelf = with_space[piece_shelf]
+
+        moves, slots_after = self._moves(products, shelves, velocity, kept, slot_product, slot_shelf,
+                                         slot_quantity, piece_product, piece_shelf, piece_quantity)
+        placed = np.bincount(piece_product, weights=piece_quantity, minlength=len(product_ids))
+
+        before = self._weighted_distance(velocity, slot_product, slot_shelf, slot_quantity, len(shelf_ids))
+        after_product = np.concatenate([slot_product[kept_slot], piece_product])
+        after_shelf = np.concatenate([slot_shelf[kept_slot], piece_shelf])
+        after_quantity = np.concatenate([slot_quantity[kept_slot], piece_quantity])
+        after = self._weighted_distance(velocity, after_product, after_shelf, after_quantity, len(shelf_ids))
+
+        summary = {
+            'products': len(product_ids),
+            'shelves': len(shelf_ids),
+            'velocity_days': self.velocity_days,
+            'capacity': total_capacity,
+            'units_to_place': int(demand.sum()),
+            'products_kept': int(kept.sum()),
+            'products_moved': len(moves),
+            'units_moved': int(sum(sum(s['quantity'] for s in move['to']) for move in moves)),
+            'units_unplaced': int(np.maximum(remaining - placed, 0)[rank >= 0].sum()),
+            'weighted_distance_before': before,
+            'weighted_distance_after': after,
+            'seconds': round(time.monotonic() - started, 3)
+        }
+        logger.info(f"Slotting plan: {summary['products_moved']} products to move, "
+                    f"weighted distance {before} -> {after}")
+        return SlottingPlan(moves, slots_after, summary, shelf_ids.tolist())
+
+    @staticmethod
+    def _weighted_distance(velocity, slot_product, slot_shelf, slot_quantity, shelf_count):
+        """Mean shelf rank per pick, 0 at dispatch and 1 at the far end"""
+        if not len(slot_product) or shelf_count < 2:
+            return None
+        units = np.bincount(slot_product, weights=slot_quantity, minlength=len(velocity))
+        share = slot_quantity / units[slot_product]
+        picks = velocity[slot_product] * share
+        if picks.sum() == 0:
+            return None
+        return round(float((picks * slot_shelf).sum() / picks.sum() / (shelf_count - 1)), 4)
+
+    @staticmethod
+    def _moves(products, shelves, velocity, kept, slot_product, slot_shelf, slot_quantity,
+               piece_product, piece_shelf, piece_quantity):
+        """Per-product move list, with moves back onto the same shelf netted out
+
+        Also returns the full slot list of every product that moves, as
+        {product_id: {shelf_id: quantity}}, for apply().
+        """
+        sources, targets = {}, {}
+        for p, s, q in zip(slot_product.tolist(), slot_shelf.tolist(), slot_quantity.tolist()):
+            if kept[p]:
+                targets.setdefault(p, {})[s] = targets.get(p, {}).get(s, 0) + q
+            else:
+                sources.setdefault(p, {})[s] = q
+        placed = {}
+        for p, s, q in zip(piece_product.tolist(), piece_shelf.tolist(), piece_quantity.tolist()):
+            entry = placed.setdefault(p, {})
+            entry[s] = entry.get(s, 0) + q
+
+        moves, slots_after = [], {}
+        for p in sorted(set(sources) | set(placed), key=lambda p: -velocity[p]):
+            source, destination = dict(sources.get(p, {})), dict(placed.get(p, {}))
+            for s in set(source) & set(destination):
+                common = min(source[s], destination[s])
+                source[s] -= common
+                destination[s] -= common
+            source = {s: q for s, q in source.items() if q > 0}
+            destination = {s: q for s, q in destination.items() if q > 0}
+            if not source and not destination:
+                continue
+            final = dict(targets.get(p, {}))
+            for s, q in placed.get(p, {}).items():
+                final[s] = final.get(s, 0) + q
+            product_id = products[p].id
+            slots_after[product_id] = {shelves[s].id: q for s, q in final.items()}
+            moves.append({
+                'product_id': product_id,
+                'sku': products[p].sku,
+                'picks_per_day': round(float(velocity[p]), 3),
+                'from': [{'shelf_id': shelves[s].shelf_id, 'quantity': q} for s, q in source.items()],
+                'to': [{'shelf_id': shelves[s].shelf_id, 'location': shelves[s].location, 'quantity': q}
+                       for s, q in sorted(destination.items())]
+            })
+        return moves, slots_after
+
+    def apply(self, plan):
+        """Write a plan's slots and point each moved product at its main shelf
+
+        Returns the number of products relocated. Products left without a
+        slot go to reserve storage and lose their location. Slots on shelves
+        outside the plan (not Active when it was made) are kept.
+        """
+        if not plan.slots:
+            return 0
+        product_ids = list(plan.slots)
+        shelves = dict(db.session.execute(select(SmartShelf.id, SmartShelf.location)).all())
+        shelf_codes = dict(db.session.execute(select(SmartShelf.id, SmartShelf.shelf_id)).all())
+        try:
+            for start in range(0, len(product_ids), 500):
+                db.session.execute(delete(shelf_products)
+                                   .where(shelf_products.c.product_id.in_(product_ids[start:start + 500]),
+                                          shelf_products.c.shelf_id.in_(plan.shelf_ids)))
+            rows = [{'shelf_id': shelf_id, 'product_id': product_id, 'quantity': quantity}
+                    for product_id, slots in plan.slots.items() for shelf_id, quantity in slots.items()]
+            if rows:
+                db.session.execute(insert(shelf_products), rows)
+            for product in Product.query.filter(Product.id.in_(product_ids)).all():
+                slots = plan.slots[product.id]
+                main = max(slots, key=slots.get) if slots else None
+                product.location = shelves.get(main)
+                product.shelf_position = shelf_codes.get(main)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Applying slotting plan failed: {str(e)}")
+            return 0
+        # shelf_products is written with Core statements the session does not track
+        reference_cache.bump(shelf_products.name)
+        logger.info(f"Applied slotting plan, relocated {len(product_ids)} products")
+        return len(product_ids)
+
+# Global slotting engine instance
+slotting_engine = deferred_engines.register(SlottingEngine())
@@ -0,0 +1,231 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, func
+from database import db
+from models import MaintenanceLog, StockMovement, Product
+from maintenance import maintenance_planner, OPEN_STATUSES, FAILURE_TYPES
+from deferred import deferred_engines
+import numpy as np
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Parts issued for a maintenance job are OUT movements pointing at its log
+REFERENCE_TYPE = 'MAINTENANCE'
+
+# Ratio key pooling every failure type, used for failures that are only expected
+FAILURE = 'Failure'
+
+class PartsProjection:
+    """Part requirements per product and week
+
+    quantities is a products x weeks array of expected units, weeks the
+    Monday each column starts on.
+    """
+
+    def __init__(self, weeks, product_ids, quantities):
+        self.weeks = weeks
+        self.product_ids = product_ids
+        self.quantities = quantities
+        self._rows = {product_id: i for i, product_id in enumerate(product_ids)}
+
+    def demand(self, product_id):
+        """Weekly requirement of one product, zeros when it is not needed"""
+        row = self._rows.get(product_id)
+        return self.quantities[row] if row is not None else np.zeros(len(self.weeks))
+
+    def totals(self, weeks=None):
+        """product_id -> units needed over the first weeks (all of them by default)"""
+        summed = self.quantities[:, :weeks].sum(axis=1)
+        return {product_id: float(summed[i]) for i, product_id in enumerate(self.product_ids) if summed[i] > 0}
+
+    def to_dict(self):
+        return {
+            'weeks': [week.isoformat() for week in self.weeks],
+            'products': [{'product_id': product_id,
+                          'total': round(float(self.quantities[i].sum()), 2),
+                          'weekly': [round(float(q), 2) for q in self.quantities[i]]}
+                         for i, product_id in enumerate(self.product_ids)]
+        }
+
+class SparePartsPlanner:
+    """Time-phased spare part requirements from planned and predicted maintenance
+
+    Ratios come from history: units of each part issued per completed job,
+    per equipment product and maintenance type (falling back to the type
+    alone when that product has no such jobs yet). Three kinds of events are
+    expanded over the horizon:
+
+    - open maintenance logs, in the week they are scheduled (overdue ones
+      in the first week),
+    - the predicted next service of equipment without an open one,
+    - expected failures, spread evenly as usage hours per week / MTBF and
+      costed at the pooled ratio of all failure types.
+
+    Events are binned into an (equipment product, type) x week matrix and
+    multiplied by the ratio table in one step, so the cost does not depend
+    on how many equipment units produce them.
+    """
+
+    def __init__(self, horizon_weeks=12, history_days=730, cache_ttl=3600):
+        self.horizon_weeks = horizon_weeks
+        self.history_days = history_days
+        self.cache_ttl = cache_ttl
+        self._cached = None
+        self._cached_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.horizon_weeks = app.config.get('SPARE_PARTS_HORIZON_WEEKS', self.horizon_weeks)
+        self.history_days = app.config.get('SPARE_PARTS_HISTORY_DAYS', self.history_days)
+        self.cache_ttl = app.config.get('SPARE_PARTS_CACHE_TTL', self.cache_ttl)
+
+    def issue(self, log_id, product_id, quantity, user_id=None):
+        """Book parts used on a maintenance job as an OUT movement against its log"""
+        if quantity is None or quantity <= 0:
+            raise ValueError('Quantity must be positive')
+        log = db.session.get(MaintenanceLog, log_id)
+        if log is None or log.status == 'Cancelled':
+            raise ValueError(f"Maintenance log {log_id} not found")
+        product = db.session.get(Product, product_id)
+        if product is None:
+            raise ValueError(f"Product {product_id} not found")
+        if product.quantity_in_stock < quantity:
+            raise ValueError(f"Only {product.quantity_in_stock} of {product.name} in stock")
+
+        product.quantity_in_stock -= quantity
+        movement = StockMovement(
+            product_id=product.id,
+            movement_type='OUT',
+            quantity=quantity,
+            reference_type=REFERENCE_TYPE,
+            reference_id=log.id,
+            notes=f"Used on {log.maintenance_type or 'maintenance'} of {log.equipment_id or 'equipment'}",
+            created_by=user_id
+        )
+        db.session.add(movement)
+        db.session.commit()
+        return movement
+
+    def ratios(self):
+        """{(equipment_product_id, maintenance_type): {part_id: units per job}} plus per-type fallbacks under None"""
+        since = datetime.utcnow() - timedelta(days=self.history_days)
+        completed = MaintenanceLog.status == 'Completed'
+        recent = MaintenanceLog.completed_date >= since
+        jobs = db.session.execute(
+            select(MaintenanceLog.product_id, MaintenanceLog.maintenance_type, func.count(MaintenanceLog.id))
+            .where(completed, recent)
+            .group_by(MaintenanceLog.product_id, MaintenanceLog.maintenance_type)
+        ).all()
+        parts = db.session.execute(
+            select(MaintenanceLog.product_id, MaintenanceLog.maintenance_type, StockMovement.product_id,
+                   func.sum(StockMovement.quantity))
+            .join(MaintenanceLog, MaintenanceLog.id == StockMovement.reference_id)
+            .where(StockMovement.reference_type == REFERENCE_TYPE, StockMovement.movement_type == 'OUT',
+                   completed, recent)
+            .group_by(MaintenanceLog.product_id, MaintenanceLog.maintenance_type, StockMovement.product_id)
+        ).all()
+
+        job_counts, part_units = {}, {}
+        for product_id, maintenance_type, count in jobs:
+            for key in self._keys(product_id, maintenance_type):
+                job_counts[key] = job_counts.get(key, 0) + count
+        for product_id, maintenance_type, part_id, units in parts:
+            for key in self._keys(product_id, maintenance_type):
+                per_key = part_units.setdefault(key, {})
+                per_key[part_id] = per_key.get(part_id, 0) + units
+        ratios = {key: {part_id: total / job_counts[key] for part_id, total in units.items()}
+                  for key, units in part_units.items()}
+        return ratios, set(job_counts)
+
+    @staticmethod
+    def _keys(product_id, maintenance_type):
+        """Ratio keys a job counts towards: its own, the type-wide fallback and the failure pools"""
+        types = [maintenance_type, FAILURE] if maintenance_type in FAILURE_TYPES else [maintenance_type]
+        return [(owner, name) for name in types for owner in (product_id, None)]
+
+    def _events(self, first_week, today):
+        """Expected jobs as (keys, week offsets, counts), keys being (equipment product, type)"""
+        weeks = self.horizon_weeks
+        horizon_end = first_week + timedelta(weeks=weeks)
+        keys, week_index, counts = [], [], []
+
+        scheduled = db.session.execute(
+            select(MaintenanceLog.product_id, MaintenanceLog.maintenance_type, MaintenanceLog.scheduled_date)
+            .where(MaintenanceLog.status.in_(OPEN_STATUSES), MaintenanceLog.scheduled_date.isnot(None),
+                   MaintenanceLog.scheduled_date < datetime.combine(horizon_end, datetime.min.time()))
+        ).all()
+        for product_id, maintenance_type, scheduled_date in scheduled:
+            keys.append((product_id, maintenance_type))
+            week_index.append(max((scheduled_date.date() - first_week).days // 7, 0))
+            counts.append(1.0)
+
+        forecast = maintenance_planner.forecast(today)
+        for unit in forecast:
+            if unit['product_id'] is None:
+                continue
+            next_service = date.fromisoformat(unit['next_service'])
+            if not unit['service_open'] and next_service < horizon_end:
+                keys.append((unit['product_id'], 'Preventive'))
+                week_index.append(max((next_service - first_week).days // 7, 0))
+                counts.append(1.0)
+
+        # Failures expected from MTBF and usage rate, the same every week
+        for unit in forecast:
+            if unit['product_id'] is None or not unit['mtbf_hours'] or not unit['hours_per_day']:
+                continue
+            keys.extend([(unit['product_id'], FAILURE)] * weeks)
+            week_index.extend(range(weeks))
+            counts.extend([unit['hours_per_day'] * 7 / unit['mtbf_hours']] * weeks)
+        return keys, np.array(week_index, dtype=np.int64), np.array(counts)
+
+    def project(self, today=None):
+        """Expand the horizon's maintenance into a PartsProjection"""
+        today = today or date.today()
+        first_week = today - timedelta(days=today.weekday())
+        weeks = [first_week + timedelta(weeks=i) for i in range(self.horizon_weeks)]
+        ratios, known = self.ratios()
+        keys, week_index, counts = self._events(first_week, today)
+        if not keys or not ratios:
+            return PartsProjection(weeks, [], np.zeros((0, len(weeks))))
+
+        # Jobs per (equipment product, type) and week
+        key_list = list(dict.fromkeys(keys))
+        key_position = {key: i for i, key in enumerate(key_list)}
+        event_key = np.array([key_position[key] for key in keys], dtype=np.int64)
+        jobs = np.zeros((len(key_list), len(weeks)))
+        np.add.at(jobs, (event_key, week_index), counts)
+
+        # Ratio table as (key, part, units per job) triples
+        ratio_key, ratio_part, ratio_units = [], [], []
+        for i, (product_id, maintenance_type) in enumerate(key_list):
+            source = (product_id, maintenance_type) if (product_id, maintenance_type) in known else (None, maintenance_type)
+            for part_id, units in ratios.get(source, {}).items():
+                ratio_key.append(i)
+                ratio_part.append(part_id)
+                ratio_units.append(units)
+        if not ratio_part:
+            return PartsProjection(weeks, [], np.zeros((0, len(weeks))))
+
+        part_ids, part_index = np.unique(np.array(ratio_part, dtype=np.int64), return_inverse=True)
+        quantities = np.zeros((len(part_ids), len(weeks)))
+        np.add.at(quantities, part_index, np.array(ratio_units)[:, None] * jobs[np.array(ratio_key)])
+        logger.info(f"Projected {len(part_ids)} spare parts over {len(weeks)} weeks from {len(keys)} maintenance events")
+        return PartsProjection(weeks, part_ids.tolist(), quantities)
+
+    def cached_projection(self):
+        """project() reused for cache_ttl seconds; an empty projection if it fails"""
+        if self._cached is None or time.monotonic() - self._cached_at > self.cache_ttl:
+            with self._lock:
+                try:
+                    self._cached = self.project()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Spare parts projection failed: {str(e)}")
+                    self._cached = PartsProjection([], [], np.zeros((0, 0)))
+                self._cached_at = time.monotonic()
+        return self._cached
+
+# Global spare parts planner instance
+spare_parts_planner = deferred_engines.register(SparePartsPlanner())
@@ -0,0 +1,201 @@
+from collections import deque
+from events import subscribe
+from notifications import notification_center, CATEGORY_PERMISSIONS
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Domain event prefixes pushed to browsers
+STREAMED_PREFIXES = ('stock.', 'order.', 'sale.', 'work_order.', 'shelf.')
+
+def format_event(event_id, event_type, data):
+    """Serialize one Server-Sent Event frame"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Subscription:
+    """One connected browser: a bounded queue and the filters that apply to it"""
+
+    def __init__(self, user_id, permissions, max_queue):
+        self.user_id = user_id
+        self.permissions = permissions
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.overflowed = False
+        self.condition = threading.Condition()
+        self.connected_at = time.monotonic()
+        self.start_sequence = 0
+
+    def accepts(self, permission, user_ids):
+        if user_ids is not None and self.user_id not in user_ids:
+            return False
+        return permission is None or permission in self.permissions
+
+    def push(self, sequence, frame):
+        """Queue a frame; a subscriber that falls max_queue frames behind is cut off"""
+        with self.condition:
+            if self.overflowed:
+                return
+            if len(self.queue) >= self.max_queue:
+                # Slow client: drop it rather than buffer without bound. It
+                # reconnects with Last-Event-ID and catches up from the replay buffer.
+                self.overflowed = True
+                self.queue.clear()
+            else:
+                self.queue.append((sequence, frame))
+            self.condition.notify()
+
+    def wait(self, timeout):
+        """(sequence, frame) pairs queued so far, waiting up to timeout for the first one"""
+        with self.condition:
+            if not self.queue and not self.overflowed:
+                self.condition.wait(timeout)
+            frames = list(self.queue)
+            self.queue.clear()
+            return frames
+
+class EventHub:
+    """In-process pub/sub for Server-Sent Events
+
+    Every published event gets an id and is kept in a ring buffer, so a
+    browser that reconnects with Last-Event-ID receives what it missed. Ids
+    are prefixed with a per-process token; a reconnect that lands on another
+    worker, or asks for an id that has left the buffer, gets a 'reset'
+    event telling the page to reload its data instead.
+    """
+
+    def __init__(self, buffer_size=1000, max_queue=256, heartbeat=15, max_age=600, max_connections=5000):
+        self.buffer_size = buffer_size
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self.max_connections = max_connections
+        self.token = f"{os.getpid():x}{int(time.time()):x}"
+        self._sequence = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.published = 0
+        self.overflows = 0
+
+    def init_app(self, app):
+        self.buffer_size = app.config.get('SSE_BUFFER_SIZE', self.buffer_size)
+        self.max_queue = app.config.get('SSE_MAX_QUEUE', self.max_queue)
+        self.heartbeat = app.config.get('SSE_HEARTBEAT', self.heartbeat)
+        self.max_age = app.config.get('SSE_MAX_AGE', self.max_age)
+        self.max_connections = app.config.get('SSE_MAX_CONNECTIONS', self.max_connections)
+        self._buffer = deque(self._buffer, maxlen=self.buffer_size)
+        if not self._subscribed:
+            subscribe('*', self.handle_event)
+            notification_center.add_listener(self.handle_notification)
+            self._subscribed = True
+
+    def handle_event(self, domain_event):
+        """Event handler: broadcast streamed domain events to permitted users"""
+        if domain_event.type.startswith(STREAMED_PREFIXES):
+            category = domain_event.type.split('.', 1)[0]
+            self.publish(domain_event.type, domain_event.payload, permission=CATEGORY_PERMISSIONS.get(category))
+
+    def handle_notification(self, user_ids, notification):
+        """Push a stored notification to its recipients only"""
+        self.publish('notification', notification, user_ids=user_ids)
+
+    def publish(self, event_type, data, permission=None, user_ids=None):
+        """Send an event to every subscriber allowed to see it"""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            event_id = f"{self.token}-{sequence}"
+            frame = format_event(event_id, event_type, data)
+            users = frozenset(user_ids) if user_ids is not None else None
+            self._buffer.append((sequence, frame, permission, users))
+            subscribers = [s for s in self._subscribers if s.accepts(permission, users)]
+            self.published += 1
+        for subscription in subscribers:
+            subscription.push(sequence, frame)
+        return event_id
+
+    def subscribe(self, user_id, permissions):
+        """Register a connection, or return None when at max_connections"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_connections:
+                return None
+            subscription = Subscription(user_id, permissions, self.max_queue)
+            # Everything published after this point reaches the subscription's queue
+            subscription.start_sequence = self._sequence
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        """Drop a connection; safe to call more than once"""
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.discard(subscription)
+            if subscription.overflowed:
+                self.overflows += 1
+
+    def replay(self, subscription, last_event_id):
+        """(sequence, frame) pairs after last_event_id, or None when they can no longer be replayed"""
+        token, _, sequence = (last_event_id or '').rpartition('-')
+        if token != self.token or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self._lock:
+            if sequence > self._sequence:
+                return None
+            if sequence < self._sequence and (not self._buffer or self._buffer[0][0] > sequence + 1):
+                return None
+            return [(seq, frame) for seq, frame, permission, users in self._buffer
+                    if seq > sequence and subscription.accepts(permission, users)]
+
+    def stream(self, subscription, last_event_id=None):
+        """Generator of SSE frames for one connection
+
+        Ends after max_age so long-lived connections are recycled; the
+        browser reconnects on its own and resumes from its last id.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            # Frames replayed here may also be queued; anything at or below
+            # sent_upto has been sent and is skipped
+            sent_upto = subscription.start_sequence
+            if last_event_id:
+                replayed = self.replay(subscription, last_event_id)
+                if replayed is None:
+                    yield format_event(f"{self.token}-{sent_upto}", 'reset', {})
+                else:
+                    for sequence, frame in replayed:
+                        sent_upto = max(sent_upto, sequence)
+                        yield frame
+            else:
+                yield format_event(f"{self.token}-{sent_upto}", 'hello', {})
+
+            while time.monotonic() - subscription.connected_at < self.max_age:
+                queued = subscription.wait(self.heartbeat)
+                if subscription.overflowed:
+                    break
+                frames = [frame for sequence, frame in queued if sequence > sent_upto]
+                if frames:
+                    yield ''.join(frames)
+                elif not queued:
+                    yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'connections': len(self._subscribers),
+                'published': self.published,
+                'overflows': self.overflows,
+                'buffered': len(self._buffer),
+                'last_id': f"{self.token}-{self._sequence}"
+            }
+
+# Global event hub instance
+event_hub = EventHub()
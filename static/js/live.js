@@ -0,0 +1,51 @@
+// Live updates pushed by the server over Server-Sent Events.
+// Every event is re-dispatched on the document as an 'ims:live' CustomEvent
+// with {type, data} so pages can react to what they display.
+(function() {
+    const script = document.currentScript;
+    if (!script || !window.EventSource) {
+        return;
+    }
+
+    const LIVE_EVENTS = [
+        'stock.movement', 'stock.low', 'stock.recovered',
+        'order.created', 'order.status_changed',
+        'sale.created', 'sale.deleted',
+        'work_order.status_changed',
+        'notification', 'reset'
+    ];
+
+    // EventSource reconnects by itself and sends Last-Event-ID, so missed
+    // events are replayed by the server
+    const source = new EventSource(script.dataset.streamUrl);
+
+    LIVE_EVENTS.forEach(type => {
+        source.addEventListener(type, function(e) {
+            const data = e.data ? JSON.parse(e.data) : {};
+            document.dispatchEvent(new CustomEvent('ims:live', {detail: {type: type, data: data}}));
+        });
+    });
+
+    // Navbar badge
+    document.addEventListener('ims:live', function(e) {
+        if (e.detail.type !== 'notification') {
+            return;
+        }
+        let badge = document.querySelector('.notification-badge');
+        if (!badge) {
+            const bell = document.querySelector('.header-right .bi-bell');
+            if (!bell) {
+                return;
+            }
+            badge = document.createElement('span');
+            badge.className = 'notification-badge';
+            badge.textContent = '0';
+            bell.after(badge);
+        }
+        const count = (parseInt(badge.textContent, 10) || 0) + 1;
+        badge.textContent = count > 99 ? '99+' : count;
+        badge.style.display = '';
+    });
+
+    window.addEventListener('beforeunload', () => source.close());
+})();
@@ -1,66 +1,399 @@
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from email_service import email_service
+from alerts import stock_alert_engine
+from outbox import change_stream
+import os
+import socket
 import threading
 import time
-import schedule
-from email_service import email_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+class CronTrigger:
+    """Cron-like trigger: 'minute hour day-of-month month day-of-week'
+
+    Each field accepts '*', numbers, ranges 'a-b', steps '*/n' or 'a-b/n' and
+    comma separated lists. Day of week runs 0-6 with 0 (or 7) meaning Sunday.
+    """
+
+    FIELDS = [('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7)]
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse(part, low, high, name) for part, (name, low, high) in zip(parts, self.FIELDS)
+        ]
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high, name):
+        values = set()
+        for item in field.split(','):
+            step = 1
+            if '/' in item:
+                item, step = item.split('/')
+                step = int(step)
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(v) for v in item.split('-'))
+            else:
+                start = end = int(item)
+            values.update(range(start, end + 1, step))
+        if not values or min(values) < low or max(values) > high:
+            raise ValueError(f"Invalid {name} field '{field}'")
+        if name == 'weekday':
+            values = {v % 7 for v in values}
+        return values
+
+    def _day_matches(self, dt):
+        weekday = (dt.weekday() + 1) % 7  # Python Monday=0 -> cron Sunday=0
+        day_ok = dt.day in self.days
+        weekday_ok = weekday in self.weekdays
+        # Standard cron: if both fields are restricted either may match
+        if not self.any_day and not self.any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def matches(self, dt):
+        return (dt.minute in self.minutes and dt.hour in self.hours and
+                dt.month in self.months and self._day_matches(dt))
+
+    def next_fire_time(self, after):
+        """First matching minute strictly after the given datetime"""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+class Job:
+    """A registered scheduled job and its run metrics
+
+    The timeout is a soft limit: a running thread cannot be interrupted, so
+    a job past its timeout is reported and its run counted as failed. Its
+    lease expires timeout + lease margin after the fire, after which another
+    node may take the next fire time.
+    """
+
+    def __init__(self, name, func, trigger, timeout):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.timeout = timeout
+        self.next_run = None
+        self.running_since = None
+        self.timed_out = False
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.last_started = None
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.last_error = None
+
+    def metrics(self):
+        return {
+            'cron': self.trigger.expression,
+            'timeout': self.timeout,
+            'next_run': self.next_run.isoformat() if self.next_run else None,
+            'running': self.running_since is not None,
+            'runs': self.runs,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'skipped': self.skipped,
+            'last_started': self.last_started.isoformat() if self.last_started else None,
+            'last_duration': self.last_duration,
+            'avg_duration': round(self.total_duration / self.runs, 3) if self.runs else None,
+            'last_error': self.last_error
+        }
+
 class TaskScheduler:
-    """Background task scheduler for automated processes"""
-    
+    """Background task scheduler for automated processes
+
+    Jobs are registered with cron-like triggers and run on a bounded thread
+    pool, each inside its own application context. Every node may run the
+    scheduler; a lease row per job in the database makes sure each fire time
+    is executed by exactly one node. Cron expressions are evaluated in UTC,
+    the clock the leases use, so every node agrees on the fire times.
+    """
+
     def __init__(self):
+        self.app = None
+        self.jobs = {}
         self.running = False
         self.thread = None
-    
+        self.executor = None
+        self.max_workers = 4
+        self.lease_margin = 60
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Bind the scheduler to an app and start it if enabled"""
+        self.app = app
+        self.max_workers = app.config.get('SCHEDULER_MAX_WORKERS', self.max_workers)
+        self.lease_margin = app.config.get('SCHEDULER_LEASE_MARGIN', self.lease_margin)
+        if app.config.get('SCHEDULER_ENABLED'):
+            self.start()
+
+    def register(self, name, cron, timeout=300):
+        """Register a function as a scheduled job (usable as a decorator)"""
+        def decorator(func):
+            self.jobs[name] = Job(name, func, CronTrigger(cron), timeout)
+            return func
+        return decorator
+
     def start(self):
         """Start the task scheduler"""
         if not self.running:
             self.running = True
-            
-            # Schedule tasks
-            schedule.every().day.at("09:00").do(self.check_low_stock)
-            schedule.every().monday.at("08:00").do(self.send_weekly_summary)
-            
+            # Recompute the process id, the scheduler may start after a fork
+            self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scheduler-job')
+
+            now = datetime.utcnow()
+            for job in self.jobs.values():
+                job.next_run = job.trigger.next_fire_time(now)
+
             # Start scheduler thread
-            self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
+            self.thread = threading.Thread(target=self._run_scheduler, name='task-scheduler', daemon=True)
             self.thread.start()
-            logger.info("Task scheduler started")
-    
+            logger.info(f"Task scheduler started on {self.node_id} with {len(self.jobs)} jobs")
+
     def stop(self):
         """Stop the task scheduler"""
         self.running = False
+        self._wakeup.set()
         if self.thread:
             self.thread.join()
+        if self.executor:
+            self.executor.shutdown(wait=False)
         logger.info("Task scheduler stopped")
-    
+
+    def run_now(self, name):
+        """Run a job immediately on this node, bypassing its trigger and the lease"""
+        job = self.jobs[name]
+        return self.executor.submit(self._execute, job, None) if self.executor else self._execute(job, None)
+
+    def metrics(self):
+        """Per-job run metrics"""
+        with self._lock:
+            return {name: job.metrics() for name, job in self.jobs.items()}
+
     def _run_scheduler(self):
         """Run the scheduler loop"""
         while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-    
-    def check_low_stock(self):
-        """Check for low stock and send alerts"""
+            now = datetime.utcnow()
+            self._check_timeouts(now)
+
+            for job in self.jobs.values():
+                if job.next_run and job.next_run <= now:
+                    fire_time = job.next_run
+                    job.next_run = job.trigger.next_fire_time(now)
+                    with self._lock:
+                        if job.running_since is not None:
+                            # Previous run has not finished yet, don't pile up
+                            job.skipped += 1
+                            logger.warning(f"Job {job.name} still running, skipping run at {fire_time}")
+                            continue
+                        job.running_since = time.monotonic()
+                    self.executor.submit(self._execute, job, fire_time)
+
+            # Sleep until the next fire time, but wake regularly to check timeouts
+            next_runs = [job.next_run for job in self.jobs.values() if job.next_run]
+            delay = (min(next_runs) - datetime.utcnow()).total_seconds() if next_runs else 60.0
+            cap = 5.0 if self._any_running() else 60.0
+            self._wakeup.wait(max(1.0, min(delay, cap)))
+            self._wakeup.clear()
+
+    def _any_running(self):
+        return any(job.running_since is not None for job in self.jobs.values())
+
+    def _check_timeouts(self, now):
+        """Record jobs that have run past their timeout"""
+        with self._lock:
+            for job in self.jobs.values():
+                if (job.running_since is not None and not job.timed_out and
+                        time.monotonic() - job.running_since > job.timeout):
+                    job.timed_out = True
+                    job.timeouts += 1
+                    logger.error(f"Job {job.name} exceeded its timeout of {job.timeout}s")
+
+    def _execute(self, job, fire_time):
+        """Run one job inside an app context, guarded by its lease"""
+        with self._lock:
+            if job.running_since is None:
+                job.running_since = time.monotonic()
+        started = time.monotonic()
         try:
-            logger.info("Running low stock check...")
-            success = email_service.send_low_stock_alert()
-            if success:
-                logger.info("Low stock alert sent successfully")
-            else:
-                logger.warning("Failed to send low stock alert")
-        except Exception as e:
-            logger.error(f"Error in low stock check: {str(e)}")
-    
-    def send_weekly_summary(self):
-        """Send weekly business summary"""
+            with self.app.app_context():
+                if fire_time is not None and not self._acquire_lease(job, fire_time):
+                    with self._lock:
+                        job.skipped += 1
+                    logger.debug(f"Job {job.name} at {fire_time} is owned by another node")
+                    return
+
+                logger.info(f"Running job {job.name}")
+                job.last_started = datetime.utcnow()
+                try:
+                    job.func()
+                    failed = None
+                except Exception as e:
+                    failed = str(e)
+                    logger.error(f"Error in job {job.name}: {failed}")
+                if failed is None and job.timed_out:
+                    failed = f"Exceeded its timeout of {job.timeout}s"
+
+                duration = time.monotonic() - started
+                with self._lock:
+                    job.runs += 1
+                    job.last_duration = round(duration, 3)
+                    job.total_duration += duration
+                    if failed:
+                        job.failures += 1
+                        job.last_error = failed
+        finally:
+            with self._lock:
+                job.running_since = None
+                job.timed_out = False
+
+    def _acquire_lease(self, job, fire_time):
+        """Claim this fire time of the job for this node
+
+        A fire time can be claimed only once, and only when the previous
+        holder's lease has expired or belongs to this node.
+        """
+        from database import db
+        from models import SchedulerLease
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=job.timeout + self.lease_margin)
         try:
-            logger.info("Generating weekly summary...")
-            # This could generate and send a weekly report
-            # Implementation would depend on specific requirements
-        except Exception as e:
-            logger.error(f"Error in weekly summary: {str(e)}")
+            result = db.session.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.job_name == job.name,
+                    or_(SchedulerLease.last_fire_time.is_(None), SchedulerLease.last_fire_time < fire_time),
+                    or_(SchedulerLease.expires_at < now, SchedulerLease.owner == self.node_id)
+                )
+                .values(owner=self.node_id, last_fire_time=fire_time, acquired_at=now, expires_at=expires_at)
+            )
+            if result.rowcount == 1:
+                db.session.commit()
+                return True
+
+            # No row yet for this job: the first node to insert it wins
+            if db.session.get(SchedulerLease, job.name) is None:
+                db.session.add(SchedulerLease(job_name=job.name, owner=self.node_id, last_fire_time=fire_time,
+                                              acquired_at=now, expires_at=expires_at))
+                db.session.commit()
+                return True
+
+            db.session.rollback()
+            return False
+        except IntegrityError:
+            db.session.rollback()
+            return False
 
 # Global task scheduler instance
-task_scheduler = TaskScheduler()
\ No newline at end of file
+task_scheduler = TaskScheduler()
+
+@task_scheduler.register('check_low_stock', '0 9 * * *', timeout=300)
+def check_low_stock():
+    """Check for low stock and send alerts"""
+    logger.info("Running low stock check...")
+    success = email_service.send_low_stock_alert()
+    if success:
+        logger.info("Low stock alert sent successfully")
+    else:
+        logger.warning("Failed to send low stock alert")
+
+@task_scheduler.register('send_weekly_summary', '0 8 * * 1', timeout=600)
+def send_weekly_summary():
+    """Send weekly business summary"""
+    logger.info("Generating weekly summary...")
+    # This could generate and send a weekly report
+    # Implementation would depend on specific requirements
+
+@task_scheduler.register('reconcile_stock_alerts', '30 2 * * *', timeout=1800)
+def reconcile_stock_alerts():
+    """Nightly safety net for stock changes made outside the ORM"""
+    logger.info("Reconciling stock alerts...")
+    stock_alert_engine.rebuild()
+
+@task_scheduler.register('purge_email_outbox', '15 3 * * *', timeout=600)
+def purge_email_outbox():
+    """Remove delivered emails older than 30 days from the outbox"""
+    purged = email_service.purge_sent(days=30)
+    logger.info(f"Purged {purged} sent emails from the outbox")
+
+@task_scheduler.register('trim_change_stream', '45 3 * * *', timeout=1800)
+def trim_change_stream():
+    """Drop change stream entries past the retention period"""
+    trimmed = change_stream.trim()
+    logger.info(f"Trimmed {trimmed} change stream entries")
+
+@task_scheduler.register('trim_shelf_history', '0 4 * * *', timeout=1800)
+def trim_shelf_history():
+    """Delete sensor history chunks past their retention"""
+    from timeseries import shelf_history
+    removed = shelf_history.apply_retention()
+    logger.info(f"Removed {removed} shelf history chunks")
+
+@task_scheduler.register('estimate_shelf_stock', '20 * * * *', timeout=600)
+def estimate_shelf_stock():
+    """Compare shelf weight estimates with the books, reconciling if enabled"""
+    from shelf_estimation import shelf_stock_estimator
+    if shelf_stock_estimator.auto_reconcile:
+        adjusted = shelf_stock_estimator.reconcile()
+        logger.info(f"Adjusted {adjusted} products to their shelf weight estimate")
+    else:
+        disagreeing = shelf_stock_estimator.discrepancies()
+        if disagreeing:
+            logger.warning(f"{len(disagreeing)} products disagree with their shelf weight estimate")
+
+@task_scheduler.register('rollup_equipment_usage', '*/15 * * * *', timeout=900)
+def rollup_equipment_usage():
+    """Add new usage history to the rollups and rescore efficiency anomalies"""
+    from utilization import usage_rollups
+    usage_rollups.refresh()
+
+@task_scheduler.register('schedule_maintenance', '30 1 * * *', timeout=1800)
+def schedule_maintenance():
+    """Book preventive maintenance for equipment predicted to need service soon"""
+    from maintenance import maintenance_planner
+    scheduled = maintenance_planner.schedule()
+    logger.info(f"Scheduled {scheduled} preventive maintenance jobs")
+
+@task_scheduler.register('run_mrp', '0 2 * * *', timeout=3600)
+def run_mrp():
+    """Regenerate planned purchase and work orders from current demand and stock"""
+    from mrp import mrp_engine
+    mrp_engine.run()
+
+@task_scheduler.register('update_replenishment_policies', '0 5 * * 1', timeout=1800)
+def update_replenishment_policies():
+    """Recompute safety stock and reorder points, writing them back if enabled"""
+    from replenishment import replenishment_policies
+    if replenishment_policies.auto_apply:
+        replenishment_policies.apply()
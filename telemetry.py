@@ -0,0 +1,225 @@
+from datetime import datetime
+from sqlalchemy import select, update, bindparam, func
+from database import db
+from models import SmartShelf
+from cache import reference_cache
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reading field -> SmartShelf column and the precision it is stored with
+METRICS = {
+    'weight': ('current_weight', 3),
+    'temperature': ('temperature', 2),
+    'humidity': ('humidity', 2)
+}
+
+def parse_timestamp(value):
+    """Reading timestamp from epoch seconds or ISO 8601, defaulting to now (UTC)"""
+    if value is None:
+        return datetime.utcnow()
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.utcfromtimestamp(value)
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = datetime.utcfromtimestamp(parsed.timestamp())
+        return parsed
+    except (OverflowError, OSError) as e:
+        raise ValueError(f"Timestamp out of range: {value}") from e
+
+def parse_value(value):
+    """Sensor value as a finite float; NaN and infinity are rejected"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Reading is not a finite number: {value}")
+    return number
+
+class TelemetryBuffer:
+    """Coalescing write buffer for smart shelf sensor readings
+
+    Readings are merged in memory to the newest value of each metric per
+    shelf, and a background thread writes the result every flush_interval
+    seconds as a single executemany UPDATE. However often a shelf reports,
+    its row is written at most once per flush.
+    """
+
+    def __init__(self, flush_interval=2, max_batch=5000, shelf_cache_ttl=60):
+        self.app = None
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.shelf_cache_ttl = shelf_cache_ttl
+        self.running = False
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._shelves = None
+        self._shelves_version = None
+        self._shelves_loaded_at = 0.0
+        self.received = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.last_flush_ms = None
+
+    def init_app(self, app):
+        """Bind the buffer to an app and start the flush thread if enabled"""
+        self.app = app
+        self.flush_interval = app.config.get('TELEMETRY_FLUSH_INTERVAL', self.flush_interval)
+        self.max_batch = app.config.get('TELEMETRY_MAX_BATCH', self.max_batch)
+        if app.config.get('TELEMETRY_ENABLED'):
+            self.start()
+
+    def start(self):
+        """Start the background flush thread"""
+        if not self.running:
+            self.running = True
+            self._thread = threading.Thread(target=self._run_flusher, name='telemetry-flusher', daemon=True)
+            self._thread.start()
+            logger.info(f"Telemetry flusher started, flushing every {self.flush_interval}s")
+
+    def stop(self):
+        """Stop the flush thread after writing what is still buffered"""
+        self.running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        logger.info("Telemetry flusher stopped")
+
+    def add_listener(self, listener):
+        """Call listener(readings) with every accepted batch, before coalescing
+
+        readings is a list of (shelf_id, timestamp, {metric: value}).
+        """
+        self._listeners.append(listener)
+
+    def known_shelves(self):
+        """shelf_id -> id of every smart shelf, reloaded when the table changes"""
+        version = reference_cache.version(SmartShelf.__tablename__)
+        if (self._shelves is None or self._shelves_version != version or
+                time.monotonic() - self._shelves_loaded_at > self.shelf_cache_ttl):
+            with db.engine.connect() as connection:
+                self._shelves = dict(connection.execute(select(SmartShelf.shelf_id, SmartShelf.id)).all())
+            self._shelves_version = version
+            self._shelves_loaded_at = time.monotonic()
+        return self._shelves
+
+    def ingest(self, readings):
+        """Buffer a batch of readings
+
+        Each reading is a dict with shelf_id, an optional timestamp and any
+        of weight, temperature and humidity. Returns (accepted, rejected,
+        unknown_shelf_ids).
+        """
+        shelves = self.known_shelves()
+        parsed = []
+        rejected = 0
+        unknown = set()
+        for reading in readings:
+            try:
+                shelf_id = str(reading['shelf_id'])
+                values = {name: parse_value(reading[name]) for name in METRICS if reading.get(name) is not None}
+                timestamp = parse_timestamp(reading.get('timestamp'))
+            except (KeyError, TypeError, ValueError):
+                rejected += 1
+                continue
+            if shelf_id not in shelves:
+                unknown.add(shelf_id)
+                rejected += 1
+                continue
+            if values:
+                parsed.append((shelf_id, timestamp, values))
+
+        with self._lock:
+            for shelf_id, timestamp, values in parsed:
+                self._merge(shelf_id, timestamp, values)
+            self.received += len(parsed)
+            self.rejected += rejected
+
+        for listener in self._listeners:
+            try:
+                listener(parsed)
+            except Exception as e:
+                logger.error(f"Telemetry listener failed: {str(e)}")
+        return len(parsed), rejected, sorted(unknown)
+
+    def _merge(self, shelf_id, timestamp, values):
+        """Keep the newest value of each metric (caller holds the lock)"""
+        entry = self._pending.setdefault(shelf_id, {})
+        for name, value in values.items():
+            current = entry.get(name)
+            if current is None or current[0] <= timestamp:
+                entry[name] = (timestamp, value)
+
+    def flush(self):
+        """Write the buffered latest values, returns the number of shelves updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        started = time.monotonic()
+        rows = []
+        for shelf_id, entry in pending.items():
+            row = {'b_shelf_id': shelf_id, 'b_last_updated': max(timestamp for timestamp, value in entry.values())}
+            for name, (column, digits) in METRICS.items():
+                row[f'b_{name}'] = round(entry[name][1], digits) if name in entry else None
+            rows.append(row)
+
+        table = SmartShelf.__table__
+        # Metrics missing from a shelf's readings keep their stored value
+        statement = update(table).where(table.c.shelf_id == bindparam('b_shelf_id')).values(
+            last_updated=func.coalesce(bindparam('b_last_updated'), table.c.last_updated),
+            **{column: func.coalesce(bindparam(f'b_{name}'), table.c[column]) for name, (column, digits) in METRICS.items()}
+        )
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(statement, rows)
+        except Exception as e:
+            logger.error(f"Telemetry flush of {len(rows)} shelves failed: {str(e)}")
+            with self._lock:
+                self.failures += 1
+                # Put the values back unless newer readings arrived meanwhile
+                for shelf_id, entry in pending.items():
+                    for name, (timestamp, value) in entry.items():
+                        self._merge(shelf_id, timestamp, {name: value})
+            return 0
+
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.last_flush_ms = round((time.monotonic() - started) * 1000, 1)
+        return len(rows)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'pending_shelves': len(self._pending),
+                'received': self.received,
+                'rejected': self.rejected,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+                'coalesced': self.received - self.rows_written,
+                'failures': self.failures,
+                'last_flush_ms': self.last_flush_ms
+            }
+
+    def _run_flusher(self):
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            with self.app.app_context():
+                self.flush()
+        with self.app.app_context():
+            self.flush()
+
+# Global telemetry buffer instance
+telemetry_buffer = TelemetryBuffer()
@@ -0,0 +1,289 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from deferred import deferred_engines
+import numpy as np
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+# One aggregate bucket: sample count, sum, min and max
+BUCKET = np.dtype([('count', '<u4'), ('sum', '<f8'), ('min', '<f4'), ('max', '<f4')])
+
+class Resolution:
+    """A rollup level: bucket width, buckets per chunk file and retention"""
+
+    def __init__(self, name, seconds, chunk_buckets, retention_days):
+        self.name = name
+        self.seconds = seconds
+        self.chunk_buckets = chunk_buckets
+        self.retention_days = retention_days
+
+    @property
+    def chunk_seconds(self):
+        return self.seconds * self.chunk_buckets
+
+def to_epoch(dt):
+    return int((dt - EPOCH).total_seconds())
+
+class TimeSeriesStore:
+    """Memory-mapped rollups of shelf sensor readings
+
+    Every sample ends up in its 1-minute, 1-hour and 1-day bucket, so there
+    is no separate rollup pass. Buckets live in fixed-size chunk files (one
+    per resolution, metric, shelf and time span) that are memory-mapped and
+    updated in place; a 1-minute chunk holds one day, a 1-hour chunk 32 days
+    and a 1-day chunk a year. Retention deletes whole chunk files. Queries
+    open only the chunks of the one resolution they read.
+
+    The minute in progress is held in memory until it rolls over, a query
+    or flush() writes it, so a crash loses at most that minute.
+
+    Files are written without cross-process locking, so only one worker
+    should ingest telemetry into a given directory.
+    """
+
+    def __init__(self, path='timeseries', max_open=2048, retention=None):
+        self.path = path
+        self.max_open = max_open
+        days = retention or {}
+        self.resolutions = [
+            Resolution('1m', 60, 1440, days.get('1m', 7)),
+            Resolution('1h', 3600, 768, days.get('1h', 90)),
+            Resolution('1d', 86400, 366, days.get('1d', 1825))
+        ]
+        self._open = OrderedDict()
+        self._lock = threading.RLock()
+        self._index = {}
+        self._keys = []
+        self._minute = None
+        self._count = np.zeros(0, dtype=np.int64)
+        self._sum = np.zeros(0)
+        self._min = np.zeros(0)
+        self._max = np.zeros(0)
+        self.samples = 0
+        self.write_ms = 0.0
+
+    def init_app(self, app):
+        """Configure storage and retention"""
+        self.path = app.config.get('TIMESERIES_PATH', self.path)
+        self.max_open = app.config.get('TIMESERIES_MAX_OPEN', self.max_open)
+        for resolution in self.resolutions:
+            key = f'TIMESERIES_RETENTION_{resolution.name.upper()}_DAYS'
+            resolution.retention_days = app.config.get(key, resolution.retention_days)
+
+    def resolution(self, name):
+        for resolution in self.resolutions:
+            if resolution.name == name:
+                return resolution
+        raise ValueError(f"Unknown resolution '{name}'")
+
+    def record(self, readings):
+        """Add (shelf_id, timestamp, {metric: value}) readings
+
+        Samples of the current minute are accumulated in arrays indexed by
+        series (shelf, metric) with one vectorized update per batch; the
+        chunk files are only written when the minute rolls over, once per
+        series and resolution.
+        """
+        started = time.monotonic()
+        series, minutes, samples = [], [], []
+        for shelf_id, timestamp, values in readings:
+            minute = to_epoch(timestamp) // 60
+            for metric, value in values.items():
+                series.append(self._series_index(shelf_id, metric))
+                minutes.append(minute)
+                samples.append(value)
+        if not samples:
+            return
+
+        series = np.asarray(series, dtype=np.int64)
+        minutes = np.asarray(minutes, dtype=np.int64)
+        samples = np.asarray(samples, dtype=np.float64)
+        with self._lock:
+            for minute in np.unique(minutes):
+                selected = minutes == minute
+                if self._minute is not None and minute < self._minute:
+                    # Late samples go straight to the files
+                    self._write_minute(int(minute), *self._aggregate(series[selected], samples[selected]))
+                    continue
+                if self._minute is not None and minute > self._minute:
+                    self._roll()
+                self._minute = int(minute)
+                self._accumulate(series[selected], samples[selected])
+            self.samples += len(samples)
+            self.write_ms += (time.monotonic() - started) * 1000
+
+    def _series_index(self, shelf_id, metric):
+        key = (shelf_id, metric)
+        index = self._index.get(key)
+        if index is None:
+            with self._lock:
+                index = self._index.setdefault(key, len(self._keys))
+                if index == len(self._keys):
+                    self._keys.append(key)
+                    if index >= len(self._count):
+                        self._grow(max(64, 2 * len(self._count)))
+        return index
+
+    def _grow(self, size):
+        """Enlarge the accumulator arrays (caller holds the lock)"""
+        extra = size - len(self._count)
+        self._count = np.concatenate([self._count, np.zeros(extra, dtype=np.int64)])
+        self._sum = np.concatenate([self._sum, np.zeros(extra)])
+        self._min = np.concatenate([self._min, np.full(extra, np.inf)])
+        self._max = np.concatenate([self._max, np.full(extra, -np.inf)])
+
+    def _accumulate(self, series, samples):
+        np.add.at(self._count, series, 1)
+        np.add.at(self._sum, series, samples)
+        np.minimum.at(self._min, series, samples)
+        np.maximum.at(self._max, series, samples)
+
+    def _aggregate(self, series, samples):
+        """(series, count, sum, min, max) of a set of samples"""
+        unique, inverse = np.unique(series, return_inverse=True)
+        count = np.bincount(inverse, minlength=len(unique))
+        total = np.bincount(inverse, weights=samples, minlength=len(unique))
+        low = np.full(len(unique), np.inf)
+        high = np.full(len(unique), -np.inf)
+        np.minimum.at(low, inverse, samples)
+        np.maximum.at(high, inverse, samples)
+        return unique, count, total, low, high
+
+    def _roll(self):
+        """Write the accumulated minute to the chunk files and reset (caller holds the lock)"""
+        if self._minute is None:
+            return
+        series = np.nonzero(self._count)[0]
+        if len(series):
+            self._write_minute(self._minute, series, self._count[series], self._sum[series],
+                               self._min[series], self._max[series])
+        self._count[:] = 0
+        self._sum[:] = 0
+        self._min[:] = np.inf
+        self._max[:] = -np.inf
+
+    def _write_minute(self, minute, series, count, total, low, high):
+        """Merge one minute's aggregates into the 1m, 1h and 1d buckets"""
+        epoch = minute * 60
+        for i, index in enumerate(series.tolist()):
+            shelf_id, metric = self._keys[index]
+            for resolution in self.resolutions:
+                bucket = epoch // resolution.seconds
+                chunk, offset = divmod(bucket, resolution.chunk_buckets)
+                block = self._block(resolution, shelf_id, metric, chunk, create=True)
+                record = block[offset]
+                record['count'] += count[i]
+                record['sum'] += total[i]
+                record['min'] = min(record['min'], low[i])
+                record['max'] = max(record['max'], high[i])
+
+    def query(self, shelf_id, metric, start, end, resolution=None, max_points=1500):
+        """Aggregated points of one shelf metric between start and end
+
+        Without an explicit resolution the finest one that keeps the answer
+        under max_points and still covers start is used. Empty buckets are
+        left out. Returns (resolution_name, points).
+        """
+        if resolution is None:
+            span = max((end - start).total_seconds(), 1)
+            oldest = datetime.utcnow() - start
+            candidates = [r for r in self.resolutions
+                          if span / r.seconds <= max_points and oldest <= timedelta(days=r.retention_days)]
+            resolution = candidates[0] if candidates else self.resolutions[-1]
+        elif isinstance(resolution, str):
+            resolution = self.resolution(resolution)
+
+        first = to_epoch(start) // resolution.seconds
+        last = to_epoch(end) // resolution.seconds
+        points = []
+        with self._lock:
+            self._roll()
+            for chunk in range(first // resolution.chunk_buckets, last // resolution.chunk_buckets + 1):
+                block = self._block(resolution, shelf_id, metric, chunk, create=False)
+                if block is None:
+                    continue
+                base = chunk * resolution.chunk_buckets
+                low = max(first - base, 0)
+                high = min(last - base + 1, resolution.chunk_buckets)
+                window = np.array(block[low:high])
+                for offset in np.nonzero(window['count'])[0]:
+                    bucket = window[offset]
+                    points.append({
+                        'time': (EPOCH + timedelta(seconds=int(base + low + offset) * resolution.seconds)).isoformat(),
+                        'count': int(bucket['count']),
+                        'mean': round(float(bucket['sum']) / int(bucket['count']), 3),
+                        'min': round(float(bucket['min']), 3),
+                        'max': round(float(bucket['max']), 3)
+                    })
+        return resolution.name, points
+
+    def apply_retention(self, now=None):
+        """Delete chunk files that lie entirely before their resolution's retention"""
+        now = to_epoch(now or datetime.utcnow())
+        removed = 0
+        with self._lock:
+            for resolution in self.resolutions:
+                cutoff = now - resolution.retention_days * 86400
+                root = os.path.join(self.path, resolution.name)
+                for directory, dirs, files in os.walk(root):
+                    for name in files:
+                        chunk = int(name.split('.')[0])
+                        if (chunk + 1) * resolution.chunk_seconds <= cutoff:
+                            path = os.path.join(directory, name)
+                            self._close(path)
+                            os.remove(path)
+                            removed += 1
+        return removed
+
+    def flush(self):
+        """Write the current minute and dirty pages of every open chunk to disk"""
+        with self._lock:
+            self._roll()
+            for block in self._open.values():
+                block.flush()
+
+    def stats(self):
+        with self._lock:
+            return {'open_chunks': len(self._open), 'samples': self.samples,
+                    'avg_write_ms_per_sample': round(self.write_ms / self.samples, 4) if self.samples else None,
+                    'retention_days': {r.name: r.retention_days for r in self.resolutions}}
+
+    def _chunk_path(self, resolution, shelf_id, metric, chunk):
+        return os.path.join(self.path, resolution.name, metric, quote(shelf_id, safe=''), f"{chunk}.bin")
+
+    def _block(self, resolution, shelf_id, metric, chunk, create):
+        """Memory-mapped bucket array of one chunk, kept open in an LRU (caller holds the lock)"""
+        path = self._chunk_path(resolution, shelf_id, metric, chunk)
+        block = self._open.get(path)
+        if block is not None:
+            self._open.move_to_end(path)
+            return block
+        if os.path.exists(path):
+            block = np.memmap(path, dtype=BUCKET, mode='r+', shape=(resolution.chunk_buckets,))
+        elif create:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            block = np.memmap(path, dtype=BUCKET, mode='w+', shape=(resolution.chunk_buckets,))
+            block['min'] = np.inf
+            block['max'] = -np.inf
+        else:
+            return None
+        self._open[path] = block
+        while len(self._open) > self.max_open:
+            # Unmapping keeps dirty pages in the page cache, no msync needed
+            self._open.popitem(last=False)
+        return block
+
+    def _close(self, path):
+        block = self._open.pop(path, None)
+        if block is not None:
+            block.flush()
+
+# Global shelf history store
+shelf_history = deferred_engines.register(TimeSeriesStore())
@@ -0,0 +1,291 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, insert, update, bindparam, delete, or_
+from database import db
+from models import UsageHistory, UsageRollup, UsageRollupGap, SystemSetting
+from deferred import deferred_engines
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = 'usage_rollup_watermark'
+
+PERIODS = ('day', 'week')
+
+def _day_numbers(dates):
+    return np.array([d.toordinal() for d in dates], dtype=np.int64)
+
+def _week_start(days):
+    # date.fromordinal(1) is a Monday
+    return days - (days - 1) % 7
+
+def _trailing(matrix, window):
+    """Per-row sums over the window columns before each column"""
+    cumulative = np.concatenate([np.zeros((len(matrix), 1)), np.cumsum(matrix, axis=1)], axis=1)
+    ends = np.arange(matrix.shape[1])
+    return cumulative[:, ends] - cumulative[:, np.maximum(ends - window, 0)]
+
+class UsageRollups:
+    """Daily and weekly usage totals per equipment and product
+
+    refresh() reads only usage_history rows above a watermark (the highest
+    id already rolled up, kept in system_setting), aggregates them and adds
+    them to the usage_rollup rows they fall in, so the cost follows new rows
+    rather than the size of the history. The rollups and the watermark are
+    written in one transaction.
+
+    Ids are allocated before commit (Postgres sequences), so a row can become
+    visible after a higher id was rolled up. Ids missing within gap_window of
+    a batch's end are kept in usage_rollup_gap and rolled up once they
+    appear; any still missing after gap_timeout seconds are taken as rolled
+    back or deleted.
+
+    Day rows also carry an anomaly flag: the day's mean efficiency_rating is
+    compared with the mean and spread of the previous baseline_days, for
+    every equipment at once. Only days whose baseline can have changed are
+    rescored.
+
+    Edits and deletes of existing usage rows are not picked up; rebuild()
+    recomputes everything from scratch.
+    """
+
+    def __init__(self, batch_size=50000, baseline_days=28, min_baseline=7, threshold=3.0,
+                 min_spread=1.0, hours_per_day=8, gap_window=1000, gap_timeout=3600):
+        self.batch_size = batch_size
+        self.gap_window = gap_window
+        self.gap_timeout = gap_timeout
+        self.baseline_days = baseline_days
+        self.min_baseline = min_baseline
+        self.threshold = threshold
+        self.min_spread = min_spread
+        self.hours_per_day = hours_per_day
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('UTILIZATION_BATCH_SIZE', self.batch_size)
+        self.baseline_days = app.config.get('UTILIZATION_BASELINE_DAYS', self.baseline_days)
+        self.min_baseline = app.config.get('UTILIZATION_MIN_BASELINE_DAYS', self.min_baseline)
+        self.threshold = app.config.get('UTILIZATION_ANOMALY_THRESHOLD', self.threshold)
+        self.hours_per_day = app.config.get('UTILIZATION_HOURS_PER_DAY', self.hours_per_day)
+        self.gap_timeout = app.config.get('UTILIZATION_GAP_TIMEOUT', self.gap_timeout)
+
+    def watermark(self):
+        setting = db.session.get(SystemSetting, WATERMARK_KEY)
+        return int(setting.value) if setting and setting.value else 0
+
+    def _set_watermark(self, position):
+        setting = db.session.get(SystemSetting, WATERMARK_KEY)
+        if setting is None:
+            db.session.add(SystemSetting(key=WATERMARK_KEY, value=str(position)))
+        else:
+            setting.value = str(position)
+
+    def _select(self):
+        return select(UsageHistory.id, UsageHistory.product_id, UsageHistory.equipment_id, UsageHistory.usage_date,
+                      UsageHistory.hours_used, UsageHistory.cycles_completed, UsageHistory.efficiency_rating)
+
+    def _refresh_gaps(self):
+        """Roll up skipped ids that have been committed since, and forget expired ones"""
+        gaps = select(UsageRollupGap.usage_id)
+        rows = db.session.execute(self._select().where(UsageHistory.id.in_(gaps))).all()
+        expired = datetime.utcnow() - timedelta(seconds=self.gap_timeout)
+        try:
+            self._apply([row for row in rows if row.usage_date is not None])
+            db.session.execute(delete(UsageRollupGap.__table__).where(
+                or_(UsageRollupGap.usage_id.in_([row.id for row in rows]), UsageRollupGap.seen_at < expired)
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Rolling up skipped usage rows failed: {str(e)}")
+            return 0
+        return len(rows)
+
+    def _remember_gaps(self, after, rows):
+        """Record ids missing near the end of a batch, their transactions may still be committing"""
+        seen = {row.id for row in rows}
+        last = rows[-1].id
+        missing = [key for key in range(max(after, last - self.gap_window) + 1, last) if key not in seen]
+        if missing:
+            now = datetime.utcnow()
+            db.session.execute(insert(UsageRollupGap.__table__),
+                               [{'usage_id': key, 'seen_at': now} for key in missing])
+
+    def refresh(self, max_batches=None):
+        """Roll up usage rows added since the last run, returns the number processed"""
+        started = time.monotonic()
+        processed = self._refresh_gaps()
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            after = self.watermark()
+            rows = db.session.execute(
+                self._select().where(UsageHistory.id > after).order_by(UsageHistory.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                break
+            try:
+                self._apply([row for row in rows if row.usage_date is not None])
+                self._remember_gaps(after, rows)
+                self._set_watermark(rows[-1].id)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Usage rollup failed after id {self.watermark()}: {str(e)}")
+                break
+            processed += len(rows)
+            batches += 1
+            if len(rows) < self.batch_size:
+                break
+        if processed:
+            logger.info(f"Rolled up {processed} usage rows in {time.monotonic() - started:.2f}s")
+        return processed
+
+    def rebuild(self):
+        """Drop every rollup and roll up the whole usage history again"""
+        db.session.execute(delete(UsageRollup.__table__))
+        self._set_watermark(0)
+        db.session.execute(delete(UsageRollupGap.__table__))
+        db.session.commit()
+        return self.refresh()
+
+    def _apply(self, rows):
+        """Add one batch of usage rows to the day and week rollups and rescore"""
+        if not rows:
+            return
+        days = _day_numbers([row.usage_date.date() for row in rows])
+        equipment, equipment_index = np.unique(np.array([row.equipment_id or '' for row in rows], dtype=object),
+                                               return_inverse=True)
+        products = np.array([row.product_id for row in rows], dtype=np.int64)
+        hours = np.array([float(row.hours_used or 0) for row in rows])
+        cycles = np.array([row.cycles_completed or 0 for row in rows], dtype=np.int64)
+        efficiency = np.array([np.nan if row.efficiency_rating is None else float(row.efficiency_rating)
+                               for row in rows])
+        rated = ~np.isnan(efficiency)
+
+        for period in PERIODS:
+            starts = days if period == 'day' else _week_start(days)
+            keys, inverse = np.unique(np.stack([starts, equipment_index, products], axis=1), axis=0,
+                                      return_inverse=True)
+            inverse = inverse.ravel()
+            totals = {
+                'entries': np.bincount(inverse, minlength=len(keys)),
+                'hours_used': np.bincount(inverse, weights=hours, minlength=len(keys)),
+                'cycles_completed': np.bincount(inverse, weights=cycles, minlength=len(keys)),
+                'efficiency_sum': np.bincount(inverse, weights=np.where(rated, efficiency, 0), minlength=len(keys)),
+                'efficiency_count': np.bincount(inverse, weights=rated, minlength=len(keys))
+            }
+            self._merge(period, keys, equipment, totals)
+
+        touched = np.unique(np.stack([equipment_index, products], axis=1), axis=0)
+        self._score([(equipment[e], int(p)) for e, p in touched.tolist()], int(days.min()), int(days.max()))
+
+    def _merge(self, period, keys, equipment, totals):
+        """Add aggregated totals to existing rollup rows, inserting the missing ones"""
+        table = UsageRollup.__table__
+        first, last = date.fromordinal(int(keys[:, 0].min())), date.fromordinal(int(keys[:, 0].max()))
+        existing = {tuple(row) for row in db.session.execute(
+            select(table.c.period_start, table.c.equipment_id, table.c.product_id)
+            .where(table.c.period == period, table.c.period_start.between(first, last))
+        )}
+
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        for i, (start, equipment_index, product_id) in enumerate(keys.tolist()):
+            key = (date.fromordinal(start), equipment[equipment_index], product_id)
+            values = {
+                'entries': int(totals['entries'][i]),
+                'hours_used': round(float(totals['hours_used'][i]), 2),
+                'cycles_completed': int(totals['cycles_completed'][i]),
+                'efficiency_sum': float(totals['efficiency_sum'][i]),
+                'efficiency_count': int(totals['efficiency_count'][i])
+            }
+            if key in existing:
+                updates.append({'b_period_start': key[0], 'b_equipment_id': key[1], 'b_product_id': key[2],
+                                **{f'b_{name}': value for name, value in values.items()}})
+            else:
+                inserts.append({'period': period, 'period_start': key[0], 'equipment_id': key[1],
+                                'product_id': key[2], 'is_anomaly': False, 'updated_at': now, **values})
+        if inserts:
+            db.session.execute(insert(table), inserts)
+        if updates:
+            db.session.execute(
+                update(table)
+                .where(table.c.period == period,
+                       table.c.period_start == bindparam('b_period_start'),
+                       table.c.equipment_id == bindparam('b_equipment_id'),
+                       table.c.product_id == bindparam('b_product_id'))
+                .values(updated_at=now, **{name: table.c[name] + bindparam(f'b_{name}')
+                                           for name in ('entries', 'hours_used', 'cycles_completed',
+                                                        'efficiency_sum', 'efficiency_count')}),
+                updates
+            )
+
+    def _score(self, series, first_day, last_day):
+        """Rescore the day rows of the given (equipment_id, product_id) series
+
+        A new day changes its own score and the baselines of the
+        baseline_days after it, so that span is reloaded together with the
+        baseline_days before it.
+        """
+        window = self.baseline_days
+        load_from, score_to = first_day - window, last_day + window
+        table = UsageRollup.__table__
+        wanted = set(series)
+        rows = [row for row in db.session.execute(
+            select(table.c.id, table.c.equipment_id, table.c.product_id, table.c.period_start,
+                   table.c.efficiency_sum, table.c.efficiency_count)
+            .where(table.c.period == 'day',
+                   table.c.period_start.between(date.fromordinal(load_from), date.fromordinal(score_to)))
+        ).all() if (row.equipment_id, row.product_id) in wanted]
+        if not rows:
+            return
+
+        index = {key: i for i, key in enumerate(dict.fromkeys((row.equipment_id, row.product_id) for row in rows))}
+        series_index = np.array([index[(row.equipment_id, row.product_id)] for row in rows], dtype=np.int64)
+        day_index = _day_numbers([row.period_start for row in rows]) - load_from
+        counts = np.array([row.efficiency_count or 0 for row in rows], dtype=np.float64)
+        sums = np.array([row.efficiency_sum or 0 for row in rows], dtype=np.float64)
+
+        # Series x day matrix of daily mean efficiency, NaN where nothing was rated
+        width = score_to - load_from + 1
+        means = np.full((len(index), width), np.nan)
+        rated = counts > 0
+        means[series_index[rated], day_index[rated]] = sums[rated] / counts[rated]
+
+        # Trailing window sums through cumulative sums, excluding the day itself
+        present = ~np.isnan(means)
+        values = np.where(present, means, 0.0)
+        n = _trailing(present.astype(np.float64), window)
+        total = _trailing(values, window)
+        squares = _trailing(values * values, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            baseline = total / n
+            spread = np.sqrt(np.maximum(squares / n - baseline * baseline, 0))
+            score = (means - baseline) / np.maximum(spread, self.min_spread)
+        scored = present & (n >= self.min_baseline)
+
+        row_scores = score[series_index, day_index]
+        row_scored = scored[series_index, day_index]
+        in_range = day_index >= first_day - load_from
+        updates = [{'b_id': row.id,
+                    'b_score': round(float(row_scores[i]), 3) if row_scored[i] else None,
+                    'b_anomaly': bool(row_scored[i] and abs(row_scores[i]) >= self.threshold)}
+                   for i, row in enumerate(rows) if in_range[i]]
+        if updates:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('b_id'))
+                .values(anomaly_score=bindparam('b_score'), is_anomaly=bindparam('b_anomaly')),
+                updates
+            )
+
+    def anomalies(self, start=None, end=None):
+        """Flagged equipment days, newest first"""
+        query = UsageRollup.query.filter(UsageRollup.period == 'day', UsageRollup.is_anomaly == True)
+        if start:
+            query = query.filter(UsageRollup.period_start >= start)
+        if end:
+            query = query.filter(UsageRollup.period_start <= end)
+        return query.order_by(UsageRollup.period_start.desc()).all()
+
+# Global usage rollup instance
+usage_rollups = deferred_engines.register(UsageRollups())
@@ -0,0 +1,392 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib import request as urllib_request
+from urllib.error import HTTPError, URLError
+from http.client import HTTPException
+from sqlalchemy import select, update, insert, delete
+from database import db
+from models import Webhook, WebhookDeadLetter
+from cache import reference_cache
+from events import subscribe
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying; any other status means the endpoint rejected the payload
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+def sign_payload(secret, timestamp, body):
+    """HMAC-SHA256 over '<timestamp>.<body>', sent as X-Webhook-Signature"""
+    message = f"{timestamp}.".encode('utf-8') + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def event_matches(patterns, event_type):
+    """True when a webhook's event list covers the type ('*' and 'stock.*' wildcards)"""
+    for pattern in patterns or []:
+        if pattern == '*' or pattern == event_type:
+            return True
+        if pattern.endswith('.*') and event_type.startswith(pattern[:-1]):
+            return True
+    return False
+
+class Endpoint:
+    """Delivery state for one active webhook"""
+
+    def __init__(self, webhook_id, url, patterns, secret):
+        self.id = webhook_id
+        self.url = url
+        self.patterns = patterns
+        self.secret = secret
+        self.buffer = []
+        self.buffer_since = None
+        self.ready = deque()  # (delivery_id, attempts, events)
+        self.in_flight = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.latency_total = 0.0
+        self.last_status = None
+
+    def metrics(self):
+        return {
+            'url': self.url,
+            'buffered': len(self.buffer),
+            'ready': len(self.ready),
+            'in_flight': self.in_flight,
+            'delivered': self.delivered,
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+            'avg_latency': round(self.latency_total / self.delivered, 3) if self.delivered else None,
+            'last_status': self.last_status
+        }
+
+class WebhookDispatcher:
+    """Asynchronous webhook delivery
+
+    Committed domain events are queued in memory. A dispatcher thread matches
+    them against active webhooks, groups them into per-endpoint batches and
+    hands those to a bounded thread pool, with at most endpoint_concurrency
+    requests in flight per endpoint. Failed deliveries are retried with
+    exponential backoff; batches that keep failing, or that the endpoint
+    rejects outright, are written to webhook_dead_letter for replay.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.running = False
+        self.thread = None
+        self.executor = None
+        self.max_workers = 8
+        self.endpoint_concurrency = 2
+        self.batch_size = 50
+        self.batch_window = 1.0
+        self.max_attempts = 8
+        self.retry_base = 5
+        self.retry_max = 900
+        self.timeout = 10
+        self.refresh_interval = 60
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._endpoints = {}
+        self._retries = []  # heap of (due, seq, webhook_id, delivery_id, attempts, events)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self._loaded_version = None
+        self._loaded_at = 0.0
+
+    def init_app(self, app):
+        """Bind the dispatcher to an app and start it if enabled"""
+        self.app = app
+        self.max_workers = app.config.get('WEBHOOK_MAX_WORKERS', self.max_workers)
+        self.endpoint_concurrency = app.config.get('WEBHOOK_ENDPOINT_CONCURRENCY', self.endpoint_concurrency)
+        self.batch_size = app.config.get('WEBHOOK_BATCH_SIZE', self.batch_size)
+        self.batch_window = app.config.get('WEBHOOK_BATCH_WINDOW_MS', self.batch_window * 1000) / 1000.0
+        self.max_attempts = app.config.get('WEBHOOK_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_base = app.config.get('WEBHOOK_RETRY_BASE', self.retry_base)
+        self.retry_max = app.config.get('WEBHOOK_RETRY_MAX', self.retry_max)
+        self.timeout = app.config.get('WEBHOOK_TIMEOUT', self.timeout)
+        self._queue = queue.Queue(maxsize=app.config.get('WEBHOOK_QUEUE_SIZE', self._queue.maxsize))
+        if app.config.get('WEBHOOKS_ENABLED'):
+            if not self._subscribed:
+                subscribe('*', self.enqueue)
+                self._subscribed = True
+            self.start()
+
+    def start(self):
+        """Start the dispatcher thread and the delivery pool"""
+        if not self.running:
+            self.running = True
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='webhook-delivery')
+            self.thread = threading.Thread(target=self._run_dispatcher, name='webhook-dispatcher', daemon=True)
+            self.thread.start()
+            logger.info(f"Webhook dispatcher started with {self.max_workers} delivery workers")
+
+    def stop(self):
+        """Stop dispatching; buffered events are sent, pending retries are dead-lettered"""
+        self.running = False
+        self._wake()
+        if self.thread:
+            self.thread.join()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        logger.info("Webhook dispatcher stopped")
+
+    def enqueue(self, domain_event):
+        """Event handler: hand a committed event over to the dispatcher thread"""
+        if not self.running:
+            return
+        try:
+            self._queue.put_nowait(domain_event)
+        except queue.Full:
+            # Never block the committing request; keep the event for replay instead
+            with self._lock:
+                self.dropped += 1
+                endpoints = list(self._endpoints.values())
+            for endpoint in endpoints:
+                if event_matches(endpoint.patterns, domain_event.type):
+                    self._dead_letter(endpoint, [domain_event.to_dict()], 0, None, 'Dispatch queue full')
+
+    def metrics(self):
+        """Queue depth and per-endpoint delivery counters"""
+        with self._lock:
+            return {
+                'running': self.running,
+                'queued': self._queue.qsize(),
+                'dropped': self.dropped,
+                'retry_backlog': len(self._retries),
+                'endpoints': {endpoint.id: endpoint.metrics() for endpoint in self._endpoints.values()}
+            }
+
+    def replay_dead_letters(self, webhook_id=None):
+        """Deliver dead-lettered batches once more from the calling thread
+
+        Successful batches are removed; failures stay with their attempt
+        count and error updated. Returns (delivered, failed).
+        """
+        query = select(WebhookDeadLetter.id, WebhookDeadLetter.payload, WebhookDeadLetter.attempts,
+                       Webhook.id.label('webhook_id'), Webhook.url, Webhook.events, Webhook.secret_key) \
+            .join(Webhook, Webhook.id == WebhookDeadLetter.webhook_id) \
+            .where(Webhook.is_active == True) \
+            .order_by(WebhookDeadLetter.id)
+        if webhook_id is not None:
+            query = query.where(WebhookDeadLetter.webhook_id == webhook_id)
+        with db.engine.connect() as connection:
+            rows = connection.execute(query).all()
+
+        delivered = failed = 0
+        for row in rows:
+            endpoint = Endpoint(row.webhook_id, row.url, row.events, row.secret_key)
+            status, error, _ = self._post(endpoint, uuid.uuid4().hex, row.attempts + 1, json.loads(row.payload))
+            with db.engine.begin() as connection:
+                if error is None:
+                    connection.execute(delete(WebhookDeadLetter).where(WebhookDeadLetter.id == row.id))
+                    delivered += 1
+                else:
+                    connection.execute(update(WebhookDeadLetter).where(WebhookDeadLetter.id == row.id)
+                                       .values(attempts=row.attempts + 1, status_code=status, last_error=error))
+                    failed += 1
+        return delivered, failed
+
+    def _wake(self):
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _run_dispatcher(self):
+        """Dispatcher loop: route queued events, cut batches, submit deliveries"""
+        with self.app.app_context():
+            while self.running:
+                try:
+                    received = []
+                    try:
+                        received.append(self._queue.get(timeout=self._next_deadline()))
+                        while True:
+                            received.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        pass
+                    # Refresh after receiving so events committed with a new webhook reach it
+                    self._refresh_endpoints()
+                    for domain_event in received:
+                        self._route(domain_event)
+                    self._schedule()
+                except Exception as e:
+                    logger.error(f"Webhook dispatcher error: {str(e)}")
+                    time.sleep(1)
+            self._drain()
+
+    def _refresh_endpoints(self):
+        """Reload active webhooks when they changed here or the refresh interval passed"""
+        version = reference_cache.version('webhook')
+        if version == self._loaded_version and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(Webhook.id, Webhook.url, Webhook.events, Webhook.secret_key).where(Webhook.is_active == True)
+            ).all()
+
+        endpoints = {}
+        with self._lock:
+            for row in rows:
+                endpoint = self._endpoints.get(row.id)
+                if endpoint is None:
+                    endpoint = Endpoint(row.id, row.url, row.events, row.secret_key)
+                else:
+                    endpoint.url, endpoint.patterns, endpoint.secret = row.url, row.events, row.secret_key
+                endpoints[row.id] = endpoint
+            self._endpoints = endpoints
+        self._loaded_version = version
+        self._loaded_at = time.monotonic()
+
+    def _route(self, domain_event):
+        if domain_event is None:
+            return
+        payload = domain_event.to_dict()
+        now = time.monotonic()
+        for endpoint in self._endpoints.values():
+            if event_matches(endpoint.patterns, domain_event.type):
+                if not endpoint.buffer:
+                    endpoint.buffer_since = now
+                endpoint.buffer.append(payload)
+
+    def _next_deadline(self):
+        """Seconds until a batch window closes or a retry falls due"""
+        deadlines = [endpoint.buffer_since + self.batch_window
+                     for endpoint in self._endpoints.values() if endpoint.buffer]
+        with self._lock:
+            if self._retries:
+                deadlines.append(self._retries[0][0])
+        if not deadlines:
+            return 1.0
+        return min(1.0, max(0.01, min(deadlines) - time.monotonic()))
+
+    def _schedule(self, flush=False):
+        """Cut full or expired batches and submit what each endpoint's limit allows"""
+        now = time.monotonic()
+        with self._lock:
+            while self._retries and (flush or self._retries[0][0] <= now):
+                _, _, webhook_id, delivery_id, attempts, events = heapq.heappop(self._retries)
+                endpoint = self._endpoints.get(webhook_id)
+                if endpoint is not None:
+                    endpoint.ready.appendleft((delivery_id, attempts, events))
+
+        for endpoint in self._endpoints.values():
+            while endpoint.buffer and (flush or len(endpoint.buffer) >= self.batch_size or
+                                       now - endpoint.buffer_since >= self.batch_window):
+                endpoint.ready.append((uuid.uuid4().hex, 0, endpoint.buffer[:self.batch_size]))
+                endpoint.buffer = endpoint.buffer[self.batch_size:]
+                endpoint.buffer_since = now if endpoint.buffer else None
+
+            with self._lock:
+                while endpoint.ready and (flush or endpoint.in_flight < self.endpoint_concurrency):
+                    delivery_id, attempts, events = endpoint.ready.popleft()
+                    endpoint.in_flight += 1
+                    self.executor.submit(self._deliver, endpoint, delivery_id, attempts, events)
+
+    def _drain(self):
+        """On stop: send what is buffered and dead-letter retries that are not due yet"""
+        with self._lock:
+            retries, self._retries = self._retries, []
+        for _, _, webhook_id, _, attempts, events in retries:
+            endpoint = self._endpoints.get(webhook_id)
+            if endpoint is not None:
+                self._dead_letter(endpoint, events, attempts, None, 'Dispatcher stopped before retry')
+        self._schedule(flush=True)
+
+    def _post(self, endpoint, delivery_id, attempt, events):
+        """POST one signed batch, returning (status, error, seconds)"""
+        body = json.dumps({
+            'delivery_id': delivery_id,
+            'webhook_id': endpoint.id,
+            'attempt': attempt,
+            'events': events
+        }, separators=(',', ':')).encode('utf-8')
+        timestamp = str(int(time.time()))
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'InventoryManagement-Webhooks/1.0',
+            'X-Webhook-Id': delivery_id,
+            'X-Webhook-Timestamp': timestamp
+        }
+        if endpoint.secret:
+            headers['X-Webhook-Signature'] = f"sha256={sign_payload(endpoint.secret, timestamp, body)}"
+
+        status, error = None, None
+        started = time.monotonic()
+        try:
+            req = urllib_request.Request(endpoint.url, data=body, headers=headers, method='POST')
+            with urllib_request.urlopen(req, timeout=self.timeout) as response:
+                status = response.status
+                response.read()
+        except HTTPError as e:
+            status = e.code
+        except (URLError, OSError) as e:
+            error = str(getattr(e, 'reason', e))
+        except (HTTPException, ValueError) as e:
+            # Malformed URLs and broken responses fail the attempt like a network error
+            error = f"{type(e).__name__}: {str(e)}"
+        if error is None and not 200 <= status < 300:
+            error = f"HTTP {status}"
+        return status, error, time.monotonic() - started
+
+    def _deliver(self, endpoint, delivery_id, attempts, events):
+        """Worker: send a batch, then record success, schedule a retry or dead-letter it"""
+        attempts += 1
+        try:
+            with self.app.app_context():
+                status, error, seconds = self._post(endpoint, delivery_id, attempts, events)
+                endpoint.last_status = status
+                if error is None:
+                    with self._lock:
+                        endpoint.delivered += 1
+                        endpoint.latency_total += seconds
+                    with db.engine.begin() as connection:
+                        connection.execute(update(Webhook).where(Webhook.id == endpoint.id)
+                                           .values(last_triggered=datetime.utcnow()))
+                elif (status is None or status in RETRYABLE_STATUS) and attempts < self.max_attempts and self.running:
+                    delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                    with self._lock:
+                        endpoint.retried += 1
+                        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), endpoint.id,
+                                                       delivery_id, attempts, events))
+                    logger.warning(f"Webhook {endpoint.id} delivery failed ({error}), retry {attempts} in {int(delay)}s")
+                else:
+                    self._dead_letter(endpoint, events, attempts, status, error)
+        except Exception as e:
+            logger.error(f"Webhook {endpoint.id} delivery error: {str(e)}")
+        finally:
+            with self._lock:
+                endpoint.in_flight -= 1
+            self._wake()
+
+    def _dead_letter(self, endpoint, events, attempts, status, error):
+        with self._lock:
+            endpoint.dead_lettered += 1
+        logger.error(f"Webhook {endpoint.id} batch of {len(events)} events dead-lettered: {error}")
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(WebhookDeadLetter), [{
+                    'webhook_id': endpoint.id,
+                    'payload': json.dumps(events),
+                    'attempts': attempts,
+                    'status_code': status,
+                    'last_error': error,
+                    'created_at': datetime.utcnow()
+                }])
+        except Exception as e:
+            logger.error(f"Failed to dead-letter webhook batch: {str(e)}")
+
+# Global webhook dispatcher instance
+webhook_dispatcher = WebhookDispatcher()